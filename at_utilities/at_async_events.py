@@ -0,0 +1,162 @@
+#------------------------------------------------------------------------------+
+'''
+Module at_async_events provides AsyncATEventManager, an asyncio variant of
+ATEventManager for services that embed the Activity Tracker model and run
+on an asyncio event loop.
+
+AsyncATEventManager has the same publish() and subscribe() API. Its events
+wait in an asyncio.PriorityQueue, by event priority then publish order, and
+one dispatcher task per manager awaits them, so a single event loop serves
+the managers of many activity stores without a thread per manager. 
+Handlers may be coroutine functions, which are awaited, or plain callables.
+publish() may be called from any thread: from other threads the event is
+handed to the manager's event loop with loop.call_soon_threadsafe(). The
+events queued or in flight are counted under a lock, so a full queue is
+known to every publisher at once, whatever its thread.
+'''
+import asyncio, inspect, itertools, logging, threading
+from atconstants import *
+from at_utilities.at_events import ATEvent, ATEventRegistry
+
+logger = logging.getLogger(AT_APP_NAME)  # create logger for the module
+#------------------------------------------------------------------------------+
+#region class AsyncATEventManager
+class AsyncATEventManager(ATEventRegistry):
+    '''
+    AsyncATEventManager dispatches ATEvents to their subscribed handlers on
+    an asyncio event loop.
+
+    Properties
+    ----------
+    running : bool
+        True while the dispatcher task runs
+    queue_maxsize : int
+        the most events queued, 0 for unbounded. When full, events are
+        rejected, as an event loop must not block.
+
+    Methods
+    -------
+    start() -> None
+        coroutine, start the dispatcher task on the running event loop
+    stop() -> None
+        coroutine, process the events already queued, then stop
+    publish(event : ATEvent) -> bool
+        queue an event for its handlers, from any thread, False if rejected
+    subscribe(event_name : str, callback, event_type) -> None
+        subscribe a coroutine function or callable to events
+    process_an_event(event : ATEvent) -> int
+        coroutine, call the handlers of an event
+    '''
+    def __init__(self, queue_maxsize: int = ATEM_QUEUE_MAXSIZE):
+        super().__init__()
+        if not isinstance(queue_maxsize, int) or queue_maxsize < 0:
+            raise ValueError(f"queue_maxsize must be an int >= 0, " + \
+                             f"not '{queue_maxsize}'")
+        self._queue_maxsize = queue_maxsize
+        self._queue: asyncio.PriorityQueue = None  # unbounded, see _queued
+        self._queued = 0  # events published and not yet taken, under _lock
+        self._lock = threading.Lock()  # Guards _queued, _loop and early puts
+        self._loop: asyncio.AbstractEventLoop = None  # None when stopped
+        self._loop_thread: threading.Thread = None
+        self._task: asyncio.Task = None
+        self._seq = itertools.count()  # publish order within a priority
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    @property
+    def queue_maxsize(self) -> int:
+        return self._queue_maxsize
+
+    def total_events(self) -> int:
+        '''Returns the number of events queued.'''
+        return self._queued
+
+    async def start(self) -> None:
+        '''Start the dispatcher task on the running event loop.'''
+        if self.running: return
+        with self._lock:  # Events published until now are already queued
+            self._loop = asyncio.get_running_loop()
+            self._loop_thread = threading.current_thread()
+            if self._queue is None: self._queue = asyncio.PriorityQueue()
+        self._task = self._loop.create_task(self._dispatch_loop(),
+                                            name="AsyncATEventManager")
+
+    async def stop(self) -> None:
+        '''Process the events already queued, then stop the dispatcher.
+        Events published from then on are queued until the next start().'''
+        if not self.running: return
+        await self._queue.join()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        with self._lock:  # Publish from now on without the event loop
+            self._loop = self._loop_thread = None
+            # Keep the events published meanwhile in a new queue, as the 
+            # next start() may be on another event loop
+            queue, self._queue = self._queue, None
+            while not queue.empty():
+                self._put_item(queue.get_nowait())
+
+    def publish(self, event: ATEvent) -> bool:
+        '''Queue an event for its handlers, from any thread. From a thread
+        other than the event loop's, the event is handed to the event loop.
+        Before start() and after stop() the event is queued for the next
+        start(). Returns True if queued, False if rejected as the queue is
+        full or the event loop is closed.'''
+        with self._lock:
+            if 0 < self._queue_maxsize <= self._queued:
+                logger.warning(f"async event queue is full, event " + \
+                               f"'{event.event_name}' rejected.")
+                return False
+            self._queued += 1
+            loop = self._loop
+            if loop is None or threading.current_thread() is self._loop_thread:
+                self._put(event)
+                return True
+            try:
+                loop.call_soon_threadsafe(self._put_threadsafe, event)
+            except RuntimeError:  # The event loop is closed
+                self._queued -= 1
+                logger.warning(f"async event loop is closed, event " + \
+                               f"'{event.event_name}' rejected.")
+                return False
+            return True
+
+    def _put(self, event: ATEvent) -> None:
+        self._put_item((event.priority, next(self._seq), event))
+
+    def _put_item(self, item: tuple) -> None:
+        if self._queue is None: self._queue = asyncio.PriorityQueue()
+        self._queue.put_nowait(item)
+
+    def _put_threadsafe(self, event: ATEvent) -> None:
+        with self._lock: self._put(event)
+
+    async def _dispatch_loop(self) -> None:
+        while True:
+            _, _, event = await self._queue.get()
+            with self._lock: self._queued -= 1
+            try:
+                await self.process_an_event(event)
+            finally:
+                self._queue.task_done()
+
+    async def process_an_event(self, event: ATEvent) -> int:
+        '''Call the handlers subscribed to the event, awaiting coroutines.
+        An exception raised by a handler is logged and does not stop the 
+        other handlers. Returns the handlers called.'''
+        handlers = self.handlers(event)
+        for callback in handlers:
+            try:
+                result = callback(event)
+                if inspect.isawaitable(result): await result
+            except Exception as e:
+                self.handler_failed(callback, event, e)
+        return len(handlers)
+#endregion class AsyncATEventManager
+#------------------------------------------------------------------------------+
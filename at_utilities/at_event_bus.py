@@ -0,0 +1,487 @@
+#------------------------------------------------------------------------------+
+'''
+Module at_event_bus provides a local event bus between the processes of the
+Activity Tracker on one machine, such as the GUI, a CLI importer and a 
+reporting daemon, over a Unix domain socket.
+
+ATEventBroker is the hub, run in its own process with run_broker() or
+start_broker_process(), or in a thread. ATBusEventManager is an 
+ATEventManager that connects to the broker: the events it publishes are 
+processed locally and sent to the broker, and the broker sends them on to
+every other connected manager subscribed to their topic, the event type and
+event_name, where they are published locally. A manager subscribes at the
+broker to the topics of its own subscriptions, so events cross only to the
+processes that handle them.
+
+Messages are frames of a 4 byte big endian length and a compact JSON body.
+The broker forwards a published frame as it was received, and writes the
+frames for a client in one send per pass of its select loop. A client
+writer thread likewise sends every frame queued since its last send at once.
+A client that falls ATEB_MAX_CLIENT_BUFFER bytes behind is disconnected.
+
+The default socket is in the user's $XDG_RUNTIME_DIR, or else in a 0700
+directory of the user in the temporary directory, and is made 0600, so 
+only the user's own processes can connect.
+'''
+import getpass, json, logging, multiprocessing, os, pathlib, selectors, \
+    socket, stat, struct, sys, tempfile, threading, time
+from typing import Dict, List, Set, Tuple
+from atconstants import *
+from at_utilities.at_events import ATEvent, ATEventManager, ATEventRegistry
+
+logger = logging.getLogger(AT_APP_NAME)  # create logger for the module
+
+ATEB_HEADER = struct.Struct(">I")  # frame body length
+ATEB_MAX_FRAME = 16 * 1024 * 1024  # largest frame body accepted
+ATEB_RECV_SIZE = 65536
+ATEB_MAX_CLIENT_BUFFER = 8 * 1024 * 1024  # unsent bytes before a disconnect
+ATEB_OP_PUBLISH = "pub"
+ATEB_OP_SUBSCRIBE = "sub"
+ATEB_OP_UNSUBSCRIBE = "unsub"
+#------------------------------------------------------------------------------+
+#region framing
+def default_socket_path() -> pathlib.Path:
+    '''Return the default broker socket path, in $XDG_RUNTIME_DIR if set, 
+    or else in a directory of the user, created 0700, in the temporary 
+    directory. Raises PermissionError if that directory is another user's
+    or open to other users.'''
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime_dir and os.path.isdir(runtime_dir):
+        return pathlib.Path(runtime_dir) / ATEM_BUS_SOCKET_NAME
+    path = pathlib.Path(tempfile.gettempdir()) / \
+        f"{AT_APP_NAME}-{getpass.getuser()}"
+    path.mkdir(mode=0o700, exist_ok=True)
+    st = path.lstat()
+    if not stat.S_ISDIR(st.st_mode) or (hasattr(os, "getuid") and \
+        st.st_uid != os.getuid()) or st.st_mode & 0o077:
+        raise PermissionError(f"event bus directory '{path}' is not a " + \
+                              f"private directory of the user")
+    return path / ATEM_BUS_SOCKET_NAME
+
+def socket_listening(socket_path) -> bool:
+    '''Return True if a broker accepts connections on socket_path.'''
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(str(socket_path))
+        return True
+    except OSError:
+        return False
+    finally:
+        sock.close()
+
+def encode_frame(message: dict) -> bytes:
+    '''Return a message as a length prefixed frame of compact JSON.'''
+    body = json.dumps(message, separators=(",", ":")).encode("utf-8")
+    return ATEB_HEADER.pack(len(body)) + body
+
+class ATFrameReader():
+    '''
+    ATFrameReader splits a stream of bytes into frame bodies.
+
+    Methods
+    -------
+    feed(data : bytes) -> List[bytes]
+        add received bytes, returning the bodies of the frames completed.
+        Raises ValueError for a frame longer than ATEB_MAX_FRAME.
+    '''
+    def __init__(self):
+        self._buffer = bytearray()
+
+    def feed(self, data: bytes) -> List[bytes]:
+        self._buffer += data
+        bodies = []; start = 0; size = len(self._buffer)
+        while size - start >= ATEB_HEADER.size:
+            (length,) = ATEB_HEADER.unpack_from(self._buffer, start)
+            if length > ATEB_MAX_FRAME:
+                raise ValueError(f"frame of {length} bytes is too long")
+            end = start + ATEB_HEADER.size + length
+            if end > size: break
+            bodies.append(bytes(self._buffer[start + ATEB_HEADER.size:end]))
+            start = end
+        if start > 0: del self._buffer[:start]
+        return bodies
+#endregion framing
+#------------------------------------------------------------------------------+
+#region class ATEventBroker
+class _BrokerClient():
+    '''A connected client of an ATEventBroker.'''
+    __slots__ = ("sock", "reader", "out", "topics", "writing")
+    def __init__(self, sock: socket.socket):
+        self.sock = sock
+        self.reader = ATFrameReader()
+        self.out = bytearray()  # frames waiting to be sent
+        self.topics: Set[Tuple[str, str]] = set()  # None for all
+        self.writing = False  # registered for EVENT_WRITE
+
+    def subscribed(self, topic: Tuple[str, str]) -> bool:
+        topics = self.topics
+        return topic in topics or (topic[0], None) in topics or \
+            (None, topic[1]) in topics or (None, None) in topics
+
+class ATEventBroker():
+    '''
+    ATEventBroker fans out the events published by the clients on a Unix
+    domain socket to the other clients subscribed to their topics.
+
+    Properties
+    ----------
+    socket_path : pathlib.Path
+        the path the broker listens on
+    clients : int
+        the number of connected clients
+
+    Methods
+    -------
+    serve_forever() -> None
+        listen and forward events until stopped
+    start() -> threading.Thread
+        serve_forever() in a daemon thread, returning once listening
+    stop() -> None
+        stop serving and close every connection
+    '''
+    def __init__(self, socket_path = None):
+        self._socket_path = pathlib.Path(socket_path or default_socket_path())
+        self._clients: Dict[socket.socket, _BrokerClient] = {}
+        self._selector = None
+        self._stop = threading.Event()
+        self._listening = threading.Event()
+        self._error: Exception = None  # why serve_forever() could not listen
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._thread = None
+
+    @property
+    def socket_path(self) -> pathlib.Path:
+        return self._socket_path
+
+    @property
+    def clients(self) -> int:
+        return len(self._clients)
+
+    def start(self) -> threading.Thread:
+        '''Run serve_forever() in a daemon thread, once it is listening.
+        Raises the error of serve_forever() if it cannot listen.'''
+        self._thread = threading.Thread(name="ATEventBroker", daemon=True,
+                                        target=self._serve)
+        self._thread.start()
+        self._listening.wait(5.0)
+        if self._error is not None: raise self._error
+        return self._thread
+
+    def stop(self) -> None:
+        '''Stop serving, waking the select loop.'''
+        self._stop.set()
+        try:
+            self._wake_w.send(b"x")
+        except OSError:
+            pass
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(5.0)
+
+    def serve_forever(self) -> None:
+        '''Listen on socket_path and forward events until stopped. Raises
+        FileExistsError if socket_path is not a socket left by a crash.'''
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            self._remove_stale_socket()
+            server.bind(str(self._socket_path))
+            os.chmod(self._socket_path, 0o600)
+        except OSError as e:
+            server.close()
+            self._error = e
+            self._listening.set()
+            raise
+        server.listen()
+        server.setblocking(False)
+        self._selector = selectors.DefaultSelector()
+        self._selector.register(server, selectors.EVENT_READ)
+        self._selector.register(self._wake_r, selectors.EVENT_READ)
+        self._listening.set()
+        logger.debug(f" event broker listening on '{self._socket_path}'.")
+        try:
+            while not self._stop.is_set():
+                for key, mask in self._selector.select():
+                    sock = key.fileobj
+                    if sock is server: self._accept(server)
+                    elif sock is self._wake_r: sock.recv(ATEB_RECV_SIZE)
+                    else:
+                        client = self._clients.get(sock)
+                        if client is None: continue
+                        if mask & selectors.EVENT_READ: self._read(client)
+                        if mask & selectors.EVENT_WRITE and sock in self._clients:
+                            self._flush(client)
+                # Batched writes: one send per client per pass
+                for client in list(self._clients.values()):
+                    if client.out and not client.writing: self._flush(client)
+        finally:
+            for client in list(self._clients.values()): self._close(client)
+            self._selector.close()
+            server.close()
+            self._socket_path.unlink(missing_ok=True)
+            logger.debug(f" event broker stopped.")
+
+    def _serve(self) -> None:
+        try:
+            self.serve_forever()
+        except OSError as e:
+            if e is not self._error: raise  # else raised by start()
+
+    def _remove_stale_socket(self) -> None:
+        '''Remove a socket left at socket_path by a crashed broker. Raises
+        FileExistsError for any other file, or a socket in use.'''
+        try:
+            st = self._socket_path.lstat()
+        except FileNotFoundError:
+            return
+        if not stat.S_ISSOCK(st.st_mode):
+            raise FileExistsError(f"'{self._socket_path}' is not a socket")
+        if socket_listening(self._socket_path):
+            raise FileExistsError(f"an event broker is already listening " + \
+                                  f"on '{self._socket_path}'")
+        self._socket_path.unlink(missing_ok=True)
+
+    def _accept(self, server: socket.socket) -> None:
+        sock, _ = server.accept()
+        sock.setblocking(False)
+        self._clients[sock] = _BrokerClient(sock)
+        self._selector.register(sock, selectors.EVENT_READ)
+
+    def _read(self, client: _BrokerClient) -> None:
+        try:
+            data = client.sock.recv(ATEB_RECV_SIZE)
+            if not data: return self._close(client)
+            bodies = client.reader.feed(data)
+        except (OSError, ValueError) as e:
+            logger.warning(f"event broker closed a client: {e}")
+            return self._close(client)
+        for body in bodies:
+            try:
+                message = json.loads(body)
+                op = message["op"]
+            except (ValueError, KeyError, TypeError):
+                logger.warning(f"event broker ignored a bad frame")
+                continue
+            if op == ATEB_OP_PUBLISH:
+                topic = (message.get("type"), message.get("name"))
+                frame = ATEB_HEADER.pack(len(body)) + body
+                slow = []
+                for other in self._clients.values():
+                    if other is not client and other.subscribed(topic):
+                        if len(other.out) + len(frame) > ATEB_MAX_CLIENT_BUFFER:
+                            slow.append(other)
+                        else:
+                            other.out += frame
+                for other in slow:
+                    logger.warning(f"event broker closed a client more than " + \
+                                   f"{ATEB_MAX_CLIENT_BUFFER} bytes behind")
+                    self._close(other)
+            elif op == ATEB_OP_SUBSCRIBE:
+                client.topics.add((message.get("type"), message.get("name")))
+            elif op == ATEB_OP_UNSUBSCRIBE:
+                client.topics.discard((message.get("type"), message.get("name")))
+
+    def _flush(self, client: _BrokerClient) -> None:
+        '''Send what the socket takes of the client's frames, waiting for
+        EVENT_WRITE for the rest.'''
+        try:
+            sent = client.sock.send(client.out)
+        except BlockingIOError:
+            sent = 0
+        except OSError:
+            return self._close(client)
+        del client.out[:sent]
+        writing = len(client.out) > 0
+        if writing != client.writing:
+            events = selectors.EVENT_READ | (selectors.EVENT_WRITE if writing else 0)
+            self._selector.modify(client.sock, events)
+            client.writing = writing
+
+    def _close(self, client: _BrokerClient) -> None:
+        if self._clients.pop(client.sock, None) is None: return
+        try:
+            self._selector.unregister(client.sock)
+        except (KeyError, ValueError):
+            pass
+        client.sock.close()
+#endregion class ATEventBroker
+#------------------------------------------------------------------------------+
+#region run_broker()
+def run_broker(socket_path = None) -> None:
+    '''Run an ATEventBroker on socket_path until the process is stopped.'''
+    ATEventBroker(socket_path).serve_forever()
+
+def start_broker_process(socket_path = None,
+                         timeout: float = 5.0) -> multiprocessing.Process:
+    '''Start run_broker() in a daemon process, returning once the broker
+    accepts connections. Raises TimeoutError if it does not within timeout.'''
+    path = pathlib.Path(socket_path or default_socket_path())
+    process = multiprocessing.Process(name="ATEventBroker", daemon=True,
+                                      target=run_broker, args=(str(path),))
+    process.start()
+    deadline = time.monotonic() + timeout
+    while not socket_listening(path):
+        if time.monotonic() > deadline or not process.is_alive():
+            process.terminate()
+            raise TimeoutError(f"event broker did not start on '{path}'")
+        time.sleep(0.005)
+    return process
+#endregion run_broker()
+#------------------------------------------------------------------------------+
+#region class ATBusEventManager
+class ATBusEventManager(ATEventManager):
+    '''
+    ATBusEventManager is an ATEventManager connected to an ATEventBroker.
+    Events it publishes are processed locally and sent to the broker, and
+    events published by other processes to topics it subscribes to are 
+    published locally. Event data must be JSON serializable to cross; other
+    events are processed locally only.
+
+    Properties
+    ----------
+    socket_path : pathlib.Path
+        the broker socket path
+    connected : bool
+        True while connected to the broker
+
+    Methods
+    -------
+    connect(timeout : float) -> None
+        connect to the broker, subscribing to the topics of the handlers
+    disconnect() -> None
+        close the connection to the broker
+    '''
+    def __init__(self, socket_path = None, **options):
+        super().__init__(**options)
+        self._socket_path = pathlib.Path(socket_path or default_socket_path())
+        self._sock: socket.socket = None
+        self._out = bytearray()  # frames waiting for the writer thread
+        self._out_lock = threading.Lock()
+        self._out_ready = threading.Event()
+        self._classes = ATEventManager.event_classes()
+
+    @property
+    def socket_path(self) -> pathlib.Path:
+        return self._socket_path
+
+    @property
+    def connected(self) -> bool:
+        return self._sock is not None
+
+    def connect(self, timeout: float = 5.0) -> None:
+        '''Connect to the broker, retrying until timeout seconds for it to 
+        start, and subscribe to the topics of the subscribed handlers.
+        Raises OSError if the broker cannot be reached.'''
+        if self._sock is not None: return
+        deadline = time.monotonic() + timeout
+        while True:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                sock.connect(str(self._socket_path))
+                break
+            except (FileNotFoundError, ConnectionRefusedError):
+                sock.close()
+                if time.monotonic() > deadline: raise
+                time.sleep(0.01)
+        self._sock = sock
+        with self.lock:
+            for et, en in list(self._subscriptions): 
+                self._send({"op": ATEB_OP_SUBSCRIBE, "type": et, "name": en})
+        threading.Thread(name="ATBusEventReader", daemon=True,
+                         target=self._reader_loop, args=(sock,)).start()
+        threading.Thread(name="ATBusEventWriter", daemon=True,
+                         target=self._writer_loop, args=(sock,)).start()
+        logger.debug(f" connected to event broker '{self._socket_path}'.")
+
+    def disconnect(self) -> None:
+        '''Close the connection to the broker, after sending queued frames.'''
+        sock, self._sock = self._sock, None
+        if sock is None: return
+        self._out_ready.set()  # Wake the writer to send the rest and exit
+        try:
+            sock.shutdown(socket.SHUT_RD)
+        except OSError:
+            pass
+
+    def stop(self, timeout: float = None):
+        '''Disconnect from the broker and stop the event manager threads.'''
+        self.disconnect()
+        super().stop(timeout)
+
+    def publish(self, event: ATEvent) -> bool:
+        '''Publish an event locally, and to the broker when connected.'''
+        ok = super().publish(event)
+        if self._sock is not None:
+            try:
+                self._send({"op": ATEB_OP_PUBLISH, "type": type(event).__name__,
+                            "name": event.event_name, "priority": event.priority,
+                            "data": event.event_data})
+            except (TypeError, ValueError) as e:
+                logger.warning(f"event '{event.event_name}' not sent to the " + \
+                               f"event bus: {e}")
+        return ok
+
+    def subscribe(self, event_name: str, callback, event_type = None) -> None:
+        super().subscribe(event_name, callback, event_type)
+        if self._sock is not None:
+            self._send({"op": ATEB_OP_SUBSCRIBE, "name": event_name,
+                        "type": ATEventRegistry.event_type_name(event_type)})
+
+    def unsubscribe(self, event_name: str, callback, event_type = None) -> bool:
+        removed = super().unsubscribe(event_name, callback, event_type)
+        et = ATEventRegistry.event_type_name(event_type)
+        if removed and self._sock is not None and \
+            (et, event_name) not in self._subscriptions:
+            self._send({"op": ATEB_OP_UNSUBSCRIBE, "type": et, "name": event_name})
+        return removed
+
+    def _send(self, message: dict) -> None:
+        '''Queue a frame for the writer thread. Raises TypeError or 
+        ValueError if the message cannot be encoded.'''
+        frame = encode_frame(message)
+        with self._out_lock:
+            self._out += frame
+        self._out_ready.set()
+
+    def _writer_loop(self, sock: socket.socket) -> None:
+        # Send every frame queued since the last send at once
+        while True:
+            self._out_ready.wait()
+            self._out_ready.clear()
+            with self._out_lock:
+                out, self._out = self._out, bytearray()
+            try:
+                if out: sock.sendall(out)
+            except OSError:
+                break
+            if self._sock is not sock: break
+        sock.close()
+
+    def _reader_loop(self, sock: socket.socket) -> None:
+        reader = ATFrameReader()
+        while True:
+            try:
+                data = sock.recv(ATEB_RECV_SIZE)
+                if not data: break
+                bodies = reader.feed(data)
+            except (OSError, ValueError):
+                break
+            for body in bodies:
+                try:
+                    message = json.loads(body)
+                    cls = self._classes.get(message.get("type"), ATEvent)
+                    event = cls(message.get("name"), message.get("data"),
+                                message.get("priority", ATEM_PRIORITY_NORMAL))
+                except (ValueError, TypeError, AttributeError):
+                    logger.warning(f"ignored a bad event bus frame")
+                    continue
+                ATEventManager.publish(self, event)  # Not sent back out
+        if self._sock is sock:
+            self._sock = None
+            self._out_ready.set()
+            logger.warning(f"lost connection to event broker '{self._socket_path}'.")
+#endregion class ATBusEventManager
+#------------------------------------------------------------------------------+
+#region local debugging code
+if __name__ == "__main__":
+    # Run a broker: python -m at_utilities.at_event_bus [socket_path]
+    run_broker(sys.argv[1] if len(sys.argv) > 1 else None)
+#endregion local debugging code
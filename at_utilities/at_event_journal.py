@@ -0,0 +1,192 @@
+#------------------------------------------------------------------------------+
+'''
+Module at_event_journal provides ATEventJournal, an append-only journal of
+the events published to an ATEventManager, so events still pending when the
+application crashes are replayed when it starts again.
+
+Each event is one JSON line with its journal sequence number, event type,
+event_name, priority and event_data. Lines are appended through a buffered
+file and made durable by fsync in batches: after fsync_batch events, after
+fsync_interval seconds, or when the event manager calls sync() at the end of
+a pass, so a publish does not wait for the disk.
+
+Handlers acknowledge an event with ack() once processed. The journal keeps
+the lines of unacknowledged events in memory, and every compact_every
+acknowledgements rewrites the file with only those lines, written to a
+temporary file and renamed, and the file is emptied whenever no event is 
+pending. Delivery is at least once: an event processed
+just before a crash may be replayed.
+'''
+import json, logging, os, pathlib, threading, time
+from typing import Dict, List
+from atconstants import *
+
+logger = logging.getLogger(AT_APP_NAME)  # create logger for the module
+#------------------------------------------------------------------------------+
+#region class ATEventJournal
+class ATEventJournal():
+    '''
+    ATEventJournal is a JSONL journal of events not yet acknowledged.
+
+    Properties
+    ----------
+    journal_uri : pathlib.Path
+        the journal file
+    pending : int
+        the events appended and not acknowledged
+
+    Methods
+    -------
+    open() -> List[dict]
+        open the journal, returning the records of the events to replay
+    append(event_type : str, event_name : str, priority : int, 
+           event_data) -> int
+        append an event, returning its sequence number, None if its 
+        event_data cannot be encoded
+    ack(seq : int) -> None
+        acknowledge a processed event
+    sync() -> None
+        fsync the events appended since the last fsync
+    compact() -> None
+        rewrite the journal with only the unacknowledged events
+    close() -> None
+        sync and close the journal
+    '''
+    def __init__(self, journal_uri,
+                 fsync_interval: float = ATEM_JOURNAL_FSYNC_INTERVAL,
+                 fsync_batch: int = ATEM_JOURNAL_FSYNC_BATCH,
+                 compact_every: int = ATEM_JOURNAL_COMPACT_EVERY):
+        if not isinstance(journal_uri, (str, pathlib.Path)):
+            t = type(journal_uri).__name__
+            raise TypeError(f"journal_uri must be type:'str' or 'Path', not type:'{t}'")
+        for name, value in (("fsync_interval", fsync_interval),
+                            ("fsync_batch", fsync_batch),
+                            ("compact_every", compact_every)):
+            if not isinstance(value, (int, float)) or value <= 0:
+                raise ValueError(f"{name} must be a number > 0, not '{value}'")
+        self._journal_uri = pathlib.Path(journal_uri)
+        self._fsync_interval = fsync_interval
+        self._fsync_batch = fsync_batch
+        self._compact_every = compact_every
+        self._lock = threading.Lock()
+        self._file = None
+        self._next_seq = 0
+        self._unacked: Dict[int, str] = {}  # seq -> journal line
+        self._unsynced = 0  # lines written since the last fsync
+        self._last_sync = time.monotonic()
+        self._acked = 0  # acknowledgements since the last compaction
+
+    @property
+    def journal_uri(self) -> pathlib.Path:
+        return self._journal_uri
+
+    @property
+    def pending(self) -> int:
+        return len(self._unacked)
+
+    def open(self) -> List[dict]:
+        '''Open the journal, reading the records left by an earlier run, 
+        which are returned, in sequence order, to be replayed. A torn last
+        line, from a crash during a write, is ignored.'''
+        records = []
+        if self._journal_uri.is_file():
+            with open(self._journal_uri, 'r', encoding='utf-8') as file:
+                lines = file.read().splitlines()
+            for i, line in enumerate(lines):
+                try:
+                    record = json.loads(line)
+                    seq = record["seq"]
+                except (ValueError, KeyError, TypeError):
+                    if i < len(lines) - 1:
+                        logger.warning(f"skipped bad event journal line {i + 1} " + \
+                                       f"in '{self._journal_uri}'")
+                    continue
+                records.append(record)
+                self._unacked[seq] = line
+                self._next_seq = max(self._next_seq, seq + 1)
+        records.sort(key=lambda r: r["seq"])
+        with self._lock:
+            self._compact()  # Start from a clean file of the pending events
+        return records
+
+    def append(self, event_type: str, event_name: str, priority: int,
+               event_data) -> int:
+        '''Append an event, returning its sequence number. Returns None,
+        with a warning, if event_data cannot be encoded as JSON or the 
+        journal is closed.'''
+        with self._lock:
+            if self._file is None:
+                logger.warning(f"event '{event_name}' not journaled: " + \
+                               f"'{self._journal_uri}' is closed")
+                return None
+            seq = self._next_seq
+            try:
+                line = json.dumps({"seq": seq, "type": event_type, 
+                                   "name": event_name, "priority": priority,
+                                   "data": event_data}, separators=(",", ":"))
+            except (TypeError, ValueError) as e:
+                logger.warning(f"event '{event_name}' not journaled: {e}")
+                return None
+            self._next_seq += 1
+            self._file.write(line + "\n")
+            self._unacked[seq] = line
+            self._unsynced += 1
+            if self._unsynced >= self._fsync_batch or \
+                time.monotonic() - self._last_sync >= self._fsync_interval:
+                self._sync()
+            return seq
+
+    def ack(self, seq: int) -> None:
+        '''Acknowledge a processed event, compacting the journal every 
+        compact_every acknowledgements. Once the journal is closed the event
+        is left in the file, to be replayed by the next run.'''
+        with self._lock:
+            if self._file is None: return
+            if self._unacked.pop(seq, None) is None: return
+            self._acked += 1
+            if len(self._unacked) == 0:  # Nothing pending, empty the file
+                self._file.flush()
+                self._file.truncate(0)
+                self._unsynced = 0; self._acked = 0
+            elif self._acked >= self._compact_every:
+                self._compact()
+
+    def sync(self) -> None:
+        '''fsync the events appended since the last fsync.'''
+        with self._lock:
+            if self._file is not None and self._unsynced > 0: self._sync()
+
+    def compact(self) -> None:
+        '''Rewrite the journal with only the unacknowledged events.'''
+        with self._lock:
+            self._compact()
+
+    def close(self) -> None:
+        '''Sync and close the journal, keeping its unacknowledged events.'''
+        with self._lock:
+            if self._file is None: return
+            self._sync()
+            self._file.close()
+            self._file = None
+
+    def _sync(self) -> None:
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def _compact(self) -> None:
+        '''Replace the journal file with the unacknowledged lines.'''
+        if self._file is not None: self._file.close()
+        tmp = self._journal_uri.with_name(self._journal_uri.name + ".tmp")
+        with open(tmp, 'w', encoding='utf-8') as file:
+            for seq in sorted(self._unacked):
+                file.write(self._unacked[seq] + "\n")
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp, self._journal_uri)
+        self._file = open(self._journal_uri, 'a', encoding='utf-8')
+        self._unsynced = 0
+        self._acked = 0
+#endregion class ATEventJournal
+#------------------------------------------------------------------------------+
@@ -0,0 +1,207 @@
+#------------------------------------------------------------------------------+
+'''
+Module at_event_metrics provides ATEventMetrics, the instrumentation of an
+ATEventManager: published, dispatched, failed, dropped and rejected event
+counts, event queue depths, publish to dispatch latency per event type and
+execution time per event handler.
+
+Times are kept in ATLatencyHistogram objects, fixed arrays of power of two
+buckets of microseconds, so recording a time is a few integer operations and
+the memory used does not grow with the number of events. An ATEventManager
+without metrics does no recording at all.
+'''
+import logging, threading, time
+from typing import Callable, Dict
+from atconstants import AT_APP_NAME
+
+logger = logging.getLogger(AT_APP_NAME)  # create logger for the module
+
+ATEMX_BUCKETS = 40  # histogram buckets, the last for 2**38 us and longer
+#------------------------------------------------------------------------------+
+#region class ATLatencyHistogram
+class ATLatencyHistogram():
+    '''
+    ATLatencyHistogram counts times in power of two buckets of microseconds,
+    bucket i holding times from 2**(i-1) up to 2**i microseconds.
+
+    Properties
+    ----------
+    count : int
+    mean : float
+        the mean in microseconds, None when count is 0
+    max : float
+        the longest time in microseconds, None when count is 0
+
+    Methods
+    -------
+    record(seconds : float) -> None
+        count a time
+    quantile(q : float) -> float
+        the upper bound in microseconds of the bucket holding the q 
+        quantile, at most max, None when count is 0
+    '''
+    def __init__(self):
+        self._buckets = [0] * ATEMX_BUCKETS
+        self._count = 0
+        self._total = 0.0  # microseconds
+        self._max = 0.0
+
+    @property
+    def count(self) -> int:
+        return self._count
+
+    @property
+    def mean(self) -> float:
+        return self._total / self._count if self._count > 0 else None
+
+    @property
+    def max(self) -> float:
+        return self._max if self._count > 0 else None
+
+    def record(self, seconds: float) -> None:
+        '''Count a time given in seconds.'''
+        us = seconds * 1e6
+        self._buckets[min(int(us).bit_length(), ATEMX_BUCKETS - 1)] += 1
+        self._count += 1
+        self._total += us
+        if us > self._max: self._max = us
+
+    def quantile(self, q: float) -> float:
+        '''Return the upper bound in microseconds of the q quantile bucket.'''
+        if not isinstance(q, (int, float)) or not 0.0 <= q <= 1.0:
+            raise ValueError(f"q must be a number from 0 to 1, not '{q}'")
+        if self._count == 0: return None
+        target = q * self._count; seen = 0
+        for i, n in enumerate(self._buckets):
+            seen += n
+            if n > 0 and seen >= target: return min(float(1 << i), self._max)
+        return self._max
+
+    def to_dict(self) -> dict:
+        '''Return a summary of the histogram for json serialization.'''
+        return {"count": self._count, "mean": self.mean, "p50": self.quantile(0.5),
+                "p99": self.quantile(0.99), "max": self.max}
+#endregion class ATLatencyHistogram
+#------------------------------------------------------------------------------+
+#region class ATEventMetrics
+class ATEventMetrics():
+    '''
+    ATEventMetrics records the behavior of an ATEventManager's events.
+
+    Properties
+    ----------
+    snapshot_interval : float
+        seconds between periodic snapshots, None for none
+    snapshot_due : float
+        time.monotonic() the next snapshot is due, None for none
+
+    Methods
+    -------
+    published(event_type : str, depth : int) -> None
+        count a published event and the depth of its queue
+    rejected(event_type : str) -> None
+        count an event refused by a full queue
+    dispatched(event_type : str, latency : float) -> None
+        count a dispatched event and its seconds from publish
+    handled(handler : str, seconds : float, failed : bool) -> None
+        record the execution time of a handler
+    snapshot(event_queues : dict) -> dict
+        the metrics, with the depth and drops of the event queues
+    take_snapshot(event_queues : dict) -> dict
+        a periodic snapshot, passed to on_snapshot(snapshot)
+    '''
+    def __init__(self, snapshot_interval: float = None,
+                 on_snapshot: Callable[[dict], None] = None):
+        if snapshot_interval is not None and \
+            (not isinstance(snapshot_interval, (int, float)) or snapshot_interval <= 0):
+            raise ValueError(f"snapshot_interval must be a number > 0, " + \
+                             f"not '{snapshot_interval}'")
+        if on_snapshot is not None and not callable(on_snapshot):
+            t = type(on_snapshot).__name__
+            raise TypeError(f"on_snapshot must be callable, not type:'{t}'")
+        self._lock = threading.Lock()  # Workers of several pools record
+        self._published: Dict[str, int] = {}
+        self._max_depth: Dict[str, int] = {}
+        self._rejected: Dict[str, int] = {}
+        self._dispatched: Dict[str, int] = {}
+        self._failed: Dict[str, int] = {}
+        self._latency: Dict[str, ATLatencyHistogram] = {}
+        self._handlers: Dict[str, ATLatencyHistogram] = {}
+        self._snapshot_interval = snapshot_interval
+        self._on_snapshot = on_snapshot or ATEventMetrics.log_snapshot
+        self._snapshot_due = None if snapshot_interval is None else \
+            time.monotonic() + snapshot_interval
+
+    @property
+    def snapshot_interval(self) -> float:
+        return self._snapshot_interval
+
+    @property
+    def snapshot_due(self) -> float:
+        return self._snapshot_due
+
+    #region ATEventMetrics recording
+    def published(self, event_type: str, depth: int) -> None:
+        with self._lock:
+            self._published[event_type] = self._published.get(event_type, 0) + 1
+            if depth > self._max_depth.get(event_type, 0):
+                self._max_depth[event_type] = depth
+
+    def rejected(self, event_type: str) -> None:
+        with self._lock:
+            self._rejected[event_type] = self._rejected.get(event_type, 0) + 1
+
+    def dispatched(self, event_type: str, latency: float) -> None:
+        with self._lock:
+            self._dispatched[event_type] = self._dispatched.get(event_type, 0) + 1
+            if latency is None: return
+            h = self._latency.get(event_type)
+            if h is None: h = self._latency[event_type] = ATLatencyHistogram()
+            h.record(latency)
+
+    def handled(self, handler: str, seconds: float, failed: bool) -> None:
+        with self._lock:
+            h = self._handlers.get(handler)
+            if h is None: h = self._handlers[handler] = ATLatencyHistogram()
+            h.record(seconds)
+            if failed: self._failed[handler] = self._failed.get(handler, 0) + 1
+    #endregion ATEventMetrics recording
+    #--------------------------------------------------------------------------+
+    #region ATEventMetrics snapshots
+    def snapshot(self, event_queues: dict = None) -> dict:
+        '''Return the metrics as a dictionary, with the current 'depth', and
+        the events 'dropped' and 'rejected', of each queue in event_queues, 
+        event type -> ATEventQueue. Times are in microseconds.'''
+        queues = {}
+        for et, eq in list((event_queues or {}).items()):
+            queues[et] = {"depth": eq.qsize(), "max_depth": self._max_depth.get(et, 0),
+                          "dropped": eq.dropped, 
+                          "rejected": eq.rejected + self._rejected.get(et, 0)}
+        with self._lock:
+            return {"queues": queues,
+                    "published": dict(self._published),
+                    "dispatched": dict(self._dispatched),
+                    "failed": dict(self._failed),
+                    "dispatch_latency_us": {et: h.to_dict()
+                                            for et, h in self._latency.items()},
+                    "handler_time_us": {name: h.to_dict()
+                                        for name, h in self._handlers.items()}}
+
+    def take_snapshot(self, event_queues: dict = None) -> dict:
+        '''Take the periodic snapshot, passing it to on_snapshot().'''
+        if self._snapshot_interval is not None:
+            self._snapshot_due = time.monotonic() + self._snapshot_interval
+        snapshot = self.snapshot(event_queues)
+        try:
+            self._on_snapshot(snapshot)
+        except Exception as e:
+            logger.exception(f"on_snapshot failed: {e}")
+        return snapshot
+
+    @staticmethod
+    def log_snapshot(snapshot: dict) -> None:
+        '''The default on_snapshot(), logs the snapshot.'''
+        logger.info(f"event metrics: {snapshot}")
+    #endregion ATEventMetrics snapshots
+#endregion class ATEventMetrics
+#------------------------------------------------------------------------------+
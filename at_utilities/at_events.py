@@ -18,8 +18,16 @@ callback method for the event is called by the background thread when the event
 is processed. The callback method is passed the event data as a parameter. The 
 callback method is responsible for dispathching the call to appropriate
 event handler functions.
-TODO: Expand to multiple worker threads for each event type with its own queue 
-and signal event callback method.
+
+An event type may instead have its own pool of worker threads, so a slow
+handler, such as a model save, does not stall the events of other types.
+The workers keep the order of events with the same key, such as those of
+one activity store, and process events with different keys in parallel.
+
+Each event has a priority, high for View events as user input, and the
+event queues take events by priority. A queue may be bounded, with a policy
+to block the publisher, drop the oldest low priority event or reject the 
+event when full, so a runaway producer cannot exhaust memory.
 '''
 import logging
 from atconstants import *
@@ -33,9 +41,13 @@ logger.debug(f"Imported module: {__name__}")
 logger.debug(f" Logging initialized.")
 #endregion atlogging_setup()
 #------------------------------------------------------------------------------+
-import threading, queue
+import collections, threading, time, queue
 import at_utilities.at_utils as atu
+from at_utilities.at_event_metrics import ATEventMetrics
+from at_utilities.at_event_journal import ATEventJournal
 from at_utilities import at_events as atev
+
+_STOP_WORKER = object()  # queued to stop an event worker thread
  
 #------------------------------------------------------------------------------+
 #region class ATSignalEvent
@@ -90,13 +102,21 @@ class ATSignalEvent (threading.Event):
 class ATEvent ():
     '''
     ATEvent is a simple object used to contain data of a published event.
+    The priority, one of ATEM_PRIORITIES, orders it in the event queues.
     '''
-    def __init__(self, event_name:str=None, event_data:dict=None):
+    def __init__(self, event_name:str=None, event_data:dict=None,
+                 priority:int=ATEM_PRIORITY_NORMAL):
         # super().__init__()
+        if priority not in ATEM_PRIORITIES:
+            raise ValueError(f"priority must be one of {ATEM_PRIORITIES}, " + \
+                             f"not '{priority}'")
 
         # Instance variables
         self._event_name = event_name
         self._event_data : dict = event_data
+        self._priority = priority
+        self._published_at : float = None
+        self._journal_seqs : tuple = ()
 
     @property
     def event_name(self):
@@ -114,6 +134,29 @@ class ATEvent ():
     def event_data(self, value):
         self._event_data = value
 
+    @property
+    def priority(self) -> int:
+        return self._priority
+
+    @property
+    def published_at(self) -> float:
+        '''time.perf_counter() when queued by an event manager with metrics.'''
+        return self._published_at
+
+    @published_at.setter
+    def published_at(self, value: float):
+        self._published_at = value
+
+    @property
+    def journal_seqs(self) -> tuple:
+        '''The event journal sequence numbers the event acknowledges when
+        processed, more than one for coalesced events.'''
+        return self._journal_seqs
+
+    @journal_seqs.setter
+    def journal_seqs(self, value: tuple):
+        self._journal_seqs = tuple(value)
+
     #region future
     # def set(self):
     #     super().set()
@@ -128,23 +171,32 @@ class ATEvent ():
 #------------------------------------------------------------------------------+
 #region class ATViewEvent
 class ATViewEvent(ATEvent):
-    '''Event class for events published by the AT View.'''
-    def __init__(self, event_name = None, event_data = None):
-        super().__init__(event_name, event_data)
+    '''Event class for events published by the AT View. As user input,
+    View events have high priority by default.'''
+    def __init__(self, event_name = None, event_data = None,
+                 priority = ATEM_PRIORITY_HIGH):
+        super().__init__(event_name, event_data, priority)
 #endregion class ATViewEvent        
 #------------------------------------------------------------------------------+
 #region class ATViewModelEvent
 class ATViewModelEvent(ATEvent):
     '''Event class for events published by the AT View.'''
-    def __init__(self, event_name = None, event_data = None):
-        super().__init__(event_name, event_data)
+    def __init__(self, event_name = None, event_data = None,
+                 priority = ATEM_PRIORITY_NORMAL):
+        super().__init__(event_name, event_data, priority)
 #endregion class ATViewEvent        
 #------------------------------------------------------------------------------+
 #region class ATModelEvent
 class ATModelEvent(ATEvent):
-    '''Event class for events published by the AT View.'''
-    def __init__(self, event_name = None, event_data = None):
-        super().__init__(event_name, event_data)
+    '''Event class for events published by the AT Model. An ATModel 
+    publishes its changes to activities as the event_data dictionary,
+    with 'activityname', the 'changes' as ATChange.to_dict() values, each
+    with its 'time_range', and the overall 'time_range' affected. Only the
+    first ATM_EVENT_MAX_CHANGES changes are listed, 'change_count' is the
+    count of all of them, and 'truncated' is True when some are not listed.'''
+    def __init__(self, event_name = None, event_data = None,
+                 priority = ATEM_PRIORITY_NORMAL):
+        super().__init__(event_name, event_data, priority)
 #endregion class ATModelEvent        
 #------------------------------------------------------------------------------+
 #region class ATEventQueue
@@ -153,17 +205,48 @@ class ATEventQueue (queue.Queue):
     ATEventQueue is a subclass of queue.Queue. ATEventQueue is a queue of
     ATEvent objects. The queue is used to store events that are published 
     from actors outside the queue owner.
+
+    Events are held in one lane per priority, ATEM_PRIORITIES, and get() 
+    returns the oldest event of the highest priority lane, so interactive
+    events are taken before background work. With a maxsize, put() applies
+    the queue's policy when the queue is full: 'block' waits for space,
+    'drop_oldest' drops the oldest event of the lowest priority, or the new
+    event when every queued event has a higher priority, and 'reject' 
+    raises queue.Full.
+
+    Properties
+    ----------
+    queue_name : str
+        the event type of the queue
+    policy : str
+        the policy when full, one of ATEM_QUEUE_POLICIES
+    dropped : int
+        the queued or new events dropped by the 'drop_oldest' policy
+    rejected : int
+        the events rejected by the 'reject' policy
+    on_drop : Callable[[ATEvent], None]
+        called with each event dropped by the 'drop_oldest' policy
     '''
     _queue_name = None
     _queue_data = None
 
-    def __init__(self):
-        super().__init__()
-        self.queue = queue.Queue()
+    def __init__(self, maxsize: int = ATEM_QUEUE_MAXSIZE,
+                 policy: str = ATEM_POLICY_BLOCK, queue_name: str = None):
+        if not isinstance(maxsize, int) or maxsize < 0:
+            raise ValueError(f"maxsize must be an int >= 0, not '{maxsize}'")
+        if policy not in ATEM_QUEUE_POLICIES:
+            raise ValueError(f"policy must be one of {ATEM_QUEUE_POLICIES}, " + \
+                             f"not '{policy}'")
+        super().__init__(maxsize)
+        self._policy = policy
+        self._queue_name = queue_name
+        self._dropped = 0
+        self._rejected = 0
+        self.on_drop = None
 
     @property
     def queue_name(self):
-        return self._event_name
+        return self._queue_name
     
     @queue_name.setter
     def queue_name(self, value):
@@ -177,44 +260,481 @@ class ATEventQueue (queue.Queue):
     def queue_data(self, value):
         self._queue_data = value
 
-    def put(self, event):
-        self.queue.put(event)
+    @property
+    def policy(self) -> str:
+        return self._policy
+
+    @property
+    def dropped(self) -> int:
+        return self._dropped
+
+    @property
+    def rejected(self) -> int:
+        return self._rejected
+
+    # queue.Queue calls _init(), _qsize(), _put() and _get() holding its lock
+    def _init(self, maxsize):
+        # One lane per priority, and a last lane for worker stop markers
+        self.queue = [collections.deque() for _ in range(len(ATEM_PRIORITIES) + 1)]
+        self._size = 0
+
+    def _qsize(self):
+        return self._size
+
+    def _put(self, item):
+        lane = getattr(item, "priority", len(ATEM_PRIORITIES))
+        self.queue[lane].append(item)
+        self._size += 1
 
-    def get(self):
-        return self.queue.get()
+    def _get(self):
+        for lane in self.queue:
+            if lane:
+                self._size -= 1
+                return lane.popleft()
 
-    def empty(self):
-        return self.queue.empty()
+    def put(self, event, block: bool = True, timeout: float = None):
+        '''Put an event on the queue, applying the policy when full.
+        Raises queue.Full when rejected, or when not given space to block.'''
+        if self._policy == ATEM_POLICY_BLOCK:
+            return super().put(event, block, timeout)
+        with self.not_full:
+            if 0 < self.maxsize <= self._size:
+                if self._policy == ATEM_POLICY_REJECT:
+                    self._rejected += 1
+                    raise queue.Full(f"queue '{self._queue_name}' is full")
+                # Drop the oldest event of the lowest priority lane, never 
+                # one of higher priority than the new event, dropping the new
+                # event itself when the queue holds only those.
+                priority = getattr(event, "priority", len(ATEM_PRIORITIES))
+                lanes = self.queue[priority:len(ATEM_PRIORITIES)]
+                lane = next((lane for lane in reversed(lanes) if lane), None)
+                self._dropped += 1
+                if lane is None:
+                    if self.on_drop is not None: self.on_drop(event)
+                    return
+                dropped = lane.popleft()
+                self._size -= 1
+                self.unfinished_tasks -= 1
+                if self.on_drop is not None: self.on_drop(dropped)
+            self._put(event)
+            self.unfinished_tasks += 1
+            self.not_empty.notify()
 
-    def qsize(self):
-        return self.queue.qsize()
+    def put_unbounded(self, item) -> None:
+        '''Put an item regardless of maxsize and policy, such as a worker 
+        stop marker, queued after every event, or a coalesced event.'''
+        with self.mutex:
+            self._put(item)
+            self.unfinished_tasks += 1
+            self.not_empty.notify()
+
+    def head_priority(self) -> int:
+        '''Return the priority of the next event, None if there is none.'''
+        for priority in range(len(ATEM_PRIORITIES)):
+            if self.queue[priority]: return priority
+        return None
 #endregion class ATEventQueue
 #------------------------------------------------------------------------------+
+#region class ATEventWorkerPool
+class ATEventWorkerPool():
+    '''
+    ATEventWorkerPool is a pool of worker threads processing the event queue
+    of one event type for an ATEventManager, so a slow handler of one event
+    type does not stall the others.
+
+    Workers block on the queue and take events in publish order, one worker
+    at a time, each taking an event and claiming or handing over its key
+    before the next worker takes one. Events with the same key, such as 
+    those of one activity store, are processed one at a time in publish 
+    order: a worker taking an event whose key is in progress on another 
+    worker hands it to that worker, which processes it next. Events with 
+    other keys are processed in parallel, so a key function should be 
+    cheap. A key function that raises, or returns an unhashable key, is
+    logged and the event_name is used as the key. An exception raised
+    processing an event is logged, and the events waiting for its key are
+    still processed.
+
+    Properties
+    ----------
+    event_type : str
+        the event type of the queue
+    workers : int
+        the number of worker threads
+    event_queue : ATEventQueue
+        the queue the workers take events from
+
+    Methods
+    -------
+    start() -> None
+        start the worker threads
+    stop(timeout : float) -> None
+        stop the workers after the events already queued
+    event_key(event : ATEvent) -> object
+        the default key, the 'activityname' of the event_data, if any, 
+        otherwise the event_name
+    is_worker(thread : threading.Thread) -> bool
+        True if thread is one of the worker threads
+    '''
+    def __init__(self, event_type: str, event_queue: ATEventQueue, 
+                 process_an_event, workers: int = 1, key = None):
+        if not isinstance(workers, int) or workers < 1:
+            raise ValueError(f"workers must be a positive int, not '{workers}'")
+        if key is not None and not callable(key):
+            t = type(key).__name__
+            raise TypeError(f"key must be callable, not type:'{t}'")
+        self._event_type = event_type
+        self._event_queue = event_queue
+        self._process_an_event = process_an_event
+        self._key = key or ATEventWorkerPool.event_key
+        self._active = {}  # key -> deque of events waiting for that key
+        self._lock = threading.Lock()  # Guards _active
+        self._take_lock = threading.Lock()  # One worker takes an event at once
+        self._threads = [threading.Thread(name=f"ATEventWorker-{event_type}-{i}",
+                            daemon=True, target=self._worker_loop)
+                         for i in range(workers)]
+
+    @property
+    def event_type(self) -> str:
+        return self._event_type
+
+    @property
+    def workers(self) -> int:
+        return len(self._threads)
+
+    @property
+    def event_queue(self) -> ATEventQueue:
+        return self._event_queue
+
+    @staticmethod
+    def event_key(event: ATEvent):
+        '''Return the default ordering key of an event.'''
+        data = event.event_data
+        if isinstance(data, dict) and ATEM_EVENT_KEY_FIELD in data:
+            return data[ATEM_EVENT_KEY_FIELD]
+        return event.event_name
+
+    def is_worker(self, thread: threading.Thread) -> bool:
+        '''Return True if thread is one of the worker threads.'''
+        return thread in self._threads
+
+    def start(self) -> None:
+        '''Start the worker threads.'''
+        for t in self._threads:
+            if not t.is_alive(): t.start()
+        logger.debug(f" started {self.workers} workers for '{self.event_type}'.")
+
+    def stop(self, timeout: float = None) -> None:
+        '''Stop the workers once the events already queued are processed,
+        waiting up to timeout seconds for each, forever if None.'''
+        alive = [t for t in self._threads if t.is_alive()]
+        for _ in alive: self._event_queue.put_unbounded(_STOP_WORKER)
+        for t in alive:
+            if t is not threading.current_thread(): t.join(timeout)
+
+    def _event_key(self, event: ATEvent):
+        '''Return the key of an event, or its event_name if the key function
+        raises or returns an unhashable key.'''
+        try:
+            key = self._key(event)
+            hash(key)
+            return key
+        except Exception as e:
+            logger.exception(f"event key failed for {type(event).__name__}" + \
+                             f"[event_name='{event.event_name}']: {e}")
+            return event.event_name
+
+    def _worker_loop(self) -> None:
+        while True:
+            # Take the event and claim or hand over its key before another
+            # worker takes the next event, so a key keeps publish order
+            with self._take_lock:
+                event = self._event_queue.get()  # Block until one is queued
+                if event is _STOP_WORKER: break
+                key = self._event_key(event)
+                with self._lock:
+                    waiting = self._active.get(key)
+                    if waiting is not None:  # Another worker has this key
+                        waiting.append(event)
+                        continue
+                    waiting = self._active[key] = collections.deque()
+            try:
+                while event is not None:
+                    try:
+                        self._process_an_event(event)
+                    except Exception as e:  # Keep processing the key
+                        logger.exception(f"worker failed to process " + \
+                            f"{type(event).__name__}" + \
+                            f"[event_name='{event.event_name}']: {e}")
+                    with self._lock:
+                        if len(waiting) > 0: event = waiting.popleft()
+                        else:
+                            del self._active[key]
+                            event = None
+            finally:
+                if event is not None:  # Exiting, hand the key back
+                    with self._lock:
+                        self._active.pop(key, None)
+                        for e in waiting: self._event_queue.put_unbounded(e)
+#endregion class ATEventWorkerPool
+#------------------------------------------------------------------------------+
+#region class ATEventCoalescer
+class ATEventCoalescer():
+    '''
+    ATEventCoalescer holds the events of one topic, an event type and
+    event_name, published within a window of seconds of the first, for an
+    ATEventManager to deliver as one event when the window ends, or at once
+    when max_batch events are held. With the latest() merge only the last
+    event is held.
+
+    Properties
+    ----------
+    topic : tuple
+        the (event type, event_name) coalesced
+    window : float
+        seconds from the first pending event to its delivery, 0 to deliver
+        on the next pass of the event thread
+    deadline : float
+        time.monotonic() the pending events are due, None if none
+    max_batch : int
+        the most events held before they are delivered
+    pending : int
+        the number of events held
+    full : bool
+        True when max_batch events are held
+
+    Methods
+    -------
+    add(event : ATEvent) -> bool
+        hold an event, True if it is the first pending one
+    take() -> ATEvent
+        the pending events merged into one, None if none
+    batch(events : List[ATEvent]) -> ATEvent
+        the default merge, an event of the same type and event_name with
+        event_data {'events': events}
+    latest(events : List[ATEvent]) -> ATEvent
+        a merge keeping only the last event
+    '''
+    def __init__(self, topic: tuple, window: float = 0.0, merge = None,
+                 max_batch: int = ATEM_COALESCE_MAX_BATCH):
+        if not isinstance(window, (int, float)) or window < 0:
+            raise ValueError(f"window must be a number >= 0, not '{window}'")
+        if merge is not None and not callable(merge):
+            t = type(merge).__name__
+            raise TypeError(f"merge must be callable, not type:'{t}'")
+        if not isinstance(max_batch, int) or max_batch < 1:
+            raise ValueError(f"max_batch must be a positive int, not '{max_batch}'")
+        self._topic = topic
+        self._window = float(window)
+        self._merge = merge or ATEventCoalescer.batch
+        self._max_batch = max_batch
+        self._pending = []
+        self._journal_seqs = []  # of the pending events, and those replaced
+        self._deadline = None
+
+    @property
+    def topic(self) -> tuple:
+        return self._topic
+
+    @property
+    def window(self) -> float:
+        return self._window
+
+    @property
+    def deadline(self) -> float:
+        return self._deadline
+
+    @property
+    def max_batch(self) -> int:
+        return self._max_batch
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    @property
+    def full(self) -> bool:
+        return len(self._pending) >= self._max_batch
+
+    def add(self, event: ATEvent) -> bool:
+        '''Hold event until the window ends, True if it is the first.'''
+        self._journal_seqs.extend(event.journal_seqs)
+        if self._merge is ATEventCoalescer.latest and self._pending:
+            self._pending[0] = event  # Only the last one is delivered
+            return False
+        self._pending.append(event)
+        if len(self._pending) > 1: return False
+        self._deadline = time.monotonic() + self._window
+        return True
+
+    def take(self) -> ATEvent:
+        '''Return the pending events merged into one, None if none.'''
+        if len(self._pending) == 0: return None
+        events, self._pending, self._deadline = self._pending, [], None
+        merged = self._merge(events)
+        merged.journal_seqs, self._journal_seqs = self._journal_seqs, []
+        return merged
+
+    @staticmethod
+    def batch(events: list) -> ATEvent:
+        '''Return an event like the first with event_data {'events': events}.'''
+        return type(events[0])(events[0].event_name, {ATEM_BATCH_FIELD: events},
+                               min(e.priority for e in events))
+
+    @staticmethod
+    def latest(events: list) -> ATEvent:
+        '''Return the last event, dropping the others.'''
+        return events[-1]
+#endregion class ATEventCoalescer
+#------------------------------------------------------------------------------+
+#region class ATEventRegistry
+class ATEventRegistry():
+    '''
+    ATEventRegistry is the base class of the event managers, holding the
+    event handler subscriptions, keyed by event type and event_name, either
+    of which may be None to subscribe to all. Subclasses implement publish().
+    The handlers of each (event type, event_name) are computed once and 
+    cached, so finding them costs one dict lookup however many subscriptions
+    there are. The cache is replaced, not changed, when the subscriptions 
+    change. A threading.RLock, lock, guards changes.
+
+    Methods
+    -------
+    publish(event : ATEvent) -> bool
+        queue an event for its handlers, False if rejected
+    subscribe(event_name : str, callback, event_type) -> None
+        subscribe callback(event) to events
+    unsubscribe(event_name : str, callback, event_type) -> bool
+        remove a subscription
+    handlers(event : ATEvent) -> tuple
+        the callbacks subscribed to an event
+    event_type_name(event_type) -> str
+        the event type name for an ATEvent class or name
+    '''
+    def __init__(self):
+        self.lock = threading.RLock()  # Guards subscriptions and event queues
+        # (event type, event_name) -> tuple of callbacks, None for all
+        self._subscriptions = {}
+        # (event type, event_name) -> tuple of all callbacks to dispatch to,
+        # replaced, not changed, when the subscriptions change
+        self._dispatch = {}
+
+    def publish(self, event: ATEvent) -> bool:
+        '''Queue an event for its handlers. Returns False if rejected.'''
+        raise NotImplementedError
+
+    def handlers(self, event: ATEvent) -> tuple:
+        '''Return the callbacks subscribed to the event.'''
+        key = (type(event).__name__, event.event_name)
+        handlers = self._dispatch.get(key)
+        if handlers is None: handlers = self._handlers_for(key)
+        return handlers
+
+    def _handlers_for(self, key: tuple) -> tuple:
+        '''Compute and cache the handlers for an (event type, event_name),
+        those subscribed to it, to all events of its type, to its 
+        event_name of any type, and to all.'''
+        with self.lock:
+            et, en = key
+            handlers = tuple(self._subscriptions.get(key, ())) + \
+                tuple(self._subscriptions.get((et, None), ())) + \
+                tuple(self._subscriptions.get((None, en), ())) + \
+                tuple(self._subscriptions.get((None, None), ()))
+            self._dispatch[key] = handlers
+            return handlers
+
+    def subscribe(self, event_name: str, callback, event_type = None) -> None:
+        '''Subscribe callback(event) to the events with event_name, or all 
+        events if None, of event_type, a class or class name, or of all
+        event types if None. Raises TypeError if callback is not callable.'''
+        if not callable(callback):
+            t = type(callback).__name__
+            raise TypeError(f"callback must be callable, not type:'{t}'")
+        key = (ATEventRegistry.event_type_name(event_type), event_name)
+        with self.lock:
+            handlers = self._subscriptions.get(key, ())
+            self._subscriptions[key] = handlers + (callback,)
+            self._dispatch = {}  # Recomputed on the next dispatch of each key
+
+    def unsubscribe(self, event_name: str, callback, event_type = None) -> bool:
+        '''Remove a subscription made by subscribe() with the same arguments.
+        Returns True if removed, False if there was no such subscription.'''
+        key = (ATEventRegistry.event_type_name(event_type), event_name)
+        with self.lock:
+            handlers = list(self._subscriptions.get(key, ()))
+            if callback not in handlers: return False
+            handlers.remove(callback)
+            if len(handlers) > 0: self._subscriptions[key] = tuple(handlers)
+            else: del self._subscriptions[key]
+            self._dispatch = {}
+            return True
+
+    @staticmethod
+    def event_type_name(event_type) -> str:
+        '''Return the event type name for an ATEvent class or name.'''
+        if event_type is None or isinstance(event_type, str): return event_type
+        if isinstance(event_type, type) and issubclass(event_type, ATEvent):
+            return event_type.__name__
+        t = type(event_type).__name__
+        raise TypeError(f"event_type must be an ATEvent class or str, not type:'{t}'")
+
+    def handler_failed(self, callback, event: ATEvent, e: Exception) -> None:
+        '''Log the exception e raised by callback for event.'''
+        et = type(event).__name__
+        logger.exception(f"handler {callback!r} failed for " + \
+                         f"{et}[event_name='{event.event_name}']: {e}")
+#endregion class ATEventRegistry
+#------------------------------------------------------------------------------+
 #region class ATEVentManager
 #------------------------------------------------------------------------------+
-class ATEventManager():
+class ATEventManager(ATEventRegistry):
     '''
     ATEventManager is a singleton class that manages the event queues for 
     the Activity Tracker ViewMOdel application. This Event Manager is 
     responsible for for subscribing to events from the ATView.
 
-    A single background thread processes the event queues. The thread waits for
-    events to be published to the queues. When an event is published, the 
-    a threading.Event is used to signal the background thread to process the
-    event queue. A threading.RLock is used to ensure thread-safe access to the
-    event queues in self.event_queues.
-    TODO: Expand to multiple signal events for various event types with their
-    own event queues.
-    TODO: Expand to multiple worker threads for each event type with its own.
+    A single background thread processes the event queues. The thread blocks
+    on a threading.Event, signal_event, and does no work while idle. publish()
+    puts an event on the queue for its type and sets signal_event, waking the
+    thread at once. The thread clears signal_event before it drains the 
+    queues, so an event published while draining sets it again and is never
+    left waiting. A threading.RLock is used to ensure thread-safe access to 
+    the event queues in self.event_queues.
+
+    An event type given its own ATEventWorkerPool with set_workers() is not
+    processed by that thread, but by the pool's worker threads, keeping the
+    order of events with the same key. Set the workers of an event type 
+    before publishing events of that type.
+
+    A topic, an event type and event_name, given an ATEventCoalescer with
+    coalesce() holds its events for a window of seconds, and then queues
+    them as one merged event, by default a batch of the events. The thread
+    waits with a timeout only while coalesced events are pending.
+
+    enable_metrics() records ATEventMetrics, read with metrics_snapshot() or
+    passed to a callback every snapshot interval. Without metrics, publish
+    and dispatch do no recording.
+
+    enable_journal() appends each published event to an ATEventJournal, 
+    synced at the end of each pass of the event thread, and acknowledged 
+    once processed, dropped or rejected, so the pending events are replayed
+    after a crash.
     '''
-    def __init__(self):
+    def __init__(self, queue_maxsize: int = ATEM_QUEUE_MAXSIZE,
+                 queue_policy: str = ATEM_POLICY_BLOCK):
+        ATEventQueue(queue_maxsize, queue_policy)  # Validate the queue options
+        self.queue_maxsize = queue_maxsize
+        self.queue_policy = queue_policy
+        super().__init__()
         self.event_queues = {}
+        self.worker_pools = {}  # event type -> ATEventWorkerPool
+        self._coalescers = {}  # (event type, event_name) -> ATEventCoalescer
+        self.metrics: ATEventMetrics = None  # None when metrics are disabled
+        self.journal: ATEventJournal = None  # None when events are not journaled
         self.signal_event = threading.Event()
         self.stop_event = threading.Event()  # To stop event manager threads
         self.running = False
         self.event_thread = threading.Thread(name="ATEventManagerThread", 
                             daemon=True, target=self.process_events_loop)
-        self.lock = threading.RLock()  # For thread-safe access to event queues
 
     def start(self):
         '''Start the event manager thread'''
@@ -224,6 +744,7 @@ class ATEventManager():
             self.event_thread.start()
             t = self.event_thread.native_id
             logger.debug(f" started worker thread {t}.")
+        for pool in list(self.worker_pools.values()): pool.start()
 
     def stopped(self) -> bool:
         '''Check if the event manager stop event is set'''
@@ -232,165 +753,442 @@ class ATEventManager():
     def total_events(self) -> int:
         '''Returns the total number of events in all event queues'''
         ecount = 0
-        for eq in self.event_queues.values(): ecount += eq.qsize()
+        for eq in list(self.event_queues.values()): ecount += eq.qsize()
         return ecount
 
-    def stop(self):
-        '''Stop the event manager threads'''
+    def stop(self, timeout: float = None):
+        '''Stop the event manager threads, waking the idle thread, and wait
+        up to timeout seconds for it to exit, forever if None. Events held
+        back by coalescers are processed before the workers stop; other 
+        queued events are left, kept for the next run only if journaled.'''
         logger.debug(f" stopping event manager.")
         self.stop_event.set()  # Set stop_event to signal worker threads to stop
+        self.signal_event.set()  # Wake the thread blocked on signal_event
+        if self.event_thread.is_alive() and \
+            self.event_thread is not threading.current_thread():
+            self.event_thread.join(timeout)
+        # Deliver the events held back: pooled ones are processed by the
+        # workers before they stop, others here once the event thread exited
+        for et, event in self._take_coalesced(force=True):
+            if et in self.worker_pools or self.event_thread.is_alive():
+                self._queue_coalesced(et, event)
+            else:
+                self._process_queued_event(event)
+        for pool in list(self.worker_pools.values()): pool.stop(timeout)
+        journal = self.journal
+        if journal is not None:
+            self.journal = None  # Publish from now on without journaling
+            journal.close()
+        self.running = False
 
     def process_events_loop(self):
         '''Main loop to Process events from event queues'''
-        m = f" Entry: self.stopped() = {self.stopped()}."
-        logger.debug(m); print(m)
+        logger.debug(f" Entry: self.stopped() = {self.stopped()}.")
         # Runs until the self.stopped() method returns True, 
         # indicating that the self.stop_signal has been set.
-        while not self.stopped():  # Loop until stop_event is set
-            logger.debug(f" wait next event.")
-            if self.signal_event.is_set():
-                logger.debug(f" signal_event.is_set()={self.signal_event.is_set()}.")
-                all_queues_empty = True
-                eqount = len(self.event_queues)
-                ecount = self.total_events()
-                logger.debug(f" process '{ecount}' events in {eqount} queues.")
-                for et in self.event_queues:
-                    eq = self.event_queues[et]
-                    while not eq.empty():
-                        logger.debug(f" process queue {et}" + \
-                              f".count={eq.qsize()} ")
-                        # Get an event from the queue until none are left
-                        event = eq.get()
-                        self.process_an_event(event)
-                        all_queues_empty = False 
-                    logger.debug(f" finished queue {et}" + \
-                          f".count={eq.qsize()}")
-                # clear signal event when queues are empty
-                if all_queues_empty:  
-                    self.signal_event.clear()
-                    logger.debug(f" signal_event.clear().")
-            else:
-                to = 2.0
-                # print(f" signal_event.is_set():False.")
-                # print(f" signal_event.wait({to}).")
-                self.signal_event.wait(to)
-                m = f" signal_event.wait({to}) expired."
-                logger.debug(m); logger.debug(m)
-        logger.debug(f" Exit: self.Stopped = {self.stopped}.")
+        while True:
+            # Block until set, with a timeout only for coalesced events or
+            # periodic metrics snapshots
+            self.signal_event.wait(self._next_timeout())
+            if self.stopped(): break
+            # Clear before draining, so an event published from here on sets 
+            # the signal again and is processed on the next pass.
+            self.signal_event.clear()
+            self._flush_coalesced()
+            metrics = self.metrics
+            if metrics is not None and metrics.snapshot_due is not None and \
+                metrics.snapshot_due <= time.monotonic():
+                metrics.take_snapshot(self.event_queues)
+            # Pooled queues are processed by their workers
+            queues = [eq for et, eq in list(self.event_queues.items())
+                      if et not in self.worker_pools]
+            # Get the highest priority event of any queue until none are left
+            while True:
+                next_eq = None; next_priority = None
+                for eq in queues:
+                    priority = eq.head_priority()
+                    if priority is not None and \
+                        (next_priority is None or priority < next_priority):
+                        next_eq, next_priority = eq, priority
+                if next_eq is None: break
+                try:
+                    event = next_eq.get_nowait()
+                except queue.Empty:  # Dropped by a publisher meanwhile
+                    continue
+                self._process_queued_event(event)
+            # Make the events journaled in this pass durable
+            if self.journal is not None: self.journal.sync()
+        logger.debug(f" Exit: self.Stopped = {self.stopped()}.")
  
-    def process_an_event(self, event):
-        '''Process an event by calling the event's callback method'''
-        et = type(event).__name__; en = event.event_name; ed = event.event_data 
-        logger.debug(f"process_an_event(): {et}[event_name='{en}', event_data='{ed}']")
-        match type(event):
-            case atev.ATViewEvent:
-                logger.debug(f"{et} event processing")
-            case atev.ATEvent:
-                logger.debug(f"{et} event processing")
-            case _:
-                pass
-        return
+    def process_an_event(self, event) -> int:
+        '''Process an event by calling the handlers subscribed to its event 
+        type and event_name. An exception raised by a handler is logged and
+        does not stop the other handlers. Returns the handlers called.'''
+        handlers = self.handlers(event)
+        metrics = self.metrics
+        if metrics is None:
+            for callback in handlers:
+                try:
+                    callback(event)
+                except Exception as e:
+                    self.handler_failed(callback, event, e)
+            return len(handlers)
+        # Instrumented dispatch, timing the event and each handler
+        published_at = event.published_at
+        metrics.dispatched(type(event).__name__, None if published_at is None
+                           else time.perf_counter() - published_at)
+        t0 = time.perf_counter()
+        for callback in handlers:
+            failed = False
+            try:
+                callback(event)
+            except Exception as e:
+                failed = True
+                self.handler_failed(callback, event, e)
+            t1 = time.perf_counter()
+            metrics.handled(getattr(callback, "__qualname__", repr(callback)),
+                            t1 - t0, failed)
+            t0 = t1
+        return len(handlers)
 
     def get_event_queue(self, event_type : str, create : bool = True) -> ATEventQueue:
         '''Get the event queue for the event type.
         If the queue already exists, return it.
         If the queue does not exist and create is True, create the event queue. 
         If the queue does not exist and create is False, return None.'''
-        logger.debug(f" event_type='{event_type}', create={create}, " \
-              f"event_queues({len(self.event_queues)})=" \
-                f"{list(self.event_queues.keys())}")
+        eq = self.event_queues.get(event_type)  # Fast path, no lock needed
+        if eq is not None or not create: return eq
         with self.lock:  # Ensure thread-safe access to event queues
-            logger.debug(f" Returning existing event queue for event type: " \
-                      f"{event_type}.")
-            if event_type in self.event_queues:
-                eq = self.event_queues[event_type]
-                logger.debug(f" Returning existing event queue for event type: " \
-                      f"{event_type}.")
-                return eq
-            elif create:
-                if self.add_event_queue(event_type):
-                    return self.event_queues[event_type]
-                else:
-                    return None
-            else:
-                return None
+            self.add_event_queue(event_type)
+            return self.event_queues.get(event_type)
         
-    def add_event_queue(self, event_type : str):
+    def add_event_queue(self, event_type : str, maxsize : int = None,
+                        policy : str = None):
         '''Add an event_queue to the EventManager for event_type if not
-        already added.'''
-        logger.debug(f" Entry: event_type='{event_type}' " + \
-              f"event_queues({len(self.event_queues)})=" + \
-              f"{list(self.event_queues.keys())}")
+        already added, with maxsize and policy, by default the queue_maxsize
+        and queue_policy of the EventManager.'''
+        maxsize = self.queue_maxsize if maxsize is None else maxsize
+        policy = self.queue_policy if policy is None else policy
         with self.lock: # Lock for one thread modifies event_queues at a time
             # Check if the event type already exists in the event queues
             if isinstance(event_type, str) and not event_type in self.event_queues :
                 # Add the event queue for event type if not already there.
-                #TODO: bug here
-                self.event_queues[event_type] = ATEventQueue()
-                logger.debug(f" Added event queue for event type: {event_type}" + \
+                eq = ATEventQueue(maxsize, policy, event_type)
+                eq.on_drop = self._acknowledge
+                self.event_queues[event_type] = eq
+                logger.debug(f" Added event queue for event type: {event_type} " + \
                       f"event_queues({len(self.event_queues)})=" + \
                       f"{list(self.event_queues.keys())}")
                 # True when new queue is added
                 return True
             else:
-                logger.debug(f" NOT Added event queue for event type: " + \
-                      f"{event_type}" + \
-                      f"event_queues({len(self.event_queues)})=" + \
-                      f"{list(self.event_queues.keys())}")
                 return False
 
-    def publish(self, event: ATEvent):
-        '''Publish an event to the event queue based on the event type'''
-        et = type(event).__name__; en = event.event_name
-        logger.debug(f":Entry event=[{et}.{en}]")
+    def publish(self, event: ATEvent) -> bool:
+        '''Publish an event to the event queue based on the event type.
+        When the queue is full, its policy blocks the publisher, drops the
+        oldest event or rejects the event. The event thread and the worker
+        pool threads are never blocked, as they could wait on themselves, 
+        so the event is rejected instead. Returns False if rejected.'''
         # Add the event to the appropriate event queue based on event type.
-        if self.get_event_queue(et):
+        et = type(event).__name__
+        metrics = self.metrics
+        if metrics is not None: event.published_at = time.perf_counter()
+        journal = self.journal
+        if journal is not None and len(event.journal_seqs) == 0:
+            seq = journal.append(et, event.event_name, event.priority,
+                                 event.event_data)
+            if seq is not None: event.journal_seqs = (seq,)
+        if self._coalescers:
+            coalescer = self._coalescers.get((et, event.event_name))
+            if coalescer is not None:
+                with self.lock: 
+                    first = coalescer.add(event)
+                    full = coalescer.take() if coalescer.full else None
+                if full is not None:  # Queue a full batch now
+                    self._queue_coalesced(et, full)
+                    self.signal_event.set()
+                # Wake the event thread to wait for the end of the window
+                elif first: self.signal_event.set()
+                return True
+        eq = self.get_event_queue(et)
+        if eq is None: return False
+        try:
+            eq.put(event, not self._is_dispatch_thread())
+        except queue.Full:
+            if metrics is not None and eq.policy == ATEM_POLICY_BLOCK:
+                metrics.rejected(et)  # Counted by the queue for 'reject'
+            logger.warning(f"event queue '{et}' is full, event " + \
+                           f"'{event.event_name}' rejected.")
+            self._acknowledge(event)
+            return False
+        if metrics is not None: metrics.published(et, eq.qsize())
+        # Signal the event thread to process the event, unless pooled, or
+        # to sync the journal
+        if et not in self.worker_pools or journal is not None:
+            self.signal_event.set()
+        return True
+
+    def _is_dispatch_thread(self) -> bool:
+        '''Return True if called on the event thread or a worker thread.'''
+        t = threading.current_thread()
+        if t is self.event_thread: return True
+        return any(pool.is_worker(t) for pool in self.worker_pools.values())
+
+    def set_workers(self, event_type: str, workers: int = 1, 
+                    key = None) -> ATEventWorkerPool:
+        '''Process the events of event_type with a pool of worker threads,
+        keeping the order of events with the same key(event), by default
+        ATEventWorkerPool.event_key(). Raises ValueError if the event type
+        already has workers.'''
+        with self.lock:
+            if event_type in self.worker_pools:
+                raise ValueError(f"event type '{event_type}' already has workers")
+            pool = ATEventWorkerPool(event_type, 
+                        self.get_event_queue(event_type), 
+                        self._process_queued_event, workers, key)
+            self.worker_pools[event_type] = pool
+        if self.running: pool.start()
+        return pool
+
+    def coalesce(self, event_name: str, event_type, window: float = 0.0,
+                 merge = None, max_batch: int = ATEM_COALESCE_MAX_BATCH
+                 ) -> ATEventCoalescer:
+        '''Coalesce the events with event_name of event_type, a class or 
+        name, published within window seconds of the first into one event,
+        merge(events), by default ATEventCoalescer.batch(). With window 0
+        the events published before the next pass of the event thread are
+        merged. A batch is queued as soon as it holds max_batch events.
+        Raises ValueError if the topic is already coalesced.'''
+        key = (ATEventRegistry.event_type_name(event_type), event_name)
+        with self.lock:
+            if key in self._coalescers:
+                raise ValueError(f"events {key} are already coalesced")
+            coalescer = ATEventCoalescer(key, window, merge, max_batch)
+            self._coalescers = {**self._coalescers, key: coalescer}
+        return coalescer
+
+    def enable_metrics(self, snapshot_interval: float = None,
+                       on_snapshot = None) -> ATEventMetrics:
+        '''Start recording new ATEventMetrics, passing a snapshot to 
+        on_snapshot(snapshot), by default logged, every snapshot_interval
+        seconds, if given. Returns the metrics.'''
+        self.metrics = ATEventMetrics(snapshot_interval, on_snapshot)
+        self.signal_event.set()  # Wake the event thread to schedule snapshots
+        return self.metrics
+
+    def disable_metrics(self) -> None:
+        '''Stop recording metrics.'''
+        self.metrics = None
+
+    def metrics_snapshot(self) -> dict:
+        '''Return ATEventMetrics.snapshot() for the event queues, None when
+        metrics are disabled.'''
+        metrics = self.metrics
+        return None if metrics is None else metrics.snapshot(self.event_queues)
+
+    def _next_timeout(self) -> float:
+        '''Return the seconds until coalesced events or a metrics snapshot
+        are due, None if none.'''
+        deadlines = [c.deadline for c in list(self._coalescers.values())
+                     if c.deadline is not None]
+        metrics = self.metrics
+        if metrics is not None and metrics.snapshot_due is not None:
+            deadlines.append(metrics.snapshot_due)
+        if len(deadlines) == 0: return None
+        return max(0.0, min(deadlines) - time.monotonic())
+
+    def _flush_coalesced(self) -> None:
+        '''Queue the merged events of the coalescers that are due.'''
+        for et, event in self._take_coalesced(): self._queue_coalesced(et, event)
+
+    def _take_coalesced(self, force: bool = False) -> list:
+        '''Return the (event type, merged event) of the coalescers that are 
+        due, or of all of them when force is True.'''
+        now = time.monotonic(); taken = []
+        for (et, en), coalescer in list(self._coalescers.items()):
             with self.lock:
-                self.event_queues[et].put(event)
-            logger.debug(f":Published Event[{et}.{en}] to queue: ")
+                if coalescer.deadline is None: continue
+                if not force and coalescer.deadline > now: continue
+                taken.append((et, coalescer.take()))
+        return taken
 
-        # Signal the event queue to process the event
-        if not self.signal_event.is_set():
-            self.signal_event.set()
-            logger.debug(f":Signal event set.")
+    def _queue_coalesced(self, et: str, event: ATEvent) -> None:
+        if self.metrics is not None: event.published_at = time.perf_counter()
+        self.get_event_queue(et).put_unbounded(event)
+
+    def _process_queued_event(self, event):
+        # Look up process_an_event per event, as it may be replaced
+        self.process_an_event(event)
+        if len(event.journal_seqs) > 0: self._acknowledge(event)
+
+    def _acknowledge(self, event):
+        '''Acknowledge a journaled event, once processed or dropped.'''
+        journal = self.journal
+        if journal is None: return
+        for seq in event.journal_seqs: journal.ack(seq)
+
+    def enable_journal(self, journal_uri, **options) -> int:
+        '''Journal the events published from now on to journal_uri, first 
+        publishing again the events left pending in it by an earlier run.
+        The options are those of ATEventJournal. Call before start(), so 
+        replayed events come before new ones. Returns the events replayed.'''
+        journal = ATEventJournal(journal_uri, **options)
+        records = journal.open()
+        self.journal = journal
+        classes = ATEventManager.event_classes()
+        for record in records:
+            cls = classes.get(record.get("type"), ATEvent)
+            event = cls(record.get("name"), record.get("data"),
+                        record.get("priority", ATEM_PRIORITY_NORMAL))
+            event.journal_seqs = (record["seq"],)
+            self.publish(event)
+        logger.debug(f" replayed {len(records)} events from '{journal_uri}'.")
+        return len(records)
+
+    @staticmethod
+    def event_classes() -> dict:
+        '''Return the ATEvent class and its subclasses by name.'''
+        classes = {}; todo = [ATEvent]
+        while todo:
+            cls = todo.pop()
+            classes[cls.__name__] = cls
+            todo.extend(cls.__subclasses__())
+        return classes
 
-    def subscribe(self, event_name, callback):
-        while not self.event_queue.empty():
-            event = self.event_queue.get()
-            if event.event_name == event_name:
-                callback(event)
 #endregion
 #------------------------------------------------------------------------------+
+#region dispatch_latency()
+def dispatch_latency(em: ATEventManager, count: int = 1000,
+                     interval: float = 0.0005) -> dict:
+    '''Benchmark the publish to dispatch latency of an event manager, 
+    publishing count events interval seconds apart to a subscribed handler.
+    Returns a dict of the 'count', 'mean', 'p50', 'p99' and 'max' latency 
+    in microseconds.'''
+    latencies = []
+    done = threading.Event()
+    def timed(event):
+        latencies.append(time.perf_counter() - event.event_data["sent"])
+        if len(latencies) == count: done.set()
+    em.subscribe("latency", timed, ATEvent)
+    em.start()
+    for _ in range(count):
+        em.publish(ATEvent("latency", {"sent": time.perf_counter()}))
+        time.sleep(interval)
+    done.wait()
+    em.unsubscribe("latency", timed, ATEvent)
+    us = sorted(t * 1e6 for t in latencies)
+    return {"count": count, "mean": sum(us) / count, "p50": us[count // 2],
+            "p99": us[min(count - 1, int(count * 0.99))], "max": us[-1]}
+
+def dispatch_throughput(em: ATEventManager, count: int = 100000,
+                        event_name: str = "throughput") -> float:
+    '''Benchmark the rate events are delivered to a subscribed handler, 
+    publishing count ATModelEvents with event_name as fast as possible. A
+    handler given a batch of coalesced events counts each of them.
+    Returns the events delivered per second.'''
+    delivered = [0]
+    done = threading.Event()
+    def handler(event):
+        data = event.event_data
+        delivered[0] += len(data[ATEM_BATCH_FIELD]) \
+            if ATEM_BATCH_FIELD in data else 1
+        if delivered[0] >= count: done.set()
+    em.subscribe(event_name, handler, ATModelEvent)
+    em.start()
+    t0 = time.perf_counter()
+    for i in range(count):
+        em.publish(ATModelEvent(event_name, {"seq": i}))
+    done.wait()
+    rate = count / (time.perf_counter() - t0)
+    em.unsubscribe(event_name, handler, ATModelEvent)
+    return rate
+#endregion dispatch_latency()
+#------------------------------------------------------------------------------+
 
 
 #------------------------------------------------------------------------------+
 #region local debugging code
 if __name__ == "__main__":
 
-    # Debug tests for the ATEventManager and related classes
-    myEM = ATEventManager()
-    myEM.start()  # Start the event manager thread
+    # Latency benchmark of the blocking ATEventManager against the former
+    # loop, which polled signal_event.wait(2.0), logged on every pass and
+    # cleared signal_event after draining the queues.
+    class PollingATEventManager(ATEventManager):
+        def process_events_loop(self):
+            while not self.stopped():
+                logger.debug(f" wait next event.")
+                if self.signal_event.is_set():
+                    all_queues_empty = True
+                    for et in list(self.event_queues):
+                        eq = self.event_queues[et]
+                        while not eq.empty():
+                            self.process_an_event(eq.get())
+                            all_queues_empty = False
+                    if all_queues_empty: self.signal_event.clear()
+                else:
+                    self.signal_event.wait(2.0)
+                    logger.debug(f" signal_event.wait(2.0) expired.")
 
-    import time
-    time.sleep(2)
+    for em in (PollingATEventManager(), ATEventManager()):
+        r = dispatch_latency(em, count=2000)
+        em.stop(timeout=5.0)
+        print(f"{type(em).__name__}: {r['count']} events, latency (us) " + \
+              f"mean={r['mean']:.1f} p50={r['p50']:.1f} " + \
+              f"p99={r['p99']:.1f} max={r['max']:.1f}")
 
-    # Create and publish events
-    event1 = ATModelEvent("ATModelEvent1", {"key1": "value1"})
-    event2 = ATViewModelEvent("ATViewModelEvent1", {"key2": "value2"})
-    event3 = ATViewEvent("ATViewEvent1", {"key3": "value3"})
-    event4 = ATEvent("ATEvent1", {"key4": "value4"})
-    # Allow some time for events to be processed
-    time.sleep(2)
+    # Dispatch time with 1 and with 5001 subscriptions, 5000 of them to 
+    # other topics, which the cached handlers make the same
+    em = ATEventManager()
+    event = ATViewEvent("clicked", {})
+    em.subscribe("clicked", lambda e: None, ATViewEvent)
+    for subscriptions in (1, 5001):
+        for i in range(len(em._subscriptions), subscriptions):
+            em.subscribe(f"name{i}", lambda e: None, ATViewEvent)
+        t0 = time.perf_counter()
+        for _ in range(100000): em.process_an_event(event)
+        dt = time.perf_counter() - t0
+        print(f"{subscriptions} subscriptions: {dt * 10:.2f} us/dispatch")
 
-    myEM.publish(event1)
-    time.sleep(2)  # Allow some time for events to be processed
-    myEM.publish(event2)
-    time.sleep(2)  # Allow some time for events to be processed
-    myEM.publish(event3)
+    # Throughput of ATModelEvents for 8 activity stores, with a handler 
+    # blocking 1ms as for a save, by the number of workers.
+    for workers in (1, 2, 4, 8):
+        em = ATEventManager()
+        em.set_workers(ATModelEvent.__name__, workers)
+        em.process_an_event = lambda event: time.sleep(0.001)
+        em.start()
+        t0 = time.perf_counter()
+        for i in range(800):
+            em.publish(ATModelEvent("changed", {"activityname": f"store{i % 8}"}))
+        em.stop()
+        dt = time.perf_counter() - t0
+        print(f"{workers} workers: {800 / dt:.0f} events/s")
 
-    time.sleep(2)  # Allow some time for events to be processed
+    # Throughput of events delivered one at a time, and in batches 
+    for window in (None, 0.0, 0.01):
+        em = ATEventManager()
+        if window is not None:
+            em.coalesce("throughput", ATModelEvent, window)
+        rate = dispatch_throughput(em)
+        em.stop(timeout=5.0)
+        m = "per event" if window is None else f"batch, window={window}s"
+        print(f"{m}: {rate:.0f} events/s")
 
-    # Stop the event manager
-    myEM.stop()
-#endregion local debugging code
+    # The cost of metrics
+    for enabled in (False, True):
+        em = ATEventManager()
+        if enabled: em.enable_metrics()
+        rate = dispatch_throughput(em)
+        em.stop(timeout=5.0)
+        print(f"metrics {'enabled' if enabled else 'disabled'}: {rate:.0f} events/s")
+        if enabled: print(em.metrics_snapshot())
 
+    # The cost of journaling, with fsync in batches
+    import tempfile, pathlib
+    with tempfile.TemporaryDirectory() as tmp:
+        em = ATEventManager()
+        em.enable_journal(pathlib.Path(tmp) / "events.jsonl")
+        rate = dispatch_throughput(em, count=20000)
+        em.stop(timeout=5.0)
+        print(f"journal enabled: {rate:.0f} events/s")
+#endregion local debugging code
@@ -1,8 +1,8 @@
 #------------------------------------------------------------------------------+
 # at_utils.py
-import datetime,threading, os, inspect, sys, debugpy
+import datetime,threading, os, inspect, math, sys, debugpy, zoneinfo
 from logging import Logger
-from typing import List, Optional
+from typing import Iterable, Iterator, List, Optional
 from atconstants import *
 #------------------------------------------------------------------------------+
 #region ISO 8601 Timestamp functional interface
@@ -88,6 +88,19 @@ def iso_date_approx(dt1:str, dt2:str, tolerance = 1) -> bool:
     retval : bool = (to_float(delta) <= to_float(tolerance))
     return retval
 
+ATU_ISO_DATE_KEY_EPOCH = datetime.datetime(1970, 1, 1)
+def iso_date_key(dt_str: str) -> float:
+    """Convert an ISO format string to a float sort key in seconds.
+    The key follows local wall-clock time, so it is monotonic with the
+    timestamp strings kept by ActivityEntry. Timezone aware values are first
+    converted to local time. Raises TypeError or ValueError."""
+    if not isinstance(dt_str, str):
+        t = type(dt_str).__name__
+        raise TypeError(f"type:str required for dt_str, not type: {t}")
+    dt = datetime.datetime.fromisoformat(dt_str)
+    if dt.tzinfo is not None: dt = dt.astimezone().replace(tzinfo=None)
+    return (dt - ATU_ISO_DATE_KEY_EPOCH).total_seconds()
+
 def to_int(value) -> int:
     """Convert float value to an int, if int, return it."""
     try:
@@ -295,6 +308,147 @@ def stop_str_or_default(stop: str = None, start: str = None) -> str:
     # Exception must have been raised by now, so we never arrive here.
     #endregion stop_str_or_default()
 
+#region split_duration_by_day()
+def split_duration_by_day(start: str, stop: str) -> List[tuple]:
+    '''Split the duration from start to stop at each midnight, returning a 
+    List of (day, hours) tuples where day is an ISO date string YYYY-MM-DD.
+    A zero or negative duration is returned whole for the start day.
+    Raises TypeError or ValueError.'''
+    hours = calculate_duration(start, stop)
+    start_dt = iso_date(start); stop_dt = iso_date(stop)
+    if hours <= 0.0: return [(start_dt.date().isoformat(), hours)]
+    ret = []
+    day_dt = start_dt
+    while day_dt < stop_dt:
+        next_day = datetime.datetime.combine(day_dt.date(), datetime.time(),
+                        tzinfo=day_dt.tzinfo) + datetime.timedelta(days=1)
+        part_end = min(next_day, stop_dt)
+        ret.append((day_dt.date().isoformat(),
+                    (part_end - day_dt).total_seconds() / 3600.0))
+        day_dt = part_end
+    return ret
+#endregion split_duration_by_day()
+
+#region iso_week_of_day()
+def iso_week_of_day(day: str) -> str:
+    '''Return the ISO 8601 week, as YYYY-Www, for an ISO date or timestamp
+    string. Raises TypeError or ValueError.'''
+    if not isinstance(day, str):
+        t = type(day).__name__
+        raise TypeError(f"type:str required for day, not type: {t}")
+    year, week, _ = datetime.datetime.fromisoformat(day).isocalendar()
+    return f"{year:04d}-W{week:02d}"
+#endregion iso_week_of_day()
+
+#region iso_week_bounds()
+def iso_week_bounds(week: str) -> tuple:
+    '''Return the (start, stop) ISO timestamp strings of an ISO 8601 week
+    YYYY-Www, from Monday midnight to the following Monday midnight.
+    Raises TypeError or ValueError.'''
+    if not isinstance(week, str):
+        t = type(week).__name__
+        raise TypeError(f"type:str required for week, not type: {t}")
+    try:
+        year, wk = week.split("-W")
+        monday = datetime.date.fromisocalendar(int(year), int(wk), 1)
+    except ValueError:
+        raise ValueError(f"Invalid ISO week value: '{week}'")
+    start = datetime.datetime.combine(monday, datetime.time())
+    return start.isoformat(), (start + datetime.timedelta(days=7)).isoformat()
+#endregion iso_week_bounds()
+
+#region recurrence_starts()
+ATU_RECURRENCE_FREQS = ("daily", "weekly", "monthly")
+def recurrence_starts(first: str, freq: str, interval: int = 1,
+                      weekdays: Iterable[int] = None, start: str = None,
+                      stop: str = None, until: str = None) -> Iterator[str]:
+    '''Lazily yield the ISO start timestamps of a recurrence beginning at
+    first, repeating every interval days, weeks or months for freq 'daily',
+    'weekly' or 'monthly', limited to [start, stop) and to until, inclusive.
+    Weekly recurrences repeat on the weekdays given, 0 for Monday, by 
+    default the weekday of first. Monthly recurrences skip months without
+    the day of the month of first. The first occurrence in the window is
+    found by arithmetic, not by stepping from first. Raises ValueError.'''
+    if freq not in ATU_RECURRENCE_FREQS:
+        raise ValueError(f"freq must be one of {ATU_RECURRENCE_FREQS}, not '{freq}'")
+    if not isinstance(interval, int) or interval < 1:
+        raise ValueError(f"interval must be a positive int, not '{interval}'")
+    f = iso_date(first)
+    lo = max(f, iso_date(start)) if start else f
+    hi = iso_date(stop) if stop else None
+    if until:
+        end = iso_date(until) + datetime.timedelta(microseconds=1)
+        hi = end if hi is None else min(hi, end)
+    if freq == "daily":
+        step = datetime.timedelta(days=interval)
+        t = f + step * math.ceil((lo - f) / step)
+        while hi is None or t < hi:
+            yield t.isoformat()
+            t += step
+    elif freq == "weekly":
+        days = sorted(set(weekdays)) if weekdays else [f.weekday()]
+        if any(not isinstance(d, int) or not 0 <= d <= 6 for d in days):
+            raise ValueError(f"weekdays must be ints from 0 to 6, not {days}")
+        step = datetime.timedelta(weeks=interval)
+        week = f - datetime.timedelta(days=f.weekday())
+        week += step * max(0, (lo - week) // step)
+        while True:
+            for d in days:
+                t = week + datetime.timedelta(days=d)
+                if t < lo: continue
+                if hi is not None and t >= hi: return
+                yield t.isoformat()
+            week += step
+    else:
+        months = (lo.year - f.year) * 12 + lo.month - f.month
+        m = max(0, months // interval) * interval
+        while True:
+            year, month = divmod(f.month - 1 + m, 12)
+            year += f.year; month += 1
+            m += interval
+            if hi is not None and f.replace(year=year, month=month, day=1) >= hi:
+                return
+            try:
+                t = f.replace(year=year, month=month)
+            except ValueError:
+                continue  # no such day in this month
+            if t < lo: continue
+            if hi is not None and t >= hi: return
+            yield t.isoformat()
+#endregion recurrence_starts()
+
+#region ical_date_to_iso()
+def ical_date_to_iso(value: str, tzid: str = None) -> str:
+    '''Convert an iCalendar (RFC 5545) DATE or DATE-TIME value to an ISO
+    timestamp string. Accepts forms like 20250322, 20250322T215744 and
+    20250322T215744Z. UTC values, and DATE-TIME values with the IANA time
+    zone tzid of a TZID parameter, are converted to naive local time to 
+    match the timestamps kept by ActivityEntry. Raises TypeError, or 
+    ValueError for an invalid value or an unknown tzid.'''
+    if not isinstance(value, str):
+        t = type(value).__name__
+        raise TypeError(f"type:str required for value, not type: {t}")
+    v = value.strip()
+    try:
+        if len(v) == 8:
+            dt = datetime.datetime.strptime(v, "%Y%m%d")
+        elif v.endswith("Z"):
+            dt = datetime.datetime.strptime(v[:-1], "%Y%m%dT%H%M%S")
+            dt = dt.replace(tzinfo=datetime.timezone.utc).astimezone()
+            dt = dt.replace(tzinfo=None)
+        else:
+            dt = datetime.datetime.strptime(v, "%Y%m%dT%H%M%S")
+    except ValueError:
+        raise ValueError(f"Invalid iCalendar date value: '{value}'")
+    if tzid is not None and len(v) > 8 and not v.endswith("Z"):
+        try:
+            tz = zoneinfo.ZoneInfo(tzid)
+        except (KeyError, ValueError):  # ZoneInfoNotFoundError is a KeyError
+            raise ValueError(f"Unknown iCalendar TZID: '{tzid}'")
+        dt = dt.replace(tzinfo=tz).astimezone().replace(tzinfo=None)
+    return dt.isoformat()
+#endregion ical_date_to_iso()
+
 #endregion Timestamp helper functions
 #------------------------------------------------------------------------------+
 #region parameter validation functions
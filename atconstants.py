@@ -12,4 +12,21 @@ AT_DEFAULT_ACTIVITY_STORE_URI = "activities.json"  # Activity store Default URI
 ATEM_VIEWMODEL_EVENT_TYPE = "ATViewModel_Events"
 ATEM_MODEL_EVENT_TYPE = "ATModel_Events"
 ATEM_VIEW_EVENT_TYPE = "ATView_Events"
+ATEM_EVENT_KEY_FIELD = "activityname"  # event_data key ordering pool events
+ATEM_BATCH_FIELD = "events"  # event_data key of a batch of coalesced events
+ATEM_COALESCE_MAX_BATCH = 1000  # most events merged into one batch
+ATEM_PRIORITY_HIGH = 0  # interactive events, such as user input
+ATEM_PRIORITY_NORMAL = 1
+ATEM_PRIORITY_LOW = 2  # background work
+ATEM_PRIORITIES = (ATEM_PRIORITY_HIGH, ATEM_PRIORITY_NORMAL, ATEM_PRIORITY_LOW)
+ATEM_QUEUE_MAXSIZE = 0  # default event queue capacity, 0 for unbounded
+ATEM_POLICY_BLOCK = "block"  # a full queue blocks the publisher
+ATEM_POLICY_DROP_OLDEST = "drop_oldest"  # drop the oldest, lowest priority
+ATEM_POLICY_REJECT = "reject"  # refuse the new event
+ATEM_QUEUE_POLICIES = (ATEM_POLICY_BLOCK, ATEM_POLICY_DROP_OLDEST,
+                       ATEM_POLICY_REJECT)
+ATEM_JOURNAL_FSYNC_INTERVAL = 0.05  # most seconds between event journal fsyncs
+ATEM_JOURNAL_FSYNC_BATCH = 256  # most journaled events between fsyncs
+ATEM_JOURNAL_COMPACT_EVERY = 1000  # acknowledgements between compactions
+ATEM_BUS_SOCKET_NAME = AT_APP_NAME + ".sock"  # event broker Unix socket name
 
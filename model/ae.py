@@ -1,5 +1,6 @@
 #-----------------------------------------------------------------------------+
 # ae.py
+import uuid
 import at_utilities.at_utils as atu
 from dataclasses import dataclass, field
 from model.atmodelconstants import TE_DEFAULT_DURATION, TE_DEFAULT_DURATION_SECONDS
@@ -32,6 +33,10 @@ class ActivityEntry:
         Calculated cacluated, read-only property, returns the float difference 
         between stop and start times in hours. Rationale for hours is that time 
         tracking will use fractional hour amounts for line item task work.
+    id : str
+        A stable unique identifier for the entry, generated when not given,
+        used to update or remove the entry in a model. It is not compared 
+        by ==, so entries with the same values are equal.
     """
     # @dataclass(kw_only=True)
     # class ActivityEntry:
@@ -41,6 +46,7 @@ class ActivityEntry:
     activity: str = None
     notes: str = None
     duration: float = field(init=False)  # computed with @property
+    id: str = field(default=None, compare=False)
     @property
     def duration(self) -> float:
         return atu.calculate_duration(self.start, self.stop)
@@ -71,6 +77,12 @@ class ActivityEntry:
             else self.activity
         self.notes: str = 'unset' if self.notes is None or len(self.notes) == 0 \
             else self.notes
+        self.id = self.id if atu.str_notempty(self.id) else ActivityEntry.new_id()
+
+    @staticmethod
+    def new_id() -> str:
+        """ Return a new unique entry id string. """
+        return uuid.uuid4().hex
 
     def to_dict(self) -> dict:
         """
@@ -82,7 +94,8 @@ class ActivityEntry:
             'stop': self.stop,
             'activity': self.activity,
             'notes': self.notes,
-            'duration': self.duration
+            'duration': self.duration,
+            'id': self.id
         }
         return ret
     
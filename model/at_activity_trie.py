@@ -0,0 +1,204 @@
+#-----------------------------------------------------------------------------+
+# at_activity_trie.py
+'''
+Module at_activity_trie provides ATActivityTrie, a prefix trie over the
+activity names of an ATModel for autocomplete as activities are entered.
+
+Names are ranked by a frecency score, a sum over their entries that decays
+by half every ATC_HALF_LIFE_DAYS before the entry start time, so names used
+often and recently rank first. The score is kept as a logarithm so it never
+overflows. Each trie node caches the names of its top ranked completions,
+so a completion takes time proportional to the prefix length, not to the
+number of distinct names. Prefixes match without regard to case.
+'''
+import math
+from typing import Dict, Iterable, List
+import at_utilities.at_utils as atu
+from model.ae import ActivityEntry
+
+ATC_HALF_LIFE_DAYS = 30.0  # days for an entry's score weight to halve
+ATC_TOP_K = 10  # completions cached at each trie node
+ATC_SCALE = math.log(2.0) / (ATC_HALF_LIFE_DAYS * 86400.0)  # per second
+#------------------------------------------------------------------------------+
+#region class ATTrieNode
+class ATTrieNode:
+    '''One node of the ATActivityTrie, for one character of a prefix.'''
+    __slots__ = ("children", "names", "top")
+
+    def __init__(self):
+        self.children: Dict[str, ATTrieNode] = {}
+        self.names: List[str] = []  # names ending at this node
+        self.top: List[str] = []  # best ranked names in this subtree
+#endregion class ATTrieNode
+#------------------------------------------------------------------------------+
+#region class ATActivityTrie
+class ATActivityTrie:
+    '''
+    ATActivityTrie ranks activity name completions for a prefix.
+
+    Properties
+    ----------
+    top_k : int
+        the most completions returned for a prefix
+
+    Methods
+    -------
+    rebuild(aes : Iterable[ActivityEntry]) -> None
+        rebuild the trie for the entries
+    add(ae : ActivityEntry) -> None
+        count an entry toward the score of its activity name
+    remove(ae : ActivityEntry) -> None
+        remove an entry's count from the score of its activity name
+    complete(prefix : str, k : int = None) -> List[str]
+        the k best ranked activity names starting with prefix
+    '''
+    def __init__(self, aes: Iterable[ActivityEntry] = None,
+                 top_k: int = ATC_TOP_K):
+        if not isinstance(top_k, int) or top_k < 1:
+            raise ValueError(f"top_k must be a positive int, not '{top_k}'")
+        self._top_k = top_k
+        self._root = ATTrieNode()
+        self._scores: Dict[str, float] = {}  # name -> log frecency score
+        self._counts: Dict[str, int] = {}  # name -> number of entries
+        if aes is not None: self.rebuild(aes)
+
+    def __len__(self) -> int:
+        return len(self._scores)
+
+    @property
+    def top_k(self) -> int:
+        return self._top_k
+
+    @staticmethod
+    def is_name(name: str) -> bool:
+        '''Return True if name is a non-empty activity name to complete.'''
+        return isinstance(name, str) and len(name) > 0
+
+    @staticmethod
+    def entry_weight(ae: ActivityEntry) -> float:
+        '''Return the log of the score weight of an entry.'''
+        return atu.iso_date_key(ae.start) * ATC_SCALE
+
+    #region rebuild(), add(), remove()
+    def rebuild(self, aes: Iterable[ActivityEntry]) -> None:
+        '''Rebuild the trie, scoring all entries before ranking once.'''
+        self._root = ATTrieNode(); self._scores = {}; self._counts = {}
+        for ae in aes:
+            if not ATActivityTrie.is_name(ae.activity): continue
+            w = ATActivityTrie.entry_weight(ae)
+            s = self._scores.get(ae.activity)
+            self._scores[ae.activity] = w if s is None else _log_add(s, w)
+            self._counts[ae.activity] = self._counts.get(ae.activity, 0) + 1
+        for name in self._scores:
+            node = self._root
+            for c in name.lower():
+                node = node.children.setdefault(c, ATTrieNode())
+            node.names.append(name)
+        self._rank_all()
+
+    def add(self, ae: ActivityEntry) -> None:
+        '''Add an entry to the score of its activity name. A higher score
+        can only move the name up, so the path nodes are updated in place.'''
+        name = ae.activity
+        if not ATActivityTrie.is_name(name): return
+        w = ATActivityTrie.entry_weight(ae)
+        s = self._scores.get(name)
+        self._scores[name] = w if s is None else _log_add(s, w)
+        self._counts[name] = self._counts.get(name, 0) + 1
+        path = self._path(name, create=True)
+        if s is None: path[-1].names.append(name)
+        for node in path:
+            if name in node.top:
+                self._sort(node.top)
+            elif len(node.top) < self._top_k:
+                node.top.append(name); self._sort(node.top)
+            elif self._rank(name) < self._rank(node.top[-1]):
+                node.top[-1] = name; self._sort(node.top)
+
+    def remove(self, ae: ActivityEntry) -> None:
+        '''Remove an entry from the score of its activity name. Path nodes
+        ranking the name are re-ranked from their children, bottom up.'''
+        name = ae.activity
+        if name not in self._counts: return
+        self._counts[name] -= 1
+        path = self._path(name)
+        if self._counts[name] == 0:
+            del self._counts[name]; del self._scores[name]
+            path[-1].names.remove(name)
+        else:
+            self._scores[name] = _log_sub(self._scores[name],
+                                          ATActivityTrie.entry_weight(ae))
+        for node in reversed(path):
+            if name in node.top: self._rank_node(node)
+        # The path follows name.lower(), which may be longer than name
+        lowered = name.lower()
+        for i in range(len(path) - 1, 0, -1):
+            node = path[i]
+            if len(node.children) > 0 or len(node.names) > 0: break
+            del path[i - 1].children[lowered[i - 1]]
+    #endregion rebuild(), add(), remove()
+    #--------------------------------------------------------------------------+
+    #region complete()
+    def complete(self, prefix: str, k: int = None) -> List[str]:
+        '''Return up to k activity names starting with prefix, ignoring
+        case, best ranked first. k defaults to, and is limited by, top_k.
+        Raises TypeError if prefix is not a str.'''
+        if not isinstance(prefix, str):
+            t = type(prefix).__name__
+            raise TypeError(f"prefix must be type:str, not type:'{t}'")
+        k = self._top_k if k is None else min(k, self._top_k)
+        node = self._root
+        for c in prefix.lower():
+            node = node.children.get(c)
+            if node is None: return []
+        return node.top[:k]
+    #endregion complete()
+    #--------------------------------------------------------------------------+
+    #region ATActivityTrie ranking
+    def _rank(self, name: str) -> tuple:
+        '''Return the sort key ranking name, best first.'''
+        return (-self._scores[name], name)
+
+    def _sort(self, names: List[str]) -> None:
+        names.sort(key=self._rank)
+
+    def _path(self, name: str, create: bool = False) -> List[ATTrieNode]:
+        '''Return the nodes from the root to the node for name.'''
+        path = [self._root]
+        for c in name.lower():
+            children = path[-1].children
+            if create: path.append(children.setdefault(c, ATTrieNode()))
+            else: path.append(children[c])
+        return path
+
+    def _rank_node(self, node: ATTrieNode) -> None:
+        '''Rank node.top from its own names and its children's top names.'''
+        names = list(node.names)
+        for child in node.children.values(): names.extend(child.top)
+        self._sort(names)
+        node.top = names[:self._top_k]
+
+    def _rank_all(self) -> None:
+        '''Rank every node, children before parents.'''
+        order: List[ATTrieNode] = []
+        stack = [self._root]
+        while stack:
+            node = stack.pop()
+            order.append(node)
+            stack.extend(node.children.values())
+        for node in reversed(order): self._rank_node(node)
+    #endregion ATActivityTrie ranking
+#endregion class ATActivityTrie
+#------------------------------------------------------------------------------+
+#region log score helpers
+def _log_add(a: float, b: float) -> float:
+    '''Return log(exp(a) + exp(b)) without overflow.'''
+    if a < b: a, b = b, a
+    return a + math.log1p(math.exp(b - a))
+
+def _log_sub(a: float, b: float) -> float:
+    '''Return log(exp(a) - exp(b)), or -inf when b is not less than a.'''
+    if b >= a: return float("-inf")
+    return a + math.log1p(-math.exp(b - a))
+#endregion log score helpers
+#------------------------------------------------------------------------------+
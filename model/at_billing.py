@@ -0,0 +1,186 @@
+#-----------------------------------------------------------------------------+
+# at_billing.py
+'''
+Module at_billing provides a batch billing engine turning the activities of
+one or more ATModel instances into billing line items, one per user, period
+and activity or client, with the durations rounded to billing increments.
+
+Activities carry no client, so a client is found from the activity name
+with a mapping or a function, defaulting to the activity name itself.
+Durations are rounded in increments of minutes, such as 6 minutes (0.1
+hour) or 15 minutes (0.25 hour), up, down or to the nearest increment,
+either for each entry or once for each line item.
+
+Line items are streamed: the activities of a model are read in start time
+order from ATModel.iter_activities() for the billing range, found by binary
+search, and the line items of a period are yielded as soon as the next
+period begins, so only one period of totals is held at a time.
+'''
+import csv, logging, math
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, Iterator, List
+import at_utilities.at_utils as atu
+from atconstants import AT_APP_NAME
+from model.base_atmodel.atmodel import ATModel
+from model.at_export import validate_export_uri
+from model.at_query import ATQ_GROUP_KEYS
+
+logger = logging.getLogger(AT_APP_NAME)  # create logger for the module
+
+ATB_INCREMENT_MINUTES = 6  # default billing increment, a tenth of an hour
+ATB_ROUNDING_MODES = ("up", "nearest", "down")
+ATB_APPLY_TO = ("entry", "item")  # round each entry, or each line item
+ATB_GROUP_BY = ("activity", "client")
+ATB_PERIODS = ("month", "week", "day")
+ATB_FIELDS = ("user", "period", "client", "activity", "entries", "hours",
+              "billed_hours", "rate", "amount")
+#------------------------------------------------------------------------------+
+#region class ATLineItem
+@dataclass(kw_only=True)
+class ATLineItem:
+    '''
+    ATLineItem is one billing line item.
+
+    Attributes
+    ----------
+    user : str
+        the activityname of the model billed
+    period : str
+        the billing period, 'YYYY-MM', 'YYYY-Www' or 'YYYY-MM-DD'
+    client : str
+        the client billed
+    activity : str
+        the activity billed, None when grouped by client
+    entries : int
+        the number of activities in the line item
+    hours : float
+        the total duration in hours before rounding
+    billed_hours : float
+        the duration in hours after rounding
+    rate : float
+        the hourly rate for the client, None if not given
+    amount : float
+        billed_hours * rate rounded to cents, None without a rate
+    '''
+    user: str = None
+    period: str = None
+    client: str = None
+    activity: str = None
+    entries: int = 0
+    hours: float = 0.0
+    billed_hours: float = 0.0
+    rate: float = None
+    amount: float = None
+
+    def to_dict(self) -> dict:
+        return {f: getattr(self, f) for f in ATB_FIELDS}
+#endregion class ATLineItem
+#------------------------------------------------------------------------------+
+#region round_minutes()
+def round_minutes(minutes: float, increment: int = ATB_INCREMENT_MINUTES,
+                  mode: str = "up") -> int:
+    """ Round minutes to a whole number of increment minutes, returned in
+        minutes, rounding up, down or to the nearest increment with halves
+        rounded up. Raises ValueError."""
+    if not isinstance(increment, int) or increment < 1:
+        raise ValueError(f"increment must be a positive int, not '{increment}'")
+    if mode not in ATB_ROUNDING_MODES:
+        raise ValueError(f"mode must be one of {ATB_ROUNDING_MODES}, not '{mode}'")
+    units = round(minutes / increment, 6)  # drop float noise before rounding
+    if mode == "up": units = math.ceil(units)
+    elif mode == "down": units = math.floor(units)
+    else: units = math.floor(units + 0.5)
+    return units * increment
+#endregion round_minutes()
+#------------------------------------------------------------------------------+
+#region iter_line_items()
+def iter_line_items(atms: ATModel | Iterable[ATModel], start: str = None,
+                    stop: str = None, period: str = "month",
+                    group_by: str = "activity",
+                    clients: Dict[str, str] | Callable[[str], str] = None,
+                    rates: Dict[str, float] | float = None,
+                    increment: int = ATB_INCREMENT_MINUTES,
+                    rounding: str = "up",
+                    apply_to: str = "entry") -> Iterator[ATLineItem]:
+    """ Stream the billing line items for the activities of each model
+        starting in [start, stop), per model, period and activity or client.
+        clients maps an activity name to its client, by dict or function,
+        and rates gives the hourly rate per client, or one rate for all.
+        Line items of a period are in order of client, then activity.
+        Raises TypeError or ValueError."""
+    if isinstance(atms, ATModel): atms = [atms]
+    if period not in ATB_PERIODS:
+        raise ValueError(f"period must be one of {ATB_PERIODS}, not '{period}'")
+    if group_by not in ATB_GROUP_BY:
+        raise ValueError(f"group_by must be one of {ATB_GROUP_BY}, not '{group_by}'")
+    if apply_to not in ATB_APPLY_TO:
+        raise ValueError(f"apply_to must be one of {ATB_APPLY_TO}, not '{apply_to}'")
+    round_minutes(0, increment, rounding)  # validate the rounding rule
+    client_of = _client_function(clients)
+    period_of = ATQ_GROUP_KEYS[period]
+    for atm in atms:
+        _ = atu.is_obj_of_type("atm", atm, ATModel, True)
+        items: Dict[tuple, ATLineItem] = {}
+        current = None
+        for ae in atm.iter_activities(start, stop):
+            p = period_of(ae)
+            if p != current:
+                yield from _finish_items(items, rates, increment, rounding,
+                                         apply_to)
+                items = {}; current = p
+            client = client_of(ae.activity)
+            activity = ae.activity if group_by == "activity" else None
+            item = items.get((client, activity))
+            if item is None:
+                item = items[(client, activity)] = ATLineItem(
+                    user=atm.activityname, period=p, client=client,
+                    activity=activity)
+            minutes = ae.duration * 60.0
+            item.entries += 1
+            item.hours += ae.duration
+            if apply_to == "entry":
+                item.billed_hours += round_minutes(minutes, increment,
+                                                   rounding) / 60.0
+        yield from _finish_items(items, rates, increment, rounding, apply_to)
+
+def _client_function(clients) -> Callable[[str], str]:
+    if clients is None: return lambda activity: activity
+    if isinstance(clients, dict):
+        return lambda activity: clients.get(activity, activity)
+    if callable(clients): return clients
+    t = type(clients).__name__
+    raise TypeError(f"clients must be a dict or callable, not type:'{t}'")
+
+def _finish_items(items: Dict[tuple, ATLineItem], rates, increment: int,
+                  rounding: str, apply_to: str) -> Iterator[ATLineItem]:
+    '''Round and price the line items of a period, yielding them sorted.'''
+    for key in sorted(items, key=lambda k: (k[0], k[1] or "")):
+        item = items[key]
+        if apply_to == "item":
+            item.billed_hours = round_minutes(item.hours * 60.0, increment,
+                                              rounding) / 60.0
+        item.billed_hours = round(item.billed_hours, 6)
+        item.rate = rates.get(item.client) if isinstance(rates, dict) else rates
+        if item.rate is not None:
+            item.amount = round(item.billed_hours * item.rate, 2)
+        yield item
+#endregion iter_line_items()
+#------------------------------------------------------------------------------+
+#region export_billing_csv()
+def export_billing_csv(atms: ATModel | Iterable[ATModel], export_uri,
+                       **options) -> int:
+    """ Stream the billing line items of the models to a CSV file with a
+        header row. The options are those of iter_line_items().
+        Returns the line item count."""
+    path = validate_export_uri(export_uri)
+    count = 0
+    with open(path, "w", newline="", encoding="utf-8") as file:
+        writer = csv.writer(file)
+        writer.writerow(ATB_FIELDS)
+        for item in iter_line_items(atms, **options):
+            writer.writerow([getattr(item, f) for f in ATB_FIELDS])
+            count += 1
+    logger.debug(f"Exported {count} billing line items to CSV file '{path}'")
+    return count
+#endregion export_billing_csv()
+#------------------------------------------------------------------------------+
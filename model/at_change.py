@@ -0,0 +1,134 @@
+#-----------------------------------------------------------------------------+
+# at_change.py
+'''
+Module at_change provides ATChange, a minimal record of one change to the
+activities of an ATModel, returned by the model's add, update and remove
+operations for journaling and for refreshing only what changed in a view.
+
+An ATChange names the entry by its stable id and holds the field values
+before and after the change. An added entry has only after values, a
+removed entry only before values, and an updated entry the changed fields
+on each side. The start and stop are always included, so the time range
+affected by the change is known.
+
+Changes to the recurring activity templates of a model are recorded the
+same way. An added or removed template is named by its id, with its
+to_dict() values on one side, and may affect any time from its start on.
+An occurrence excluded from its template, as when it is materialized, or
+included again, is named by its occurrence id, with its start and stop.
+'''
+from dataclasses import dataclass
+from typing import Tuple
+from model.ae import ActivityEntry
+
+ATCH_ADDED = "added"
+ATCH_UPDATED = "updated"
+ATCH_REMOVED = "removed"
+ATCH_RECURRENCE_ADDED = "recurrence_added"
+ATCH_RECURRENCE_REMOVED = "recurrence_removed"
+ATCH_OCCURRENCE_EXCLUDED = "occurrence_excluded"
+ATCH_OCCURRENCE_INCLUDED = "occurrence_included"
+ATCH_KINDS = (ATCH_ADDED, ATCH_UPDATED, ATCH_REMOVED, ATCH_RECURRENCE_ADDED,
+              ATCH_RECURRENCE_REMOVED, ATCH_OCCURRENCE_EXCLUDED, 
+              ATCH_OCCURRENCE_INCLUDED)
+ATCH_INVERSE_KINDS = {ATCH_ADDED: ATCH_REMOVED, ATCH_REMOVED: ATCH_ADDED,
+                      ATCH_UPDATED: ATCH_UPDATED,
+                      ATCH_RECURRENCE_ADDED: ATCH_RECURRENCE_REMOVED,
+                      ATCH_RECURRENCE_REMOVED: ATCH_RECURRENCE_ADDED,
+                      ATCH_OCCURRENCE_EXCLUDED: ATCH_OCCURRENCE_INCLUDED,
+                      ATCH_OCCURRENCE_INCLUDED: ATCH_OCCURRENCE_EXCLUDED}
+ATCH_OPEN_STOP = "9999-12-31T23:59:59"  # the stop of a template time range
+ATCH_FIELDS = ("start", "stop", "activity", "notes")  # editable fields
+#------------------------------------------------------------------------------+
+#region class ATChange
+@dataclass(frozen=True, kw_only=True)
+class ATChange:
+    '''
+    ATChange records one added, updated or removed ActivityEntry, or one
+    change to the recurring activity templates.
+
+    Attributes
+    ----------
+    kind : str
+        one of ATCH_KINDS
+    entry_id : str
+        the id of the changed ActivityEntry, recurrence or occurrence
+    before : dict
+        field values before the change, None for an added entry
+    after : dict
+        field values after the change, None for a removed entry
+    time_range : Tuple[str, str]
+        read-only, the (start, stop) span covering before and after
+    '''
+    kind: str
+    entry_id: str
+    before: dict = None
+    after: dict = None
+
+    def __post_init__(self):
+        if self.kind not in ATCH_KINDS:
+            raise ValueError(f"kind must be one of {ATCH_KINDS}, not '{self.kind}'")
+
+    @property
+    def time_range(self) -> Tuple[str, str]:
+        sides = [d for d in (self.before, self.after) if d is not None]
+        start = min(d["start"] for d in sides)
+        if self.kind in (ATCH_RECURRENCE_ADDED, ATCH_RECURRENCE_REMOVED):
+            return (start, ATCH_OPEN_STOP)
+        return (start, max(d["stop"] for d in sides))
+
+    def to_dict(self) -> dict:
+        '''Return the change as a dictionary for json serialization.'''
+        return {"kind": self.kind, "entry_id": self.entry_id,
+                "before": self.before, "after": self.after}
+
+    def inverse(self) -> 'ATChange':
+        '''Return the change that undoes this change.'''
+        return ATChange(kind=ATCH_INVERSE_KINDS[self.kind], 
+                        entry_id=self.entry_id,
+                        before=self.after, after=self.before)
+
+    @staticmethod
+    def entry_values(ae: ActivityEntry) -> dict:
+        '''Return the editable field values of an entry.'''
+        return {f: getattr(ae, f) for f in ATCH_FIELDS}
+
+    @staticmethod
+    def added(ae: ActivityEntry) -> 'ATChange':
+        return ATChange(kind=ATCH_ADDED, entry_id=ae.id,
+                        after=ATChange.entry_values(ae))
+
+    @staticmethod
+    def removed(ae: ActivityEntry) -> 'ATChange':
+        return ATChange(kind=ATCH_REMOVED, entry_id=ae.id,
+                        before=ATChange.entry_values(ae))
+
+    @staticmethod
+    def recurrence_added(r) -> 'ATChange':
+        return ATChange(kind=ATCH_RECURRENCE_ADDED, entry_id=r.id,
+                        after=r.to_dict())
+
+    @staticmethod
+    def recurrence_removed(r) -> 'ATChange':
+        return ATChange(kind=ATCH_RECURRENCE_REMOVED, entry_id=r.id,
+                        before=r.to_dict())
+
+    @staticmethod
+    def occurrence_excluded(occurrence: ActivityEntry) -> 'ATChange':
+        return ATChange(kind=ATCH_OCCURRENCE_EXCLUDED, entry_id=occurrence.id,
+                        after={"start": occurrence.start, 
+                               "stop": occurrence.stop})
+
+    @staticmethod
+    def updated(old: ActivityEntry, new: ActivityEntry) -> 'ATChange':
+        '''Return the change from old to new values of an entry, with only
+        the changed fields plus start and stop, or None if nothing changed.'''
+        before, after = ATChange.entry_values(old), ATChange.entry_values(new)
+        changed = [f for f in ATCH_FIELDS if before[f] != after[f]]
+        if len(changed) == 0: return None
+        keep = set(changed) | {"start", "stop"}
+        return ATChange(kind=ATCH_UPDATED, entry_id=old.id,
+                        before={f: before[f] for f in ATCH_FIELDS if f in keep},
+                        after={f: after[f] for f in ATCH_FIELDS if f in keep})
+#endregion class ATChange
+#------------------------------------------------------------------------------+
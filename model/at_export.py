@@ -0,0 +1,142 @@
+#-----------------------------------------------------------------------------+
+# at_export.py
+'''
+Module at_export provides streaming exporters to get activity data out of an
+ATModel for downstream analytics. Exporters read the ActivityEntry objects
+directly from ATModel.iter_activities(), so no list of dicts or other copy
+of the model is built, and rows are written as they are read.
+
+CSV export uses the standard library csv module. Columnar export writes
+Parquet or Arrow IPC files in record batches of a bounded size and requires
+the optional pyarrow package. Both support the time range and activity
+filters of ATModel.iter_activities().
+
+Timestamps are exported as ISO format strings, following the design decision
+to keep all dates as strings, and duration is exported as float hours.
+'''
+import csv, logging, pathlib
+from typing import Iterable, Iterator, List
+import at_utilities.at_utils as atu
+from atconstants import AT_APP_NAME
+from model.ae import ActivityEntry
+from model.base_atmodel.atmodel import ATModel
+from model.atmodelconstants import ATM_EXPORT_BATCH_SIZE
+try:
+    import pyarrow as pa
+    import pyarrow.ipc as pa_ipc
+    import pyarrow.parquet as pa_parquet
+except ImportError: # pragma: no cover
+    pa = None
+
+logger = logging.getLogger(AT_APP_NAME)  # create logger for the module
+
+ATX_FIELDS = ("start", "stop", "activity", "notes", "duration")
+ATX_COLUMNAR_SUFFIXES = {".parquet": "parquet", ".arrow": "arrow",
+                         ".feather": "arrow", ".ipc": "arrow"}
+#------------------------------------------------------------------------------+
+#region validate_export_uri()
+def validate_export_uri(export_uri) -> pathlib.Path:
+    """ Validate the export_uri is a non-empty str or a pathlib.Path.
+        Raises TypeError."""
+    if isinstance(export_uri, str) and len(export_uri) > 0:
+        export_uri = pathlib.Path(export_uri)
+    if not isinstance(export_uri, pathlib.Path):
+        t = type(export_uri).__name__
+        raise TypeError(f"export_uri must be type:'str' or 'Path', not type:'{t}'")
+    return export_uri
+#endregion validate_export_uri()
+#------------------------------------------------------------------------------+
+#region export_csv()
+def export_csv(atm: ATModel, export_uri, start: str = None, stop: str = None,
+               activity: str | Iterable[str] = None) -> int:
+    """ Stream the activities of atm to a CSV file with a header row.
+        Filters are passed to atm.iter_activities(). Returns the row count."""
+    _ = atu.is_obj_of_type("atm", atm, ATModel, True)
+    path = validate_export_uri(export_uri)
+    count = 0
+    with open(path, "w", newline="", encoding="utf-8") as file:
+        writer = csv.writer(file)
+        writer.writerow(ATX_FIELDS)
+        for ae in atm.iter_activities(start, stop, activity):
+            writer.writerow((ae.start, ae.stop, ae.activity, ae.notes,
+                             ae.duration))
+            count += 1
+    logger.debug(f"Exported {count} activities to CSV file '{path}'")
+    return count
+#endregion export_csv()
+#------------------------------------------------------------------------------+
+#region export_columnar()
+def arrow_schema():
+    """ Return the pyarrow schema used for columnar activity exports. """
+    return pa.schema([("start", pa.string()), ("stop", pa.string()),
+                      ("activity", pa.string()), ("notes", pa.string()),
+                      ("duration", pa.float64())])
+
+def iter_record_batches(aes: Iterable[ActivityEntry],
+                        batch_size: int = ATM_EXPORT_BATCH_SIZE) -> Iterator:
+    """ Yield pyarrow RecordBatch objects of at most batch_size rows built
+        column by column from a stream of ActivityEntry objects."""
+    schema = arrow_schema()
+    columns: List[list] = [[] for _ in ATX_FIELDS]
+    for ae in aes:
+        columns[0].append(ae.start); columns[1].append(ae.stop)
+        columns[2].append(ae.activity); columns[3].append(ae.notes)
+        columns[4].append(ae.duration)
+        if len(columns[0]) >= batch_size:
+            yield pa.RecordBatch.from_arrays(columns, schema=schema)
+            columns = [[] for _ in ATX_FIELDS]
+    if len(columns[0]) > 0:
+        yield pa.RecordBatch.from_arrays(columns, schema=schema)
+
+def export_columnar(atm: ATModel, export_uri, start: str = None,
+                    stop: str = None, activity: str | Iterable[str] = None,
+                    file_format: str = None,
+                    batch_size: int = ATM_EXPORT_BATCH_SIZE) -> int:
+    """ Stream the activities of atm to a Parquet or Arrow IPC file in
+        record batches of batch_size rows. The file_format is 'parquet' or
+        'arrow', by default chosen from the export_uri suffix. Filters are
+        passed to atm.iter_activities(). Returns the row count.
+        Raises ImportError if pyarrow is not installed."""
+    if pa is None: # pragma: no cover
+        raise ImportError("Columnar export requires the pyarrow package")
+    _ = atu.is_obj_of_type("atm", atm, ATModel, True)
+    path = validate_export_uri(export_uri)
+    if file_format is None:
+        file_format = ATX_COLUMNAR_SUFFIXES.get(path.suffix.lower(), "parquet")
+    if file_format not in ("parquet", "arrow"):
+        raise ValueError(f"file_format must be 'parquet' or 'arrow', " + \
+                         f"not '{file_format}'")
+    if not isinstance(batch_size, int) or batch_size < 1:
+        raise ValueError(f"batch_size must be a positive int, not '{batch_size}'")
+    schema = arrow_schema()
+    count = 0
+    if file_format == "parquet":
+        writer = pa_parquet.ParquetWriter(path, schema)
+    else:
+        writer = pa_ipc.new_file(path, schema)
+    try:
+        aes = atm.iter_activities(start, stop, activity)
+        for batch in iter_record_batches(aes, batch_size):
+            writer.write_batch(batch)
+            count += batch.num_rows
+    finally:
+        writer.close()
+    logger.debug(f"Exported {count} activities to {file_format} file '{path}'")
+    return count
+#endregion export_columnar()
+#------------------------------------------------------------------------------+
+#region export_file()
+def export_file(atm: ATModel, export_uri, start: str = None, stop: str = None,
+                activity: str | Iterable[str] = None) -> int:
+    """ Export the activities of atm choosing the exporter by file suffix,
+        .csv, .parquet, or .arrow, .feather and .ipc for Arrow IPC.
+        Raises ValueError for other suffixes."""
+    path = validate_export_uri(export_uri)
+    suffix = path.suffix.lower()
+    if suffix == ".csv":
+        return export_csv(atm, path, start, stop, activity)
+    if suffix in ATX_COLUMNAR_SUFFIXES:
+        return export_columnar(atm, path, start, stop, activity)
+    raise ValueError(f"Unsupported export file type: '{suffix}'")
+#endregion export_file()
+#------------------------------------------------------------------------------+
@@ -0,0 +1,108 @@
+#-----------------------------------------------------------------------------+
+# at_history.py
+'''
+Module at_history provides ATHistory, the undo and redo stacks of an ATModel.
+
+Each step on the stacks is the tuple of ATChange records made by one model
+operation, such as one add_activity() or one add_activities() batch. The
+records hold only the changed field values, so a step costs memory in
+proportion to the change, not to the size of the model, and no copies of
+the activities List are kept. The model undoes a step by applying the
+inverse of its changes, and redoes it by applying them again, through its
+indexed update and remove operations.
+'''
+import collections, contextlib
+from typing import Iterable, Iterator, List, Tuple
+from model.at_change import ATChange
+from model.atmodelconstants import ATM_UNDO_DEPTH
+
+#------------------------------------------------------------------------------+
+#region class ATHistory
+class ATHistory:
+    '''
+    ATHistory keeps the undo and redo steps of a model.
+
+    Properties
+    ----------
+    can_undo : bool
+        True if there is a step to undo
+    can_redo : bool
+        True if there is a step to redo
+    max_steps : int
+        the most undo steps kept, older steps are dropped
+    is_replaying : bool
+        True while the model applies a step
+
+    Methods
+    -------
+    record(changes : Iterable[ATChange]) -> None
+        push a step of changes to undo, clearing the redo steps
+    pop_undo() -> Tuple[ATChange]
+        pop the step to undo, None if there is none
+    pop_redo() -> Tuple[ATChange]
+        pop the step to redo, None if there is none
+    push_undo(step) / push_redo(step) -> None
+        push a step after it was redone or undone
+    replaying() -> context manager
+        ignore record() while the model applies a step
+    clear() -> None
+        drop all steps
+    '''
+    def __init__(self, max_steps: int = ATM_UNDO_DEPTH):
+        if not isinstance(max_steps, int) or max_steps < 1:
+            raise ValueError(f"max_steps must be a positive int, not '{max_steps}'")
+        self._undo: collections.deque = collections.deque(maxlen=max_steps)
+        self._redo: List[Tuple[ATChange, ...]] = []
+        self._replaying = False
+
+    @property
+    def can_undo(self) -> bool:
+        return len(self._undo) > 0
+
+    @property
+    def can_redo(self) -> bool:
+        return len(self._redo) > 0
+
+    @property
+    def max_steps(self) -> int:
+        return self._undo.maxlen
+
+    @property
+    def is_replaying(self) -> bool:
+        return self._replaying
+
+    def record(self, changes: Iterable[ATChange]) -> None:
+        '''Push the changes of one operation as an undo step. A new step
+        clears the redo steps. Ignored while replaying.'''
+        if self._replaying: return
+        step = tuple(c for c in changes if c is not None)
+        if len(step) == 0: return
+        self._undo.append(step)
+        self._redo.clear()
+
+    def pop_undo(self) -> Tuple[ATChange, ...]:
+        return self._undo.pop() if self.can_undo else None
+
+    def pop_redo(self) -> Tuple[ATChange, ...]:
+        return self._redo.pop() if self.can_redo else None
+
+    def push_undo(self, step: Tuple[ATChange, ...]) -> None:
+        self._undo.append(step)
+
+    def push_redo(self, step: Tuple[ATChange, ...]) -> None:
+        self._redo.append(step)
+
+    @contextlib.contextmanager
+    def replaying(self) -> Iterator[None]:
+        '''Ignore record() calls within the context.'''
+        self._replaying = True
+        try:
+            yield
+        finally:
+            self._replaying = False
+
+    def clear(self) -> None:
+        self._undo.clear()
+        self._redo.clear()
+#endregion class ATHistory
+#------------------------------------------------------------------------------+
@@ -0,0 +1,266 @@
+#-----------------------------------------------------------------------------+
+# at_import.py
+'''
+Module at_import provides bulk importers to migrate activity data from other
+time trackers into an ATModel. CSV and iCalendar (.ics) files are read as a
+stream of raw records, one record per activity, so a large history is never
+held in memory all at once. Raw records are validated in batches by
+constructing ActivityEntry objects, and each valid batch is appended to the
+model with a single ATModel.add_activities() call, so the model metadata is
+updated once per batch rather than once per entry. Imported batches are not
+recorded as undo steps, so an import does not fill the undo history.
+
+CSV files must have a header row. The columns used are start, stop, activity
+and notes. A duration column, in hours, is used only when stop is empty.
+Other columns are ignored.
+
+iCalendar files contribute one record per VEVENT component, using DTSTART,
+DTEND (or DURATION), SUMMARY as the activity and DESCRIPTION as the notes.
+Only the properties of the VEVENT itself are used, not those of components
+nested in it, such as a VALARM. Times with a TZID parameter are converted
+from that time zone to local time, and an unknown TZID makes the record
+invalid.
+
+Records are validated and added one batch at a time. With skip_invalid
+False, an invalid record raises in its batch after the earlier batches
+were added to the model, and the exception notes how many were added.
+'''
+import csv, logging, pathlib, re
+from typing import Iterable, Iterator, List, Tuple
+import at_utilities.at_utils as atu
+from atconstants import AT_APP_NAME
+from model.ae import ActivityEntry
+from model.base_atmodel.atmodel import ATModel
+from model.atmodelconstants import ATM_IMPORT_BATCH_SIZE
+
+logger = logging.getLogger(AT_APP_NAME)  # create logger for the module
+
+ATI_RECORD_FIELDS = ("start", "stop", "activity", "notes")
+ATI_ICS_DURATION_RE = re.compile(
+    r"^P(?:(?P<weeks>\d+)W)?(?:(?P<days>\d+)D)?"
+    r"(?:T(?:(?P<hours>\d+)H)?(?:(?P<minutes>\d+)M)?(?:(?P<seconds>\d+)S)?)?$")
+#------------------------------------------------------------------------------+
+#region validate_import_uri()
+def validate_import_uri(import_uri) -> pathlib.Path:
+    """ Validate the import_uri is a str or pathlib.Path for an existing file.
+        Raises TypeError or FileNotFoundError."""
+    if isinstance(import_uri, str) and len(import_uri) > 0:
+        import_uri = pathlib.Path(import_uri)
+    if not isinstance(import_uri, pathlib.Path):
+        t = type(import_uri).__name__
+        raise TypeError(f"import_uri must be type:'str' or 'Path', not type:'{t}'")
+    if not import_uri.is_file():
+        raise FileNotFoundError(f"Import file not found: '{import_uri}'")
+    return import_uri
+#endregion validate_import_uri()
+#------------------------------------------------------------------------------+
+#region read_csv_records()
+def read_csv_records(import_uri) -> Iterator[Tuple[int, dict]]:
+    """ Stream raw activity records from a CSV file with a header row.
+        Yields (line_number, record) tuples, where record is a dict with
+        the keys start, stop, activity, notes and duration."""
+    path = validate_import_uri(import_uri)
+    with open(path, "r", newline="", encoding="utf-8-sig") as file:
+        reader = csv.DictReader(file)
+        if reader.fieldnames is None or "start" not in reader.fieldnames:
+            raise ValueError(f"CSV file '{path}' requires a header row " + \
+                             f"with a 'start' column")
+        for row in reader:
+            record = {k: atu.str_or_none(row.get(k)) for k in ATI_RECORD_FIELDS}
+            record["duration"] = atu.str_or_none(row.get("duration"))
+            yield reader.line_num, record
+#endregion read_csv_records()
+#------------------------------------------------------------------------------+
+#region read_ics_records()
+def ics_unescape(value: str) -> str:
+    """ Unescape an iCalendar TEXT property value. """
+    out = []; i = 0
+    while i < len(value):
+        c = value[i]
+        if c == "\\" and i + 1 < len(value):
+            n = value[i + 1]
+            out.append("\n" if n in "nN" else n)
+            i += 2
+            continue
+        out.append(c)
+        i += 1
+    return "".join(out)
+
+def ics_date_or_raw(value: str, tzid: str = None) -> str:
+    """ Convert an iCalendar date value, in the time zone tzid if given, to
+        ISO, or return it unchanged if it cannot be converted, leaving the
+        error to record validation. A value with an unknown tzid is 
+        returned with its TZID parameter, so it fails validation."""
+    if value is None: return None
+    try:
+        return atu.ical_date_to_iso(value, tzid)
+    except ValueError:
+        return value if tzid is None else f"TZID={tzid}:{value}"
+
+def ics_params(name: str) -> Tuple[str, dict]:
+    """ Split the name part of a content line into the upper case property
+        name and a dict of its upper case parameter names to values."""
+    name, *params = name.split(";")
+    found = {}
+    for param in params:
+        k, _, v = param.partition("=")
+        found[k.upper()] = v.strip('"')
+    return name.upper(), found
+
+def read_ics_lines(file) -> Iterator[Tuple[int, str]]:
+    """ Yield (line_number, content_line) from an open .ics file, unfolding
+        continuation lines that begin with a space or a tab."""
+    pending = None; pending_num = 0
+    for num, line in enumerate(file, start=1):
+        line = line.rstrip("\r\n")
+        if line[:1] in (" ", "\t") and pending is not None:
+            pending += line[1:]
+            continue
+        if pending is not None: yield pending_num, pending
+        pending = line; pending_num = num
+    if pending is not None: yield pending_num, pending
+
+def read_ics_records(import_uri) -> Iterator[Tuple[int, dict]]:
+    """ Stream raw activity records from an iCalendar file, one per VEVENT.
+        Yields (line_number, record) tuples, where record is a dict with
+        the keys start, stop, activity, notes and duration. Values that are
+        not valid iCalendar dates are passed through for validation. The
+        properties of components nested in a VEVENT are ignored."""
+    path = validate_import_uri(import_uri)
+    with open(path, "r", encoding="utf-8-sig") as file:
+        event = None; event_num = 0
+        depth = 0  # of the components nested in the VEVENT
+        tzids = {}  # property name -> TZID parameter
+        for num, line in read_ics_lines(file):
+            name, _, value = line.partition(":")
+            name, params = ics_params(name)
+            if event is None:
+                if name == "BEGIN" and value.upper() == "VEVENT":
+                    event = {}; event_num = num; depth = 0; tzids = {}
+            elif name == "BEGIN":
+                depth += 1
+            elif name == "END" and depth > 0:
+                depth -= 1
+            elif depth > 0:
+                continue
+            elif name == "END" and value.upper() == "VEVENT":
+                record = {k: None for k in ATI_RECORD_FIELDS}
+                record["start"] = ics_date_or_raw(event.get("DTSTART"),
+                                                  tzids.get("DTSTART"))
+                record["stop"] = ics_date_or_raw(event.get("DTEND"),
+                                                 tzids.get("DTEND"))
+                record["duration"] = event.get("DURATION")
+                record["activity"] = atu.str_or_none(
+                    ics_unescape(event.get("SUMMARY", "")))
+                record["notes"] = atu.str_or_none(
+                    ics_unescape(event.get("DESCRIPTION", "")))
+                event = None
+                yield event_num, record
+            elif name in ("DTSTART", "DTEND", "DURATION", "SUMMARY",
+                          "DESCRIPTION"):
+                event[name] = value
+                if "TZID" in params: tzids[name] = params["TZID"]
+#endregion read_ics_records()
+#------------------------------------------------------------------------------+
+#region validate_records()
+def duration_seconds(value: str) -> float:
+    """ Convert a record duration to seconds. A plain number is hours, as
+        used by ActivityEntry.duration, otherwise an iCalendar DURATION
+        value such as PT1H30M is expected. Raises ValueError."""
+    m = ATI_ICS_DURATION_RE.match(value.strip())
+    if m is None or value.strip() in ("P", ""):
+        return atu.to_float(value) * 3600.0
+    p = {k: int(v) if v else 0 for k, v in m.groupdict().items()}
+    return float((((p["weeks"] * 7 + p["days"]) * 24 + p["hours"]) * 60 + \
+                  p["minutes"]) * 60 + p["seconds"])
+
+def record_to_entry_args(record: dict) -> dict:
+    """ Return the ActivityEntry constructor arguments for a raw record,
+        using the record duration to compute stop when stop is missing."""
+    args = {k: record.get(k) for k in ATI_RECORD_FIELDS}
+    duration = record.get("duration")
+    if args["stop"] is None and duration is not None \
+            and args["start"] is not None:
+        args["stop"] = atu.increase_time(atu.validate_start(args["start"]),
+                                         seconds=duration_seconds(duration))
+    return args
+
+def validate_records(records: List[Tuple[int, dict]],
+                     skip_invalid: bool = False) -> List[ActivityEntry]:
+    """ Validate a batch of raw records, returning a List of ActivityEntry.
+        Invalid records raise ValueError or TypeError noting the line number,
+        unless skip_invalid is True, then they are logged and skipped."""
+    aes = []
+    for num, record in records:
+        try:
+            aes.append(ActivityEntry(**record_to_entry_args(record)))
+        except (ValueError, TypeError) as e:
+            if not skip_invalid:
+                e.add_note(f"Invalid activity record at line {num}: {record}")
+                raise
+            logger.warning(f"Skipped invalid activity record at line " + \
+                           f"{num}: {e}")
+    return aes
+#endregion validate_records()
+#------------------------------------------------------------------------------+
+#region import_records()
+def import_records(atm: ATModel, records: Iterable[Tuple[int, dict]],
+                   batch_size: int = ATM_IMPORT_BATCH_SIZE,
+                   skip_invalid: bool = False) -> int:
+    """ Import a stream of raw records into atm in batches of batch_size.
+        Each batch is validated and then added with atm.add_activities(),
+        without recording an undo step.
+        Returns the count of ActivityEntry objects imported. With 
+        skip_invalid False, an invalid record raises after the earlier 
+        batches were added, noting their count, and its batch is not added."""
+    _ = atu.is_obj_of_type("atm", atm, ATModel, True)
+    if not isinstance(batch_size, int) or batch_size < 1:
+        raise ValueError(f"batch_size must be a positive int, not '{batch_size}'")
+    count = 0; batch = []
+    try:
+        for record in records:
+            batch.append(record)
+            if len(batch) >= batch_size:
+                count += len(atm.add_activities(
+                    validate_records(batch, skip_invalid), record=False))
+                batch = []
+        if len(batch) > 0:
+            count += len(atm.add_activities(
+                validate_records(batch, skip_invalid), record=False))
+    except (ValueError, TypeError) as e:
+        e.add_note(f"{count} activities of earlier batches were imported " + \
+                   f"into '{atm.activityname}'")
+        raise
+    logger.debug(f"Imported {count} activities into '{atm.activityname}'")
+    return count
+#endregion import_records()
+#------------------------------------------------------------------------------+
+#region import_csv(), import_ics(), import_file()
+def import_csv(atm: ATModel, import_uri,
+               batch_size: int = ATM_IMPORT_BATCH_SIZE,
+               skip_invalid: bool = False) -> int:
+    """ Import activities from a CSV file into atm, returns the count. """
+    return import_records(atm, read_csv_records(import_uri),
+                          batch_size, skip_invalid)
+
+def import_ics(atm: ATModel, import_uri,
+               batch_size: int = ATM_IMPORT_BATCH_SIZE,
+               skip_invalid: bool = False) -> int:
+    """ Import activities from an iCalendar file into atm, returns the count."""
+    return import_records(atm, read_ics_records(import_uri),
+                          batch_size, skip_invalid)
+
+def import_file(atm: ATModel, import_uri,
+                batch_size: int = ATM_IMPORT_BATCH_SIZE,
+                skip_invalid: bool = False) -> int:
+    """ Import activities into atm choosing the importer by file suffix,
+        .csv or .ics. Raises ValueError for other suffixes."""
+    path = validate_import_uri(import_uri)
+    suffix = path.suffix.lower()
+    if suffix == ".csv":
+        return import_csv(atm, path, batch_size, skip_invalid)
+    if suffix in (".ics", ".ical"):
+        return import_ics(atm, path, batch_size, skip_invalid)
+    raise ValueError(f"Unsupported import file type: '{suffix}'")
+#endregion import_csv(), import_ics(), import_file()
+#------------------------------------------------------------------------------+
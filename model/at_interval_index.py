@@ -0,0 +1,256 @@
+#-----------------------------------------------------------------------------+
+# at_interval_index.py
+'''
+Module at_interval_index provides ATIntervalIndex, an interval tree over the
+[start, stop) time intervals of ActivityEntry objects, used by an ATModel to
+detect overlapping activities without a pairwise O(n^2) scan.
+
+The tree is a treap, a binary search tree kept balanced by random heap
+priorities, ordered by (start key, sequence number) and augmented with the
+maximum stop key of each subtree. Subtrees that end before a query interval
+begins are pruned, and the walk stops at the first entry starting after it.
+Each node visited either overlaps the query or lies on the path to one that
+does, so a query for k results visits O((k + 1) log n) expected nodes, and
+never more than n. Insert and remove take O(log n) expected time. Time 
+values are the float sort keys from at_utils.iso_date_key().
+'''
+import heapq, random
+from typing import Iterable, Iterator, List, Tuple
+import at_utilities.at_utils as atu
+from model.ae import ActivityEntry
+
+#------------------------------------------------------------------------------+
+#region class ATIntervalNode
+class ATIntervalNode:
+    '''One node of the ATIntervalIndex treap, holding one ActivityEntry.'''
+    __slots__ = ("start", "seq", "stop", "max_stop", "priority",
+                 "ae", "left", "right")
+
+    def __init__(self, start: float, seq: int, stop: float,
+                 ae: ActivityEntry, priority: float):
+        self.start = start
+        self.seq = seq
+        self.stop = stop
+        self.max_stop = stop
+        self.priority = priority
+        self.ae = ae
+        self.left: ATIntervalNode = None
+        self.right: ATIntervalNode = None
+
+    def update(self) -> None:
+        '''Recompute max_stop from this node and its children.'''
+        m = self.stop
+        if self.left is not None and self.left.max_stop > m:
+            m = self.left.max_stop
+        if self.right is not None and self.right.max_stop > m:
+            m = self.right.max_stop
+        self.max_stop = m
+#endregion class ATIntervalNode
+#------------------------------------------------------------------------------+
+#region class ATIntervalIndex
+class ATIntervalIndex:
+    '''
+    ATIntervalIndex is an interval tree of ActivityEntry objects keyed by
+    their [start, stop) interval. Entries are tracked by object identity.
+
+    Methods
+    -------
+    rebuild(aes : Iterable[ActivityEntry]) -> None
+        rebuild the index from entries sorted by start time, in O(n)
+    add(ae : ActivityEntry) -> None
+        add an entry in O(log n) expected time
+    remove(ae : ActivityEntry) -> bool
+        remove an entry in O(log n) expected time, returns False if it was
+        not indexed
+    overlapping(start : float, stop : float) -> List[ActivityEntry]
+        entries overlapping [start, stop) in start order, in O((k + 1) log n)
+        expected time for k results, at most O(n)
+    containing(ts : float) -> List[ActivityEntry]
+        entries with start <= ts < stop in start order, in O((k + 1) log n)
+        expected time for k results, at most O(n)
+    iter_conflicts() -> Iterator[Tuple[ActivityEntry, ActivityEntry]]
+        every pair of overlapping entries, O(n log n + k) for k pairs
+    '''
+    def __init__(self, aes: Iterable[ActivityEntry] = None):
+        self._root: ATIntervalNode = None
+        self._keys = {}  # id(ae) -> (start, seq) to locate an entry's node
+        self._next_seq = 0
+        self._random = random.Random()
+        if aes is not None: self.rebuild(aes)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    @staticmethod
+    def entry_keys(ae: ActivityEntry) -> Tuple[float, float]:
+        '''Return the (start, stop) keys for an ActivityEntry.'''
+        return atu.iso_date_key(ae.start), atu.iso_date_key(ae.stop)
+
+    #region rebuild(), add(), remove()
+    def rebuild(self, aes: Iterable[ActivityEntry]) -> None:
+        '''Rebuild the index from entries sorted by start time. The treap is
+        built as a Cartesian tree in O(n) with a stack, then max_stop values
+        are computed bottom up. Raises ValueError if not sorted by start.'''
+        self._root = None; self._keys = {}; self._next_seq = 0
+        spine: List[ATIntervalNode] = []
+        last_start = float("-inf")
+        for ae in aes:
+            start, stop = ATIntervalIndex.entry_keys(ae)
+            if start < last_start:
+                raise ValueError("rebuild() requires entries sorted by start")
+            last_start = start
+            node = self._new_node(start, stop, ae)
+            last = None
+            while spine and spine[-1].priority < node.priority:
+                last = spine.pop()
+            node.left = last
+            if spine: spine[-1].right = node
+            spine.append(node)
+        self._root = spine[0] if spine else None
+        self._update_all()
+
+    def add(self, ae: ActivityEntry) -> None:
+        '''Add an ActivityEntry to the index, after any equal start times.'''
+        if id(ae) in self._keys:
+            raise ValueError(f"ActivityEntry is already indexed: {ae!r}")
+        start, stop = ATIntervalIndex.entry_keys(ae)
+        self._root = self._insert(self._root, self._new_node(start, stop, ae))
+
+    def remove(self, ae: ActivityEntry) -> bool:
+        '''Remove an ActivityEntry from the index, returns True if removed.'''
+        key = self._keys.pop(id(ae), None)
+        if key is None: return False
+        self._root = self._delete(self._root, key)
+        return True
+
+    def _new_node(self, start: float, stop: float,
+                  ae: ActivityEntry) -> ATIntervalNode:
+        node = ATIntervalNode(start, self._next_seq, stop, ae,
+                              self._random.random())
+        self._keys[id(ae)] = (start, self._next_seq)
+        self._next_seq += 1
+        return node
+
+    def _insert(self, root: ATIntervalNode,
+                node: ATIntervalNode) -> ATIntervalNode:
+        if root is None: return node
+        if node.priority > root.priority:
+            node.left, node.right = self._split(root, (node.start, node.seq))
+            node.update()
+            return node
+        if (node.start, node.seq) < (root.start, root.seq):
+            root.left = self._insert(root.left, node)
+        else:
+            root.right = self._insert(root.right, node)
+        root.update()
+        return root
+
+    def _delete(self, root: ATIntervalNode, key: tuple) -> ATIntervalNode:
+        if root is None: return None
+        root_key = (root.start, root.seq)
+        if key == root_key:
+            return self._merge(root.left, root.right)
+        if key < root_key:
+            root.left = self._delete(root.left, key)
+        else:
+            root.right = self._delete(root.right, key)
+        root.update()
+        return root
+
+    def _split(self, root: ATIntervalNode, key: tuple) -> tuple:
+        '''Split root into the (left, right) treaps for keys < key, >= key.'''
+        if root is None: return None, None
+        if (root.start, root.seq) < key:
+            root.right, right = self._split(root.right, key)
+            root.update()
+            return root, right
+        left, root.left = self._split(root.left, key)
+        root.update()
+        return left, root
+
+    def _merge(self, left: ATIntervalNode,
+               right: ATIntervalNode) -> ATIntervalNode:
+        '''Merge treaps where all keys in left are less than those in right.'''
+        if left is None: return right
+        if right is None: return left
+        if left.priority > right.priority:
+            left.right = self._merge(left.right, right)
+            left.update()
+            return left
+        right.left = self._merge(left, right.left)
+        right.update()
+        return right
+
+    def _update_all(self) -> None:
+        '''Recompute max_stop for every node, children before parents.'''
+        order: List[ATIntervalNode] = []
+        stack = [self._root] if self._root is not None else []
+        while stack:
+            node = stack.pop()
+            order.append(node)
+            if node.left is not None: stack.append(node.left)
+            if node.right is not None: stack.append(node.right)
+        for node in reversed(order): node.update()
+    #endregion rebuild(), add(), remove()
+    #--------------------------------------------------------------------------+
+    #region overlapping(), containing(), iter_conflicts()
+    def overlapping(self, start: float, stop: float) -> List[ActivityEntry]:
+        '''Return the entries overlapping [start, stop) in start order,
+        meaning entry.start < stop and entry.stop > start.'''
+        ret: List[ActivityEntry] = []
+        stack: List[ATIntervalNode] = []
+        node = self._root
+        while stack or node is not None:
+            # Descend left while the subtree can hold an overlapping entry
+            while node is not None and node.max_stop > start:
+                stack.append(node)
+                node = node.left
+            if not stack: break
+            node = stack.pop()
+            if node.start >= stop: break # all later entries start too late
+            if node.stop > start: ret.append(node.ae)
+            node = node.right
+        return ret
+
+    def containing(self, ts: float) -> List[ActivityEntry]:
+        '''Return the entries in progress at ts, start <= ts < stop.'''
+        ret: List[ActivityEntry] = []
+        stack: List[ATIntervalNode] = []
+        node = self._root
+        while stack or node is not None:
+            while node is not None and node.max_stop > ts:
+                stack.append(node)
+                node = node.left
+            if not stack: break
+            node = stack.pop()
+            if node.start > ts: break
+            if node.stop > ts: ret.append(node.ae)
+            node = node.right
+        return ret
+
+    def iter_entries(self) -> Iterator[ATIntervalNode]:
+        '''Iterate the index nodes in (start, seq) order.'''
+        stack: List[ATIntervalNode] = []
+        node = self._root
+        while stack or node is not None:
+            while node is not None:
+                stack.append(node)
+                node = node.left
+            node = stack.pop()
+            yield node
+            node = node.right
+
+    def iter_conflicts(self) -> Iterator[Tuple[ActivityEntry, ActivityEntry]]:
+        '''Yield each pair of overlapping entries (earlier, later) once,
+        sweeping the entries in start order with a heap of active stops.'''
+        active: List[tuple] = []  # heap of (stop, seq, ae)
+        for node in self.iter_entries():
+            while active and active[0][0] <= node.start:
+                heapq.heappop(active)
+            for _, _, other in active:
+                yield other, node.ae
+            if node.stop > node.start:
+                heapq.heappush(active, (node.stop, node.seq, node.ae))
+    #endregion overlapping(), containing(), iter_conflicts()
+#endregion class ATIntervalIndex
+#------------------------------------------------------------------------------+
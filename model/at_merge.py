@@ -0,0 +1,70 @@
+#-----------------------------------------------------------------------------+
+# at_merge.py
+'''
+Module at_merge provides merge_activities(), a streaming k-way merge of the
+activities of several ATModel instances, such as one per user of a team,
+into one stream in start time order.
+
+Each model already yields its activities in start time order from
+ATModel.iter_activities(), so the streams are merged with a heap holding
+the next activity of each model, in O(N log k) time for N activities from k
+models. Nothing is concatenated or re-sorted, and activities are read from
+the models only as the merged stream is consumed.
+'''
+import heapq, itertools
+from typing import Iterable, Iterator, List, Tuple
+import at_utilities.at_utils as atu
+from model.ae import ActivityEntry
+from model.base_atmodel.atmodel import ATModel
+
+#------------------------------------------------------------------------------+
+#region merge_activities()
+def merge_activities(atms: Iterable[ATModel], start: str = None,
+                     stop: str = None, activity: str | Iterable[str] = None,
+                     limit: int = None) -> Iterator[Tuple[ATModel, ActivityEntry]]:
+    """ Lazily merge the activities of the models in start time order,
+        yielding (model, ActivityEntry) tuples so each activity keeps its 
+        source. Activities with equal start times are yielded in the order
+        of atms. The start, stop and activity filters are passed to each
+        model's iter_activities(), and limit stops the stream after limit
+        activities. Raises TypeError or ValueError."""
+    atms = list(atms)
+    for atm in atms: _ = atu.is_obj_of_type("atm", atm, ATModel, True)
+    if limit is not None and (not isinstance(limit, int) or limit < 0):
+        raise ValueError(f"limit must be a non-negative int, not '{limit}'")
+    streams = [_source_stream(atm, atm.iter_activities(start, stop, activity))
+               for atm in atms]
+    merged = heapq.merge(*streams, key=_start_key)
+    return merged if limit is None else itertools.islice(merged, limit)
+
+def _source_stream(atm: ATModel, aes: Iterator[ActivityEntry]) \
+        -> Iterator[Tuple[ATModel, ActivityEntry]]:
+    for ae in aes: yield atm, ae
+
+def _start_key(item: Tuple[ATModel, ActivityEntry]) -> float:
+    return atu.iso_date_key(item[1].start)
+#endregion merge_activities()
+#------------------------------------------------------------------------------+
+#region iter_windows()
+def iter_windows(items: Iterable[Tuple[ATModel, ActivityEntry]],
+                 hours: float) -> Iterator[List[Tuple[ATModel, ActivityEntry]]]:
+    """ Group a merged stream into consecutive lists of the activities 
+        starting within each window of hours, the first window beginning
+        at the first activity. Empty windows are skipped. Consumes the 
+        stream lazily, one window at a time. Raises ValueError."""
+    if not isinstance(hours, (int, float)) or hours <= 0:
+        raise ValueError(f"hours must be a positive number, not '{hours}'")
+    width = hours * 3600.0
+    window: List[Tuple[ATModel, ActivityEntry]] = []
+    window_end = None
+    for item in items:
+        key = _start_key(item)
+        if window_end is None: window_end = key + width
+        if key >= window_end:
+            if len(window) > 0: yield window
+            window = []
+            window_end += width * ((key - window_end) // width + 1)
+        window.append(item)
+    if len(window) > 0: yield window
+#endregion iter_windows()
+#------------------------------------------------------------------------------+
@@ -0,0 +1,249 @@
+#-----------------------------------------------------------------------------+
+# at_query.py
+'''
+Module at_query provides ATQuery, a small declarative query over the
+activities of an ATModel, replacing hand-written loops over the activities
+List. A query is built from ATModel.query() by chaining:
+
+    atm.query().between("2025-03-01", "2025-04-01") \\
+       .where(activity="coding").group_by("week", "activity").sum("duration")
+
+Each step returns a new ATQuery, so a partial query can be reused. Nothing
+runs until an aggregate (count, sum, mean, min, max) or entries() is called.
+
+The time range and activity name filters are passed to
+ATModel.iter_activities(), so they use the model's indexes, a binary search
+of the start times for FileATModel, rather than scanning every entry. Other
+where() filters and the grouping are applied to the entries that remain.
+The query holds its filters as plain attributes, so an ATModel with another
+storage backend can override query() to translate them for that backend.
+'''
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Tuple
+import at_utilities.at_utils as atu
+from model.ae import ActivityEntry
+
+ATQ_FIELDS = ("start", "stop", "activity", "notes", "duration")
+ATQ_GROUP_KEYS: Dict[str, Callable[[ActivityEntry], str]] = {
+    "year": lambda ae: ae.start[:4],
+    "month": lambda ae: ae.start[:7],
+    "week": lambda ae: atu.iso_week_of_day(ae.start[:10]),
+    "day": lambda ae: ae.start[:10],
+}
+#------------------------------------------------------------------------------+
+#region class ATQuery
+class ATQuery:
+    '''
+    ATQuery is a lazily run, immutable query over the activities of an
+    ATModel. Group keys 'year', 'month', 'week' and 'day' are taken from
+    the entry start time, and any ActivityEntry field name is a key too.
+
+    Properties
+    ----------
+    start : str
+        include entries starting at or after start, None for no limit
+    stop : str
+        include entries starting before stop, None for no limit
+    activity : frozenset
+        the activity names to include, None for all
+    predicates : Tuple[Callable[[ActivityEntry], bool]]
+        further filters every entry must pass
+    keys : Tuple[str]
+        the group_by() keys, empty when not grouped
+
+    Methods
+    -------
+    between(start : str, stop : str) -> ATQuery
+        limit to entries starting in [start, stop)
+    where(predicate : Callable, **fields) -> ATQuery
+        limit to entries passing predicate and matching the field values
+    group_by(*keys : str) -> ATQuery
+        aggregate per distinct value of the keys
+    entries() -> List[ActivityEntry]
+        the matching entries in start time order
+    count() / sum(field) / mean(field) / min(field) / max(field)
+        aggregate the matching entries, a single value, or a Dict keyed by
+        the group value, or by a tuple of values for several keys
+    '''
+    def __init__(self, atm):
+        self._atm = atm
+        self._start: str = None
+        self._stop: str = None
+        self._activity: frozenset = None
+        self._predicates: Tuple[Callable[[ActivityEntry], bool], ...] = ()
+        self._keys: Tuple[str, ...] = ()
+
+    #region ATQuery Properties
+    @property
+    def start(self) -> str:
+        return self._start
+
+    @property
+    def stop(self) -> str:
+        return self._stop
+
+    @property
+    def activity(self) -> frozenset:
+        return self._activity
+
+    @property
+    def predicates(self) -> Tuple[Callable[[ActivityEntry], bool], ...]:
+        return self._predicates
+
+    @property
+    def keys(self) -> Tuple[str, ...]:
+        return self._keys
+    #endregion ATQuery Properties
+    #--------------------------------------------------------------------------+
+    #region between(), where(), group_by()
+    def between(self, start: str = None, stop: str = None) -> 'ATQuery':
+        '''Return a query limited to entries starting in [start, stop),
+        narrowing any earlier between() range. Raises TypeError.'''
+        q = self._copy()
+        if start is not None and (q._start is None or start > q._start):
+            q._start = ATQuery.valid_time("start", start)
+        if stop is not None and (q._stop is None or stop < q._stop):
+            q._stop = ATQuery.valid_time("stop", stop)
+        return q
+
+    def where(self, predicate: Callable[[ActivityEntry], bool] = None,
+              **fields) -> 'ATQuery':
+        '''Return a query limited to entries for which predicate(ae) is
+        true and each named field matches. A field value may be a value to
+        equal, a set, list or tuple of values, or a callable test of the
+        field value. Raises TypeError or ValueError.'''
+        q = self._copy()
+        predicates = list(q._predicates)
+        if predicate is not None:
+            if not callable(predicate):
+                t = type(predicate).__name__
+                raise TypeError(f"predicate must be callable, not type:'{t}'")
+            predicates.append(predicate)
+        for name, value in fields.items():
+            ATQuery.valid_field(name)
+            if name == "activity" and not callable(value):
+                names = ATQuery.value_set(value)
+                q._activity = names if q._activity is None \
+                    else q._activity & names
+            else:
+                predicates.append(ATQuery.field_predicate(name, value))
+        q._predicates = tuple(predicates)
+        return q
+
+    def group_by(self, *keys: str) -> 'ATQuery':
+        '''Return a query aggregating per distinct value of the keys.
+        Raises ValueError for an unknown key.'''
+        for key in keys:
+            if key not in ATQ_GROUP_KEYS and key not in ATQ_FIELDS:
+                raise ValueError(f"Unknown group_by key: '{key}'")
+        q = self._copy()
+        q._keys = tuple(keys)
+        return q
+    #endregion between(), where(), group_by()
+    #--------------------------------------------------------------------------+
+    #region entries() and aggregates
+    def __iter__(self) -> Iterator[ActivityEntry]:
+        '''Iterate the matching entries in start time order.'''
+        aes = self._atm.iter_activities(self._start, self._stop, self._activity)
+        if len(self._predicates) == 0: return aes
+        return (ae for ae in aes if all(p(ae) for p in self._predicates))
+
+    def entries(self) -> List[ActivityEntry]:
+        '''Return the matching entries in start time order.'''
+        return list(iter(self))
+
+    def count(self) -> int | Dict[Any, int]:
+        '''Return the number of matching entries, per group if grouped.'''
+        return self._aggregate(None, 0, lambda acc, _: acc + 1)
+
+    def sum(self, field: str = "duration") -> float | Dict[Any, float]:
+        '''Return the sum of field over the matching entries.'''
+        return self._aggregate(field, 0, lambda acc, v: acc + v)
+
+    def min(self, field: str = "duration") -> Any:
+        '''Return the least field value of the matching entries, None if
+        there are none.'''
+        return self._aggregate(field, None,
+                               lambda acc, v: v if acc is None or v < acc else acc)
+
+    def max(self, field: str = "duration") -> Any:
+        '''Return the greatest field value of the matching entries, None if
+        there are none.'''
+        return self._aggregate(field, None,
+                               lambda acc, v: v if acc is None or v > acc else acc)
+
+    def mean(self, field: str = "duration") -> float | Dict[Any, float]:
+        '''Return the mean of field over the matching entries, None if
+        there are none.'''
+        def mean_of(acc: tuple) -> float:
+            return None if acc[1] == 0 else acc[0] / acc[1]
+        totals = self._aggregate(field, (0, 0),
+                                 lambda acc, v: (acc[0] + v, acc[1] + 1))
+        if len(self._keys) == 0: return mean_of(totals)
+        return {k: mean_of(acc) for k, acc in totals.items()}
+
+    def _aggregate(self, field: str, initial: Any,
+                   step: Callable[[Any, Any], Any]) -> Any:
+        '''Fold step over the field values of the matching entries, once
+        for all entries, or per group when grouped.'''
+        if field is not None: ATQuery.valid_field(field)
+        if len(self._keys) == 0:
+            acc = initial
+            for ae in self:
+                acc = step(acc, None if field is None else getattr(ae, field))
+            return acc
+        key_funcs = [ATQuery.key_func(k) for k in self._keys]
+        groups: Dict[Any, Any] = {}
+        for ae in self:
+            if len(key_funcs) == 1: key = key_funcs[0](ae)
+            else: key = tuple(f(ae) for f in key_funcs)
+            value = None if field is None else getattr(ae, field)
+            groups[key] = step(groups.get(key, initial), value)
+        return groups
+    #endregion entries() and aggregates
+    #--------------------------------------------------------------------------+
+    #region ATQuery helpers
+    def _copy(self) -> 'ATQuery':
+        q = ATQuery(self._atm)
+        q._start, q._stop = self._start, self._stop
+        q._activity, q._predicates = self._activity, self._predicates
+        q._keys = self._keys
+        return q
+
+    @staticmethod
+    def valid_time(name: str, value: str) -> str:
+        '''Validate a between() time is a non-empty str. Raises TypeError.'''
+        if not isinstance(value, str) or len(value) == 0:
+            t = type(value).__name__
+            raise TypeError(f"{name} must be a non-empty str, not type:'{t}'")
+        return value
+
+    @staticmethod
+    def valid_field(name: str) -> str:
+        '''Validate an ActivityEntry field name. Raises ValueError.'''
+        if name not in ATQ_FIELDS:
+            raise ValueError(f"Unknown ActivityEntry field: '{name}'")
+        return name
+
+    @staticmethod
+    def value_set(value: Any) -> frozenset:
+        '''Return a value, or a set, list or tuple of values, as a frozenset.'''
+        if isinstance(value, (set, frozenset, list, tuple)):
+            return frozenset(value)
+        return frozenset((value,))
+
+    @staticmethod
+    def field_predicate(name: str, value: Any) -> Callable[[ActivityEntry], bool]:
+        '''Return a predicate testing the named field of an entry.'''
+        if callable(value):
+            return lambda ae: bool(value(getattr(ae, name)))
+        values = ATQuery.value_set(value)
+        return lambda ae: getattr(ae, name) in values
+
+    @staticmethod
+    def key_func(key: str) -> Callable[[ActivityEntry], Any]:
+        '''Return the function computing a group_by key for an entry.'''
+        if key in ATQ_GROUP_KEYS: return ATQ_GROUP_KEYS[key]
+        return lambda ae: getattr(ae, key)
+    #endregion ATQuery helpers
+#endregion class ATQuery
+#------------------------------------------------------------------------------+
@@ -0,0 +1,128 @@
+#-----------------------------------------------------------------------------+
+# at_recurrence.py
+'''
+Module at_recurrence provides ATRecurrence, a template for a repeating
+activity, such as a standing meeting, stored by an ATModel in place of the
+activities it repeats.
+
+A template holds its first occurrence, like an ActivityEntry, and a rule:
+daily, weekly on some weekdays, or monthly, every interval days, weeks or
+months, optionally until a last date. Occurrences are expanded lazily, only
+for the time window queried, with the first one in the window found by
+arithmetic, so years of recurrences are never built as ActivityEntry
+objects. An occurrence that is edited becomes a real ActivityEntry in the
+model, and its start is added to the template's exceptions.
+'''
+from dataclasses import dataclass, field
+from typing import Iterator, List
+import at_utilities.at_utils as atu
+from model.ae import ActivityEntry
+
+ATR_FREQS = atu.ATU_RECURRENCE_FREQS
+ATR_ID_SEPARATOR = "@"  # occurrence ids are '<recurrence id>@<start>'
+#------------------------------------------------------------------------------+
+#region class ATRecurrence
+@dataclass(kw_only=True)
+class ATRecurrence:
+    '''
+    ATRecurrence is a recurring activity template.
+
+    Attributes
+    ----------
+    start : str
+        ISO timestamp the first occurrence starts
+    stop : str
+        ISO timestamp the first occurrence stops, setting the duration of
+        every occurrence
+    activity : str
+        the activity name of the occurrences
+    notes : str
+        the notes of the occurrences
+    freq : str
+        'daily', 'weekly' or 'monthly'
+    interval : int
+        repeat every interval days, weeks or months
+    weekdays : List[int]
+        for weekly templates, the weekdays to repeat on, 0 for Monday, by
+        default the weekday of start
+    until : str
+        ISO timestamp of the last possible occurrence start, None for none
+    exdates : List[str]
+        starts of occurrences removed from the template, as when edited
+    id : str
+        a stable unique identifier, generated when not given, without the
+        ATR_ID_SEPARATOR of occurrence ids
+
+    Methods
+    -------
+    occurrences(start : str, stop : str) -> Iterator[ActivityEntry]
+        the occurrences starting in [start, stop), built as they are read
+    is_occurrence(ts : str) -> bool
+        True if an occurrence starts at ts
+    '''
+    start: str = None
+    stop: str = None
+    activity: str = None
+    notes: str = None
+    freq: str = "weekly"
+    interval: int = 1
+    weekdays: List[int] = None
+    until: str = None
+    exdates: List[str] = field(default_factory=list)
+    id: str = None
+
+    def __post_init__(self):
+        self.start = atu.validate_start(self.start)
+        self.stop = atu.validate_stop(self.start, self.stop)
+        self.activity = 'unset' if not atu.str_notempty(self.activity) \
+            else self.activity
+        self.notes = 'unset' if not atu.str_notempty(self.notes) else self.notes
+        if self.freq not in ATR_FREQS:
+            raise ValueError(f"freq must be one of {ATR_FREQS}, not '{self.freq}'")
+        if not isinstance(self.interval, int) or self.interval < 1:
+            raise ValueError(f"interval must be a positive int, not '{self.interval}'")
+        if self.weekdays is not None: self.weekdays = sorted(set(self.weekdays))
+        if self.until is not None: atu.validate_iso_date_string(self.until)
+        self.exdates = list(self.exdates)
+        self.id = self.id if atu.str_notempty(self.id) else ActivityEntry.new_id()
+        if ATR_ID_SEPARATOR in self.id:
+            raise ValueError(f"id must not contain '{ATR_ID_SEPARATOR}', " + \
+                             f"not '{self.id}'")
+        next(self._starts(self.start, None), None)  # validates the weekdays
+
+    @property
+    def duration(self) -> float:
+        return atu.calculate_duration(self.start, self.stop)
+
+    def _starts(self, start: str, stop: str) -> Iterator[str]:
+        return atu.recurrence_starts(self.start, self.freq, self.interval,
+                                     self.weekdays, start, stop, self.until)
+
+    def occurrences(self, start: str, stop: str) -> Iterator[ActivityEntry]:
+        '''Lazily yield the occurrences starting in [start, stop) as new
+        ActivityEntry objects, other than the exceptions. Each has the id
+        '<recurrence id>@<start>'.'''
+        seconds = atu.calculate_duration(self.start, self.stop, "seconds")
+        exdates = set(self.exdates)
+        for ts in self._starts(start, stop):
+            if ts in exdates: continue
+            yield ActivityEntry(start=ts,
+                                stop=atu.increase_time(ts, seconds=seconds),
+                                activity=self.activity, notes=self.notes,
+                                id=f"{self.id}{ATR_ID_SEPARATOR}{ts}")
+
+    def is_occurrence(self, ts: str) -> bool:
+        '''Return True if an occurrence, not an exception, starts at ts.'''
+        if ts in self.exdates: return False
+        return next(self._starts(ts, atu.increase_time(ts, seconds=1)),
+                    None) == ts
+
+    def to_dict(self) -> dict:
+        '''Return the template as a dictionary for json serialization.'''
+        return {"start": self.start, "stop": self.stop,
+                "activity": self.activity, "notes": self.notes,
+                "freq": self.freq, "interval": self.interval,
+                "weekdays": self.weekdays, "until": self.until,
+                "exdates": list(self.exdates), "id": self.id}
+#endregion class ATRecurrence
+#------------------------------------------------------------------------------+
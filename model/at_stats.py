@@ -0,0 +1,349 @@
+#-----------------------------------------------------------------------------+
+# at_stats.py
+'''
+Module at_stats provides streaming statistics of activity durations, kept
+by an ATModel next to its ATSummary totals, so the median or p95 duration of
+an activity over a long period is found without sorting every duration.
+
+ATQuantileSketch is a KLL sketch, a stack of compactors where each level
+holds items of twice the weight of the level below. A full level is sorted
+and every other item promoted, so the sketch keeps O(k) items however many
+durations are added, with a rank error of about 1/k. Sketches merge by
+combining their levels, so totals computed apart, for other weeks or other
+activity stores, can be combined for parallel roll-ups.
+
+ATDurationStats holds the count, mean, variance, min and max of durations,
+merged with the parallel variance formula, and an ATQuantileSketch.
+ATStats keeps an ATDurationStats per ISO week and activity, for the week of
+each entry's start time.
+'''
+import math, random
+from typing import Dict, Iterable, List, Tuple
+import at_utilities.at_utils as atu
+from model.ae import ActivityEntry
+
+ATQS_DEFAULT_K = 200  # capacity of the top compactor, rank error ~ 1/k
+ATQS_DECAY = 2.0 / 3.0  # capacity ratio of each lower compactor
+_ATQS_RANDOM = random.Random()  # shared by sketches without a seed
+#------------------------------------------------------------------------------+
+#region class ATQuantileSketch
+class ATQuantileSketch:
+    '''
+    ATQuantileSketch is a mergeable KLL quantile sketch of float values.
+    Values are exact until the lowest compactor first fills. Sketches share
+    one random generator for compaction, unless given a seed.
+
+    Properties
+    ----------
+    count : int
+        the number of values added
+
+    Methods
+    -------
+    add(value : float) -> None
+        add a value
+    merge(other : ATQuantileSketch) -> None
+        add all of the values of another sketch
+    quantile(q : float) -> float
+        the approximate q quantile, 0 <= q <= 1, None when empty
+    '''
+    def __init__(self, k: int = ATQS_DEFAULT_K, seed: int = None):
+        if not isinstance(k, int) or k < 2:
+            raise ValueError(f"k must be an int of at least 2, not '{k}'")
+        self._k = k
+        self._levels: List[List[float]] = [[]]
+        self._count = 0
+        self._size = 0  # items held over all levels
+        self._max_size = self._capacity(0)
+        self._random = _ATQS_RANDOM if seed is None else random.Random(seed)
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def count(self) -> int:
+        return self._count
+
+    def _capacity(self, level: int) -> int:
+        depth = len(self._levels) - level - 1
+        return int(math.ceil(self._k * ATQS_DECAY ** depth)) + 1
+
+    def add(self, value: float) -> None:
+        '''Add a value to the sketch.'''
+        self._levels[0].append(value)
+        self._count += 1
+        self._size += 1
+        if self._size >= self._max_size: self._compress()
+
+    def merge(self, other: 'ATQuantileSketch') -> None:
+        '''Add the values of other to this sketch.'''
+        while len(self._levels) < len(other._levels): self._grow()
+        for level, items in enumerate(other._levels):
+            self._levels[level].extend(items)
+        self._count += other._count
+        self._size = sum(len(items) for items in self._levels)
+        while self._size >= self._max_size: self._compress()
+
+    def _grow(self) -> None:
+        self._levels.append([])
+        self._max_size = sum(self._capacity(h) for h in range(len(self._levels)))
+
+    def _compress(self) -> None:
+        '''Compact the lowest full level, promoting half of its items.'''
+        for level in range(len(self._levels)):
+            items = self._levels[level]
+            if len(items) >= self._capacity(level):
+                if level + 1 >= len(self._levels): self._grow()
+                items.sort()
+                keep = [items.pop()] if len(items) % 2 == 1 else []
+                offset = self._random.randint(0, 1)
+                self._levels[level + 1].extend(items[offset::2])
+                self._levels[level] = keep
+                self._size = sum(len(items) for items in self._levels)
+                if self._size < self._max_size: break
+
+    def quantile(self, q: float) -> float:
+        '''Return the approximate q quantile of the values, None if empty.
+        Raises ValueError unless 0 <= q <= 1.'''
+        if not isinstance(q, (int, float)) or not 0.0 <= q <= 1.0:
+            raise ValueError(f"q must be a number from 0 to 1, not '{q}'")
+        weighted = sorted((value, 1 << level)
+                          for level, items in enumerate(self._levels)
+                          for value in items)
+        if len(weighted) == 0: return None
+        total = sum(weight for _, weight in weighted)
+        target = q * total
+        seen = 0
+        for value, weight in weighted:
+            seen += weight
+            if seen >= target: return value
+        return weighted[-1][0]
+
+    def to_dict(self) -> dict:
+        '''Return the sketch as a dictionary for json serialization.'''
+        return {"k": self._k, "count": self._count,
+                "levels": [list(items) for items in self._levels]}
+
+    @staticmethod
+    def from_dict(data: dict) -> 'ATQuantileSketch':
+        '''Return a sketch from a to_dict() dictionary.'''
+        sketch = ATQuantileSketch(data["k"])
+        sketch._levels = [[]]
+        for _ in range(len(data["levels"]) - 1): sketch._grow()
+        sketch._levels = [list(items) for items in data["levels"]]
+        sketch._count = data["count"]
+        sketch._size = sum(len(items) for items in sketch._levels)
+        return sketch
+#endregion class ATQuantileSketch
+#------------------------------------------------------------------------------+
+#region class ATDurationStats
+class ATDurationStats:
+    '''
+    ATDurationStats holds streaming statistics of durations in hours.
+
+    Properties
+    ----------
+    count : int
+    mean : float
+        None when count is 0
+    variance : float
+        population variance, None when count is 0
+    stdev : float
+        population standard deviation, None when count is 0
+    min : float
+    max : float
+    sketch : ATQuantileSketch
+
+    Methods
+    -------
+    add(value : float) -> None
+        add a duration
+    merge(other : ATDurationStats) -> None
+        combine the statistics of other into these
+    quantile(q : float) -> float
+        the approximate q quantile, such as 0.5 for the median
+    '''
+    def __init__(self, values: Iterable[float] = None):
+        self._count = 0
+        self._mean = 0.0
+        self._m2 = 0.0  # sum of squared differences from the mean
+        self._min: float = None
+        self._max: float = None
+        self._sketch = ATQuantileSketch()
+        if values is not None:
+            for value in values: self.add(value)
+
+    #region ATDurationStats Properties
+    @property
+    def count(self) -> int:
+        return self._count
+
+    @property
+    def mean(self) -> float:
+        return self._mean if self._count > 0 else None
+
+    @property
+    def variance(self) -> float:
+        return self._m2 / self._count if self._count > 0 else None
+
+    @property
+    def stdev(self) -> float:
+        return math.sqrt(self.variance) if self._count > 0 else None
+
+    @property
+    def min(self) -> float:
+        return self._min
+
+    @property
+    def max(self) -> float:
+        return self._max
+
+    @property
+    def sketch(self) -> ATQuantileSketch:
+        return self._sketch
+    #endregion ATDurationStats Properties
+    #--------------------------------------------------------------------------+
+    #region ATDurationStats Methods
+    def add(self, value: float) -> None:
+        '''Add a duration, updating the mean and variance by Welford's
+        method.'''
+        self._count += 1
+        delta = value - self._mean
+        self._mean += delta / self._count
+        self._m2 += delta * (value - self._mean)
+        if self._min is None or value < self._min: self._min = value
+        if self._max is None or value > self._max: self._max = value
+        self._sketch.add(value)
+
+    def merge(self, other: 'ATDurationStats') -> None:
+        '''Combine the statistics of other into these, with the parallel
+        formula for the mean and variance of two samples.'''
+        if other._count == 0: return
+        if self._count == 0:
+            self._mean, self._m2 = other._mean, other._m2
+        else:
+            n = self._count + other._count
+            delta = other._mean - self._mean
+            self._mean += delta * other._count / n
+            self._m2 += other._m2 + \
+                delta * delta * self._count * other._count / n
+        self._count += other._count
+        if self._min is None or other._min < self._min: self._min = other._min
+        if self._max is None or other._max > self._max: self._max = other._max
+        self._sketch.merge(other._sketch)
+
+    def quantile(self, q: float) -> float:
+        '''Return the approximate q quantile of the durations.'''
+        return self._sketch.quantile(q)
+
+    def to_dict(self) -> dict:
+        '''Return the statistics as a dictionary for json serialization.'''
+        return {"count": self._count, "mean": self._mean, "m2": self._m2,
+                "min": self._min, "max": self._max,
+                "sketch": self._sketch.to_dict()}
+
+    @staticmethod
+    def from_dict(data: dict) -> 'ATDurationStats':
+        '''Return statistics from a to_dict() dictionary.'''
+        stats = ATDurationStats()
+        stats._count, stats._mean = data["count"], data["mean"]
+        stats._m2, stats._min, stats._max = data["m2"], data["min"], data["max"]
+        stats._sketch = ATQuantileSketch.from_dict(data["sketch"])
+        return stats
+    #endregion ATDurationStats Methods
+#endregion class ATDurationStats
+#------------------------------------------------------------------------------+
+#region class ATStats
+class ATStats:
+    '''
+    ATStats keeps ATDurationStats per ISO week and activity name.
+
+    Properties
+    ----------
+    weeks : Dict[str, Dict[str, ATDurationStats]]
+        ISO week 'YYYY-Www' -> activity name -> statistics
+
+    Methods
+    -------
+    add(ae : ActivityEntry) -> None
+        add the duration of an entry to the statistics of its week
+    rebuild(aes : Iterable[ActivityEntry]) -> None
+        recompute all of the statistics from the entries
+    rebuild_cell(week : str, activity : str, aes) -> None
+        recompute the statistics of one week and activity
+    activity_stats(activity : str, weeks : Iterable[str]) -> ATDurationStats
+        the statistics of an activity merged over weeks, all by default
+    merge(other : ATStats) -> None
+        combine the statistics of other, such as another store, into these
+    '''
+    def __init__(self, aes: Iterable[ActivityEntry] = None):
+        self._weeks: Dict[str, Dict[str, ATDurationStats]] = {}
+        if aes is not None: self.rebuild(aes)
+
+    @property
+    def weeks(self) -> Dict[str, Dict[str, ATDurationStats]]:
+        return self._weeks
+
+    @staticmethod
+    def entry_cell(ae: ActivityEntry) -> Tuple[str, str]:
+        '''Return the (week, activity) an entry's duration is counted in.'''
+        return atu.iso_week_of_day(ae.start), ae.activity
+
+    def add(self, ae: ActivityEntry) -> None:
+        '''Add the duration of ae to the statistics of its week.'''
+        week, activity = ATStats.entry_cell(ae)
+        cell = self._weeks.setdefault(week, {}).get(activity)
+        if cell is None: cell = self._weeks[week][activity] = ATDurationStats()
+        cell.add(ae.duration)
+
+    def rebuild(self, aes: Iterable[ActivityEntry]) -> None:
+        '''Recompute all of the statistics from the entries.'''
+        self._weeks = {}
+        for ae in aes: self.add(ae)
+
+    def rebuild_cell(self, week: str, activity: str,
+                     aes: Iterable[ActivityEntry]) -> None:
+        '''Recompute the statistics of one week and activity from the
+        entries in that cell, as a sketch cannot remove a value.'''
+        stats = ATDurationStats(ae.duration for ae in aes
+                                if ATStats.entry_cell(ae) == (week, activity))
+        cells = self._weeks.setdefault(week, {})
+        if stats.count > 0: cells[activity] = stats
+        else: cells.pop(activity, None)
+        if len(cells) == 0: del self._weeks[week]
+
+    def activity_stats(self, activity: str,
+                       weeks: Iterable[str] = None) -> ATDurationStats:
+        '''Return the statistics of activity merged over the weeks, or over
+        all weeks by default.'''
+        ret = ATDurationStats()
+        for week in (self._weeks if weeks is None else weeks):
+            cell = self._weeks.get(week, {}).get(activity)
+            if cell is not None: ret.merge(cell)
+        return ret
+
+    def merge(self, other: 'ATStats') -> None:
+        '''Combine the statistics of other into these.'''
+        for week, cells in other._weeks.items():
+            for activity, stats in cells.items():
+                mine = self._weeks.setdefault(week, {}).get(activity)
+                if mine is None:
+                    mine = self._weeks[week][activity] = ATDurationStats()
+                mine.merge(stats)
+
+    def to_dict(self) -> dict:
+        '''Return the statistics as a dictionary for json serialization.'''
+        return {week: {activity: stats.to_dict()
+                       for activity, stats in cells.items()}
+                for week, cells in self._weeks.items()}
+
+    @staticmethod
+    def from_dict(data: dict) -> 'ATStats':
+        '''Return statistics from a to_dict() dictionary.'''
+        ret = ATStats()
+        ret._weeks = {week: {activity: ATDurationStats.from_dict(stats)
+                             for activity, stats in cells.items()}
+                      for week, cells in data.items()}
+        return ret
+#endregion class ATStats
+#------------------------------------------------------------------------------+
@@ -0,0 +1,153 @@
+#-----------------------------------------------------------------------------+
+# at_summary.py
+'''
+Module at_summary provides ATSummary, the duration totals of an ATModel kept
+per ISO week, per day and per activity, for the weekly summaries of the
+activities. Totals are in hours, like ActivityEntry.duration.
+
+ATSummary is updated incrementally as entries are added, removed or edited,
+so the totals never need a full recompute. An activity that crosses midnight
+is split between the days, and weeks, it spans. The totals can be saved as a
+.json file next to the activity store, so reopening a large history shows
+the summaries without recomputing them. The store itself is still parsed on
+every load.
+'''
+import json, pathlib
+from typing import Dict, Iterable
+import at_utilities.at_utils as atu
+from model.ae import ActivityEntry
+
+ATS_ZERO_TOLERANCE = 1e-9  # totals closer to zero than this are dropped
+#------------------------------------------------------------------------------+
+#region class ATSummary
+class ATSummary:
+    '''
+    ATSummary keeps duration totals in hours for the activities of a model.
+
+    Properties
+    ----------
+    weeks : Dict[str, Dict[str, float]]
+        ISO week 'YYYY-Www' -> activity name -> hours
+    days : Dict[str, Dict[str, float]]
+        ISO date 'YYYY-MM-DD' -> activity name -> hours
+    activities : Dict[str, float]
+        activity name -> hours
+    total : float
+        hours for all activities
+
+    Methods
+    -------
+    add(ae : ActivityEntry) -> None
+        add the duration of an entry to the totals
+    remove(ae : ActivityEntry) -> None
+        subtract the duration of an entry from the totals
+    update(old : ActivityEntry, new : ActivityEntry) -> None
+        replace the totals of an edited entry, old holding prior values
+    rebuild(aes : Iterable[ActivityEntry]) -> None
+        recompute all totals from the entries
+    weekly_summary(week : str) -> Dict[str, float]
+        activity name -> hours for one week
+    '''
+    def __init__(self, aes: Iterable[ActivityEntry] = None):
+        self._weeks: Dict[str, Dict[str, float]] = {}
+        self._days: Dict[str, Dict[str, float]] = {}
+        self._activities: Dict[str, float] = {}
+        if aes is not None: self.rebuild(aes)
+
+    #region ATSummary Properties
+    @property
+    def weeks(self) -> Dict[str, Dict[str, float]]:
+        return self._weeks
+
+    @property
+    def days(self) -> Dict[str, Dict[str, float]]:
+        return self._days
+
+    @property
+    def activities(self) -> Dict[str, float]:
+        return self._activities
+
+    @property
+    def total(self) -> float:
+        return sum(self._activities.values())
+    #endregion ATSummary Properties
+    #--------------------------------------------------------------------------+
+    #region ATSummary Methods
+    def add(self, ae: ActivityEntry) -> None:
+        '''Add the duration of ae to the week, day and activity totals.'''
+        self._apply(ae.start, ae.stop, ae.activity, 1.0)
+
+    def remove(self, ae: ActivityEntry) -> None:
+        '''Subtract the duration of ae from the totals.'''
+        self._apply(ae.start, ae.stop, ae.activity, -1.0)
+
+    def update(self, old: ActivityEntry, new: ActivityEntry) -> None:
+        '''Move the totals of an edited entry from its old to new values.'''
+        self.remove(old)
+        self.add(new)
+
+    def rebuild(self, aes: Iterable[ActivityEntry]) -> None:
+        '''Recompute all of the totals from the entries.'''
+        self._weeks = {}; self._days = {}; self._activities = {}
+        for ae in aes: self.add(ae)
+
+    def weekly_summary(self, week: str) -> Dict[str, float]:
+        '''Return activity name -> hours for the ISO week 'YYYY-Www'.'''
+        return dict(self._weeks.get(week, {}))
+
+    def _apply(self, start: str, stop: str, activity: str,
+               sign: float) -> None:
+        for day, hours in atu.split_duration_by_day(start, stop):
+            week = atu.iso_week_of_day(day)
+            ATSummary._accumulate(self._days.setdefault(day, {}),
+                                  activity, sign * hours)
+            ATSummary._accumulate(self._weeks.setdefault(week, {}),
+                                  activity, sign * hours)
+            ATSummary._accumulate(self._activities, activity, sign * hours)
+            if len(self._days[day]) == 0: del self._days[day]
+            if len(self._weeks[week]) == 0: del self._weeks[week]
+
+    @staticmethod
+    def _accumulate(totals: Dict[str, float], key: str, hours: float) -> None:
+        value = totals.get(key, 0.0) + hours
+        if abs(value) < ATS_ZERO_TOLERANCE:
+            totals.pop(key, None)
+        else:
+            totals[key] = value
+    #endregion ATSummary Methods
+    #--------------------------------------------------------------------------+
+    #region ATSummary persistence
+    def to_dict(self) -> dict:
+        '''Return the totals as a dictionary for json serialization.'''
+        return {"weeks": self._weeks, "days": self._days,
+                "activities": self._activities}
+
+    def from_dict(self, data: dict) -> None:
+        '''Replace the totals with those from a to_dict() dictionary.'''
+        self._weeks = {w: dict(v) for w, v in data["weeks"].items()}
+        self._days = {d: dict(v) for d, v in data["days"].items()}
+        self._activities = dict(data["activities"])
+
+    def put_summary(self, summary_uri: pathlib.Path, fingerprint: dict) -> bool:
+        '''Save the totals to a .json file along with a fingerprint of the
+        model they summarize.'''
+        with open(summary_uri, 'w') as file:
+            json.dump({"fingerprint": fingerprint, **self.to_dict()}, file)
+        return True
+
+    def get_summary(self, summary_uri: pathlib.Path, fingerprint: dict) -> bool:
+        '''Load the totals from a .json file if it exists and its fingerprint
+        matches, returns True if loaded, False otherwise.'''
+        path = pathlib.Path(summary_uri)
+        if not path.is_file(): return False
+        try:
+            with open(path, 'r') as file:
+                data = json.load(file)
+            if data.get("fingerprint") != fingerprint: return False
+            self.from_dict(data)
+            return True
+        except (ValueError, KeyError, AttributeError, TypeError):
+            return False
+    #endregion ATSummary persistence
+#endregion class ATSummary
+#------------------------------------------------------------------------------+
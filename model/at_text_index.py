@@ -0,0 +1,198 @@
+#-----------------------------------------------------------------------------+
+# at_text_index.py
+'''
+Module at_text_index provides ATTextIndex, an inverted index of the words in
+the activity name and notes of ActivityEntry objects, so an ATModel can find
+"every entry mentioning the migration" without a linear substring scan.
+
+Text is split into lower case word tokens. Each token maps to the set of
+entries containing it, and a sorted vocabulary supports prefix terms with a
+binary search. The index is updated incrementally as entries are added or
+removed, and can be saved next to the activity store.
+
+Query syntax: terms separated by spaces must all match (AND), the keyword OR
+separates alternatives, and a term ending in * matches as a prefix.
+For example "migration db*" or "migration OR upgrade".
+'''
+import bisect, json, pathlib, re
+from typing import Dict, Iterable, List, Set
+import at_utilities.at_utils as atu
+from model.ae import ActivityEntry
+
+ATT_TOKEN_RE = re.compile(r"\w+")
+ATT_OR = "OR"
+ATT_AND = "AND"
+ATT_PREFIX = "*"
+#------------------------------------------------------------------------------+
+#region class ATTextIndex
+class ATTextIndex:
+    '''
+    ATTextIndex is an inverted index over ActivityEntry.activity and .notes.
+    Entries are tracked by object identity.
+
+    Methods
+    -------
+    tokenize(text : str) -> List[str]
+        split text into lower case word tokens
+    rebuild(aes : Iterable[ActivityEntry]) -> None
+        rebuild the index for the entries
+    add(ae : ActivityEntry) -> None
+        index the words of an entry
+    remove(ae : ActivityEntry) -> bool
+        remove an entry, using the words it was indexed with
+    search(query : str) -> List[ActivityEntry]
+        entries matching the query in start time order
+    '''
+    def __init__(self, aes: Iterable[ActivityEntry] = None):
+        self._postings: Dict[str, Set[int]] = {}  # token -> set of id(ae)
+        self._vocab: List[str] = []  # sorted tokens for prefix terms
+        self._entries: Dict[int, tuple] = {}  # id(ae) -> (key, seq, ae, tokens)
+        self._next_seq = 0
+        if aes is not None: self.rebuild(aes)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def tokenize(text: str) -> List[str]:
+        '''Split text into lower case word tokens.'''
+        if not isinstance(text, str): return []
+        return ATT_TOKEN_RE.findall(text.lower())
+
+    #region rebuild(), add(), remove()
+    def rebuild(self, aes: Iterable[ActivityEntry]) -> None:
+        '''Rebuild the index for the entries.'''
+        self._postings = {}; self._entries = {}; self._next_seq = 0
+        for ae in aes: self._add(ae, ATTextIndex.entry_tokens(ae))
+        self._vocab = sorted(self._postings)
+
+    def add(self, ae: ActivityEntry) -> None:
+        '''Index the words of the activity name and notes of ae.'''
+        if id(ae) in self._entries:
+            raise ValueError(f"ActivityEntry is already indexed: {ae!r}")
+        for token in self._add(ae, ATTextIndex.entry_tokens(ae)):
+            bisect.insort(self._vocab, token)
+
+    def remove(self, ae: ActivityEntry) -> bool:
+        '''Remove ae from the index, returns True if removed.'''
+        entry = self._entries.pop(id(ae), None)
+        if entry is None: return False
+        for token in entry[3]:
+            ids = self._postings[token]
+            ids.discard(id(ae))
+            if len(ids) == 0:
+                del self._postings[token]
+                i = bisect.bisect_left(self._vocab, token)
+                del self._vocab[i]
+        return True
+
+    @staticmethod
+    def entry_tokens(ae: ActivityEntry) -> frozenset:
+        '''Return the set of tokens for the activity name and notes of ae.'''
+        return frozenset(ATTextIndex.tokenize(ae.activity) + \
+                         ATTextIndex.tokenize(ae.notes))
+
+    def _add(self, ae: ActivityEntry, tokens: frozenset) -> List[str]:
+        '''Add ae with its tokens, returns the tokens new to the index.'''
+        self._entries[id(ae)] = (atu.iso_date_key(ae.start), self._next_seq,
+                                 ae, tokens)
+        self._next_seq += 1
+        new_tokens = []
+        for token in tokens:
+            ids = self._postings.get(token)
+            if ids is None:
+                ids = self._postings[token] = set()
+                new_tokens.append(token)
+            ids.add(id(ae))
+        return new_tokens
+    #endregion rebuild(), add(), remove()
+    #--------------------------------------------------------------------------+
+    #region search()
+    def search(self, query: str) -> List[ActivityEntry]:
+        '''Return the entries matching query, in start time order.
+        Raises TypeError if query is not a str.'''
+        if not isinstance(query, str):
+            t = type(query).__name__
+            raise TypeError(f"query must be type:str, not type:'{t}'")
+        found: Set[int] = set()
+        for clause in ATTextIndex.parse_query(query):
+            found |= self._match_clause(clause)
+        entries = sorted(self._entries[i][:3] for i in found)
+        return [entry[2] for entry in entries]
+
+    @staticmethod
+    def parse_query(query: str) -> List[List[str]]:
+        '''Parse query into OR clauses, each a List of AND terms.'''
+        clauses: List[List[str]] = [[]]
+        for word in query.split():
+            if word == ATT_OR:
+                clauses.append([])
+            elif word != ATT_AND:
+                prefix = word.endswith(ATT_PREFIX)
+                clauses[-1].extend(t + ATT_PREFIX if prefix else t
+                                   for t in ATTextIndex.tokenize(word))
+        return [clause for clause in clauses if len(clause) > 0]
+
+    def _match_clause(self, clause: List[str]) -> Set[int]:
+        '''Return the ids matching every term in clause.'''
+        sets = sorted((self._match_term(term) for term in clause), key=len)
+        found = set(sets[0])
+        for s in sets[1:]:
+            if len(found) == 0: break
+            found &= s
+        return found
+
+    def _match_term(self, term: str) -> Set[int]:
+        '''Return the ids for a token, or for all tokens of a prefix term.'''
+        if not term.endswith(ATT_PREFIX):
+            return self._postings.get(term, set())
+        prefix = term[:-1]
+        found: Set[int] = set()
+        i = bisect.bisect_left(self._vocab, prefix)
+        while i < len(self._vocab) and self._vocab[i].startswith(prefix):
+            found |= self._postings[self._vocab[i]]
+            i += 1
+        return found
+    #endregion search()
+    #--------------------------------------------------------------------------+
+    #region ATTextIndex persistence
+    def put_index(self, index_uri: pathlib.Path, aes: List[ActivityEntry],
+                  fingerprint: dict) -> bool:
+        '''Save the index to a .json file, with entries recorded by their
+        position in aes, along with a fingerprint of the model.'''
+        positions = {id(ae): i for i, ae in enumerate(aes)}
+        postings = {token: sorted(positions[i] for i in ids)
+                    for token, ids in self._postings.items()}
+        with open(index_uri, 'w') as file:
+            json.dump({"fingerprint": fingerprint, "postings": postings}, file)
+        return True
+
+    def get_index(self, index_uri: pathlib.Path, aes: List[ActivityEntry],
+                  fingerprint: dict, keys: List[float] = None) -> bool:
+        '''Load the index from a .json file if it exists and its fingerprint
+        matches, with positions mapped to the entries of aes. The start time
+        sort keys of aes may be given to avoid computing them again.
+        Returns True if loaded, False otherwise.'''
+        path = pathlib.Path(index_uri)
+        if not path.is_file(): return False
+        try:
+            with open(path, 'r') as file:
+                data = json.load(file)
+            if data.get("fingerprint") != fingerprint: return False
+            tokens: List[list] = [[] for _ in aes]
+            postings = {}
+            for token, positions in data["postings"].items():
+                postings[token] = {id(aes[i]) for i in positions}
+                for i in positions: tokens[i].append(token)
+        except (ValueError, KeyError, AttributeError, TypeError, IndexError):
+            return False
+        self._postings = postings
+        self._vocab = sorted(postings)
+        if keys is None: keys = [atu.iso_date_key(ae.start) for ae in aes]
+        self._entries = {id(ae): (keys[i], i, ae, frozenset(tokens[i]))
+                         for i, ae in enumerate(aes)}
+        self._next_seq = len(aes)
+        return True
+    #endregion ATTextIndex persistence
+#endregion class ATTextIndex
+#------------------------------------------------------------------------------+
@@ -0,0 +1,100 @@
+#-----------------------------------------------------------------------------+
+# at_timer.py
+'''
+Module at_timer provides ATRunningTimer, the live "start now, stop later"
+activity of an ATModel.
+
+A running timer holds only its start time, activity and notes. The elapsed
+time is computed when asked for, so a running timer needs no ticks, and
+it is written to disk only when it starts and when it stops. A small json
+checkpoint record next to the activity store lets a timer survive a crash:
+it is restored when the store is next loaded. The checkpoint is written to
+a temporary file and renamed, so it is never left half written.
+'''
+import json, os, pathlib
+from dataclasses import dataclass
+import at_utilities.at_utils as atu
+from model.ae import ActivityEntry
+
+#------------------------------------------------------------------------------+
+#region class ATRunningTimer
+@dataclass(kw_only=True)
+class ATRunningTimer:
+    '''
+    ATRunningTimer is a running activity that has not stopped yet.
+
+    Attributes
+    ----------
+    start : str
+        ISO timestamp the timer started, now by default
+    activity : str
+        the activity name
+    notes : str
+        notes for the activity
+    id : str
+        the id the ActivityEntry will have when the timer stops
+
+    Methods
+    -------
+    elapsed(now : str = None) -> float
+        hours from start to now, or to the current time
+    to_entry(stop : str = None) -> ActivityEntry
+        the ActivityEntry for the timer stopped at stop, or now
+    put_checkpoint(uri) / get_checkpoint(uri) / clear_checkpoint(uri)
+        save, load or remove the crash checkpoint record
+    '''
+    start: str = None
+    activity: str = None
+    notes: str = None
+    id: str = None
+
+    def __post_init__(self):
+        self.start = atu.validate_start(self.start)
+        self.id = self.id if atu.str_notempty(self.id) else ActivityEntry.new_id()
+
+    def elapsed(self, now: str = None) -> float:
+        '''Return the hours from start to now, by default the current time.'''
+        return atu.calculate_duration(self.start, now or atu.now_iso_date_string())
+
+    def to_entry(self, stop: str = None) -> ActivityEntry:
+        '''Return the ActivityEntry for the timer stopped at stop, by
+        default now. Raises ValueError if stop is before start.'''
+        stop = stop or atu.now_iso_date_string()
+        if atu.calculate_duration(self.start, stop) < 0:
+            raise ValueError(f"stop '{stop}' is before the timer start '{self.start}'")
+        return ActivityEntry(start=self.start, stop=stop, activity=self.activity,
+                             notes=self.notes, id=self.id)
+
+    def to_dict(self) -> dict:
+        return {"start": self.start, "activity": self.activity,
+                "notes": self.notes, "id": self.id}
+
+    #region ATRunningTimer checkpoint
+    def put_checkpoint(self, checkpoint_uri: pathlib.Path) -> bool:
+        '''Save the timer to the checkpoint file, atomically.'''
+        path = pathlib.Path(checkpoint_uri)
+        tmp = path.with_name(path.name + ".tmp")
+        with open(tmp, 'w') as file:
+            json.dump(self.to_dict(), file)
+        os.replace(tmp, path)
+        return True
+
+    @staticmethod
+    def get_checkpoint(checkpoint_uri: pathlib.Path) -> 'ATRunningTimer':
+        '''Return the timer saved in the checkpoint file, None if there is
+        no valid checkpoint.'''
+        path = pathlib.Path(checkpoint_uri)
+        if not path.is_file(): return None
+        try:
+            with open(path, 'r') as file:
+                return ATRunningTimer(**json.load(file))
+        except (ValueError, TypeError):
+            return None
+
+    @staticmethod
+    def clear_checkpoint(checkpoint_uri: pathlib.Path) -> None:
+        '''Remove the checkpoint file, if any.'''
+        pathlib.Path(checkpoint_uri).unlink(missing_ok=True)
+    #endregion ATRunningTimer checkpoint
+#endregion class ATRunningTimer
+#------------------------------------------------------------------------------+
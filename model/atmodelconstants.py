@@ -3,4 +3,12 @@ TE_DEFAULT_DURATION = 0.5 # Default in hours for an activity entry
 TE_DEFAULT_DURATION_MINUTES = TE_DEFAULT_DURATION * 60.0 # Default in minutes
 TE_DEFAULT_DURATION_SECONDS = TE_DEFAULT_DURATION * 3600.0 # Default in seconds
 FATM_DEFAULT_ACTIVITY_STORE_URI = "activity.json"  # default filename for saving
+FATM_SUMMARY_SUFFIX = ".summary.json"  # summary file suffix next to the store
+FATM_TEXT_INDEX_SUFFIX = ".textindex.json"  # text index file suffix
+FATM_TIMER_SUFFIX = ".timer.json"  # running timer checkpoint file suffix
+ATM_IMPORT_BATCH_SIZE = 1000  # entries validated and added per import batch
+ATM_EXPORT_BATCH_SIZE = 10000  # rows per record batch for columnar exports
+ATM_UNDO_DEPTH = 1000  # most undo steps kept by a model
+ATM_EVENT_CHANGED = "activities_changed"  # ATModelEvent name for deltas
+ATM_EVENT_MAX_CHANGES = 100  # most changes listed in one ATModelEvent
 #-----------------------------------------------------------------------------+
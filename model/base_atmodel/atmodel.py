@@ -1,7 +1,13 @@
 #-----------------------------------------------------------------------------+
 from abc import ABC, abstractmethod
-from typing import List
+from typing import Iterable, Iterator, List, Tuple
 from model.ae import ActivityEntry
+from model.at_summary import ATSummary
+from model.at_stats import ATStats
+from model.at_query import ATQuery
+from model.at_change import ATChange
+from model.at_recurrence import ATRecurrence
+from model.at_timer import ATRunningTimer
 
 class ATModel(ABC):
     """
@@ -22,12 +28,76 @@ class ATModel(ABC):
         The ISO format timestamp of the last modification
     modified_by : str
         The username to last modify the content
+    summary : ATSummary
+        Duration totals per ISO week, per day and per activity, updated
+        incrementally as activities change
+    stats : ATStats
+        Duration count, mean, variance and quantile sketches per ISO week
+        and activity, mergeable across weeks and stores
+    timer : ATRunningTimer
+        The running activity timer, None when no timer is running
 
     Methods
     -------
-    add_activity(ae : ActivityEntry) -> ActivityEntry
+    add_activity(ae : ActivityEntry, allow_overlap : bool) -> ActivityEntry
         adds the provided ActivityEntry instance to the activities List,
-        returns ae upon success, None otherwise
+        returns ae upon success, None otherwise. Overlapping activities are
+        flagged, and rejected with ValueError when allow_overlap is False
+    add_activities(aes : List[ActivityEntry], record : bool) 
+                   -> List[ActivityEntry]
+        adds a batch of ActivityEntry instances to the activities List,
+        updating the modification metadata once for the whole batch,
+        returns aes upon success. With record False, the batch is not
+        recorded as an undo step
+    iter_activities(start : str, stop : str, activity) -> Iterator[ActivityEntry]
+        iterates the activities in start time order without copying them,
+        optionally limited to a start time range and to activity names
+    activities_between(start : str, stop : str) -> List[ActivityEntry]
+        returns the activities starting in [start, stop) in O(log n) time
+        plus the size of the result
+    activity_at(ts : str) -> ActivityEntry
+        returns the activity in progress at timestamp ts, None otherwise
+    overlapping(start : str, stop : str) -> List[ActivityEntry]
+        returns the activities overlapping [start, stop) in start time order
+    conflict_report() -> List[Tuple[ActivityEntry, ActivityEntry]]
+        returns every pair of overlapping activities in O(n log n + k)
+    search_activities(query : str) -> List[ActivityEntry]
+        returns the activities whose name or notes match a word query
+    complete_activity(prefix : str, k : int) -> List[str]
+        returns up to k activity names starting with prefix, best ranked
+    get_activity(entry_id : str) -> ActivityEntry
+        returns the activity with the stable entry id, None otherwise
+    update_activity(entry_id : str, allow_overlap : bool, **fields) -> ATChange
+        changes fields of the activity with the entry id, returns a minimal
+        ATChange record, or None if no value changed
+    remove_activity(entry_id : str) -> ATChange
+        removes the activity with the entry id, returns an ATChange record
+    undo() -> List[ATChange]
+        undoes the last add, update or remove operation, returns the changes
+        applied, None if there is nothing to undo
+    redo() -> List[ATChange]
+        redoes the last undone operation, returns the changes applied,
+        None if there is nothing to redo
+    add_recurrence(r : ATRecurrence) -> ATRecurrence
+        adds a recurring activity template, stored in place of its activities
+    remove_recurrence(recurrence_id : str) -> ATRecurrence
+        removes a recurring activity template
+    iter_occurrences(start : str, stop : str) -> Iterator[ActivityEntry]
+        iterates the template occurrences in a window, expanded lazily
+    iter_schedule(start : str, stop : str) -> Iterator[ActivityEntry]
+        iterates the activities and template occurrences in a window
+    materialize_occurrence(occurrence_id : str, **fields) -> ActivityEntry
+        turns an occurrence into an activity, as when it is edited
+    start_timer(activity : str, notes : str, start : str) -> ATRunningTimer
+        starts a running activity, computing elapsed time on demand
+    stop_timer(stop : str) -> ActivityEntry
+        stops the running activity, adding it to the activities and saving
+        the activity store, with any other unsaved changes
+    discard_timer() -> ATRunningTimer
+        stops the running activity without adding it
+    query() -> ATQuery
+        returns a declarative query over the activities, for example
+        query().between(a, b).group_by('week', 'activity').sum('duration')
     """
 
     @property
@@ -85,7 +155,120 @@ class ATModel(ABC):
     def modified_by(self, value: str) -> None:
         raise NotImplementedError
 
+    @property
+    @abstractmethod
+    def summary(self) -> ATSummary:
+        raise NotImplementedError
+
+    @property
+    @abstractmethod
+    def stats(self) -> ATStats:
+        raise NotImplementedError
+
+    @abstractmethod
+    def add_activity(self, ae: ActivityEntry, 
+                     allow_overlap: bool = True) -> ActivityEntry:
+        raise NotImplementedError
+
+    @abstractmethod
+    def add_activities(self, aes: List[ActivityEntry],
+                       record: bool = True) -> List[ActivityEntry]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def iter_activities(self, start: str = None, stop: str = None,
+                        activity: str | Iterable[str] = None) \
+                        -> Iterator[ActivityEntry]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def activities_between(self, start: str = None, 
+                           stop: str = None) -> List[ActivityEntry]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def activity_at(self, ts: str) -> ActivityEntry:
+        raise NotImplementedError
+
+    @abstractmethod
+    def overlapping(self, start: str, stop: str) -> List[ActivityEntry]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def conflict_report(self) -> List[Tuple[ActivityEntry, ActivityEntry]]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def search_activities(self, query: str) -> List[ActivityEntry]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def complete_activity(self, prefix: str, k: int = None) -> List[str]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_activity(self, entry_id: str) -> ActivityEntry:
+        raise NotImplementedError
+
+    @abstractmethod
+    def update_activity(self, entry_id: str, allow_overlap: bool = True,
+                        **fields) -> ATChange:
+        raise NotImplementedError
+
+    @abstractmethod
+    def remove_activity(self, entry_id: str) -> ATChange:
+        raise NotImplementedError
+
+    @abstractmethod
+    def undo(self) -> List[ATChange]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def redo(self) -> List[ATChange]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def add_recurrence(self, r: ATRecurrence) -> ATRecurrence:
+        raise NotImplementedError
+
+    @abstractmethod
+    def remove_recurrence(self, recurrence_id: str) -> ATRecurrence:
+        raise NotImplementedError
+
+    @abstractmethod
+    def iter_occurrences(self, start: str, stop: str) -> Iterator[ActivityEntry]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def iter_schedule(self, start: str, stop: str) -> Iterator[ActivityEntry]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def materialize_occurrence(self, occurrence_id: str,
+                               **fields) -> ActivityEntry:
+        raise NotImplementedError
+
+    @property
+    @abstractmethod
+    def timer(self) -> ATRunningTimer:
+        raise NotImplementedError
+
+    @abstractmethod
+    def start_timer(self, activity: str = None, notes: str = None,
+                    start: str = None) -> ATRunningTimer:
+        raise NotImplementedError
+
+    @abstractmethod
+    def stop_timer(self, stop: str = None) -> ActivityEntry:
+        raise NotImplementedError
+
     @abstractmethod
-    def add_activity(self, ae: ActivityEntry) -> ActivityEntry:
+    def discard_timer(self) -> ATRunningTimer:
         raise NotImplementedError
 
+    def query(self) -> ATQuery:
+        """ Return an ATQuery over all of the activities, run with
+            iter_activities() so time range and activity filters use the
+            model's indexes. A subclass may return an ATQuery subclass that
+            runs the query in its storage backend."""
+        return ATQuery(self)
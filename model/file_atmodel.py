@@ -1,13 +1,31 @@
 #-----------------------------------------------------------------------------+
 # file_atmodel.py
-import getpass, json, pathlib
+import bisect, copy, getpass, hashlib, heapq, json, logging, pathlib
 from abc import ABC, abstractmethod
-from typing import List
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, List, Tuple
 import at_utilities.at_utils as atu
+from atconstants import AT_APP_NAME
 from model.ae import ActivityEntry
+from model.at_interval_index import ATIntervalIndex
+from model.at_summary import ATSummary
+from model.at_stats import ATStats
+from model.at_text_index import ATTextIndex
+from model.at_activity_trie import ATActivityTrie
+from model.at_change import ATChange, ATCH_FIELDS, ATCH_ADDED, ATCH_REMOVED, \
+    ATCH_UPDATED, ATCH_RECURRENCE_ADDED, ATCH_RECURRENCE_REMOVED, \
+    ATCH_OCCURRENCE_EXCLUDED
+from model.at_history import ATHistory
+from model.at_recurrence import ATRecurrence, ATR_ID_SEPARATOR
+from model.at_timer import ATRunningTimer
 from model.base_atmodel.atmodel import ATModel
+if TYPE_CHECKING:  # imported when used, as at_events sets up logging
+    from at_utilities.at_events import ATEventRegistry
 from model.atmodelconstants import TE_DEFAULT_DURATION, \
-    TE_DEFAULT_DURATION_SECONDS, FATM_DEFAULT_ACTIVITY_STORE_URI
+    TE_DEFAULT_DURATION_SECONDS, FATM_DEFAULT_ACTIVITY_STORE_URI, \
+    FATM_SUMMARY_SUFFIX, FATM_TEXT_INDEX_SUFFIX, FATM_TIMER_SUFFIX, \
+    ATM_EVENT_CHANGED, ATM_EVENT_MAX_CHANGES
+
+logger = logging.getLogger(AT_APP_NAME)  # create logger for the module
 
 class FileATModel(ATModel):
     #region FileATModel Class doc string
@@ -31,19 +49,116 @@ class FileATModel(ATModel):
         ISO format timestamp string for the last modification
     modified_by : str
         The username to last modify the content
+    summary : ATSummary
+        Duration totals per ISO week, per day and per activity, kept up to
+        date incrementally as activities are added
+    stats : ATStats
+        Streaming duration statistics and quantile sketches per ISO week 
+        and activity, built on first use and then kept up to date next to
+        the summary totals
 
     FileATModel Properties (specific to FileATModel class)
     ------------------------------------------------------
+    persist_text_index : bool
+        When True, put_atmodel() also saves the notes text index next to
+        the activity store, with the FATM_TEXT_INDEX_SUFFIX
+    history : ATHistory
+        The undo and redo steps of changes to the activities
+    recurrences : List[ATRecurrence]
+        The recurring activity templates, saved with the activity store
+    timer : ATRunningTimer
+        The running activity timer, None when no timer is running
+    event_manager : ATEventRegistry
+        An event manager, such as an ATEventManager or AsyncATEventManager.
+        When set, each change to the activities is published to it as an 
+        ATModelEvent named ATM_EVENT_CHANGED, None by default. An event
+        lists at most ATM_EVENT_MAX_CHANGES changes
 
     ATModel Methods (from ATModel abstract base class)
     --------------------------------------------------
-    add_activity(ae : ActivityEntry) -> ActivityEntry
+    add_activity(ae : ActivityEntry, allow_overlap : bool) -> ActivityEntry
         adds the provided ActivityEntry instance to the activities List,
-        returns ae upon success, None otherwise
+        returns ae upon success, None otherwise. An overlap with existing
+        activities is logged as a warning, or raises ValueError when
+        allow_overlap is False
+    add_activities(aes : List[ActivityEntry], record : bool) 
+                   -> List[ActivityEntry]
+        adds a batch of ActivityEntry instances to the activities List,
+        updating modified_by and last_modified_date once per batch. With
+        record False, the batch is not an undo step
+    iter_activities(start : str, stop : str, activity) -> Iterator[ActivityEntry]
+        iterates the activities with start >= start and start < stop,
+        optionally only those for the activity name(s) given
+    activities_between(start : str, stop : str) -> List[ActivityEntry]
+        returns the activities with start >= start and start < stop
+    activity_at(ts : str) -> ActivityEntry
+        returns the activity in progress at timestamp ts, None otherwise
+    overlapping(start : str, stop : str) -> List[ActivityEntry]
+        returns the activities overlapping the interval [start, stop)
+    conflict_report() -> List[Tuple[ActivityEntry, ActivityEntry]]
+        returns every pair of activities that overlap in time
+    search_activities(query : str) -> List[ActivityEntry]
+        returns the activities whose name or notes match a word query
+    complete_activity(prefix : str, k : int) -> List[str]
+        returns up to k activity names starting with prefix, ranked by
+        how often and how recently they were used
+    get_activity(entry_id : str) -> ActivityEntry
+        returns the activity with the entry id, None otherwise
+    update_activity(entry_id : str, allow_overlap : bool, **fields) -> ATChange
+        changes fields of the activity with the entry id in place, 
+        returns the ATChange, or None if no value changed
+    remove_activity(entry_id : str) -> ATChange
+        removes the activity with the entry id, returns the ATChange
+    undo() -> List[ATChange]
+        undoes the last add, update or remove operation, returns the 
+        changes made to undo it, None if there is nothing to undo
+    redo() -> List[ATChange]
+        redoes the last undone operation, returns the changes made to redo
+        it, None if there is nothing to redo
+    add_recurrence(r : ATRecurrence) -> ATRecurrence
+        adds a recurring activity template
+    remove_recurrence(recurrence_id : str) -> ATRecurrence
+        removes a recurring activity template
+    iter_occurrences(start : str, stop : str) -> Iterator[ActivityEntry]
+        iterates the template occurrences starting in [start, stop), in 
+        start time order, expanded lazily
+    iter_schedule(start : str, stop : str) -> Iterator[ActivityEntry]
+        iterates the activities and template occurrences starting in 
+        [start, stop), in start time order
+    materialize_occurrence(occurrence_id : str, **fields) -> ActivityEntry
+        adds an occurrence to the activities as an ActivityEntry with the
+        fields changed, excluding it from its template
+    start_timer(activity : str, notes : str, start : str) -> ATRunningTimer
+        starts a running activity timer, checkpointed next to the store
+    stop_timer(stop : str) -> ActivityEntry
+        stops the running timer, adding its activity
+    discard_timer() -> ATRunningTimer
+        stops the running timer without adding an activity
 
     FileATModel Methods (specific to FileATModel class)
     ---------------------------------------------------
 
+    The activities List is kept sorted by start time. A parallel List of
+    start time sort keys finds insertion points and range bounds by O(log n)
+    binary search, while the list insert or delete itself is O(n), moving 
+    the entries after it. Entries with equal start times keep insertion 
+    order. A hash map of entry ids locates an activity for update or 
+    removal, and its position is found by binary search of the start time
+    keys. Legacy files with unsorted activities are sorted once when loaded.
+    The model keeps its own copy of a List of activities it is given.
+    An ATIntervalIndex over the [start, stop) intervals answers overlap 
+    queries for k results in O((k + 1) log n) expected time. The summary 
+    totals are saved next to the activity store, with the 
+    FATM_SUMMARY_SUFFIX, and are loaded instead of recomputed when they 
+    match the store. An ATTextIndex over the words of the activity names
+    and notes answers search_activities() queries. The interval index, text
+    index, activity name trie and stats are built on first use, the text
+    index from its saved file when it matches the store, so loading a store
+    parses it, sorts it if needed and maps the ids, and takes the summary
+    totals from their file, without building the other indexes.
+    Change activities through add_activity() or add_activities(), or assign
+    a whole new List, so the sort order and keys stay consistent.
+
     """
     #endregion FileATModel Class doc string
     # ------------------------------------------------------------------------ +
@@ -64,7 +179,22 @@ class FileATModel(ATModel):
         # Private Property attributes initialization
         # Do some validation of the input parameters with defaults assigned
         self._activityname = atu.str_or_none(activityname)
-        self._activities = FileATModel.valid_activities_list(activities)
+        self._activities = list(FileATModel.valid_activities_list(activities))
+        self._start_keys: List[float] = []  # sort keys parallel to activities
+        self._ids: Dict[str, ActivityEntry] = {}  # entry id -> activity
+        self._history = ATHistory()  # undo and redo steps
+        self._event_manager: 'ATEventRegistry' = None  # publishes changes
+        self._recurrences: Dict[str, ATRecurrence] = {}  # id -> template
+        self._timer: ATRunningTimer = None  # running activity, if any
+        self._timer_store_path: pathlib.Path = None  # the timer's store
+        self._interval_index: ATIntervalIndex = None  # overlap queries
+        self._summary = ATSummary()  # week, day and activity totals
+        self._stats: ATStats = None  # duration statistics, built on use
+        self._text_index: ATTextIndex = None  # words in names and notes
+        self._text_index_source: tuple = None  # saved (path, fingerprint)
+        self._persist_text_index = False
+        self._activity_trie: ATActivityTrie = None  # name completions
+        self._saved_fingerprints: Dict[pathlib.Path, dict] = {}  # side files
         self._created_date = atu.timestamp_str_or_default(created_date)
         self._last_modified_date = \
             atu.stop_str_or_default(last_modified_date,self.created_date)
@@ -72,6 +202,7 @@ class FileATModel(ATModel):
             if atu.str_notempty(modified_by) else getpass.getuser()
         self._activity_store_uri = activity_store_uri \
             if atu.str_notempty(activity_store_uri) else FATM_DEFAULT_ACTIVITY_STORE_URI
+        self._rebuild_indexes()
     # ------------------------------------------------------------------------ +
 
     def to_dict(self):
@@ -85,6 +216,8 @@ class FileATModel(ATModel):
             "modified_by": self.modified_by,
             "activity_store_uri": self.activity_store_uri
         }
+        if len(self._recurrences) > 0:
+            ret["recurrences"] = [r.to_dict() for r in self.recurrences]
         return ret
 
     def __repr__(self) -> str:
@@ -124,7 +257,8 @@ class FileATModel(ATModel):
     
     @activities.setter
     def activities(self, value: List[ActivityEntry]) -> None:
-        self._activities = value
+        self._activities = list(FileATModel.valid_activities_list(value))
+        self._rebuild_indexes()
 
     @property
     def created_date(self) -> str:
@@ -150,6 +284,15 @@ class FileATModel(ATModel):
     def modified_by(self, value: str) -> None:
         self._modified_by = value
 
+    @property
+    def summary(self) -> ATSummary:
+        return self._summary
+
+    @property
+    def stats(self) -> ATStats:
+        if self._stats is None: self._stats = ATStats(self._activities)
+        return self._stats
+
     @property
     def activity_store_uri(self) -> str:
         return self._activity_store_uri
@@ -161,27 +304,257 @@ class FileATModel(ATModel):
     # ------------------------------------------------------------------------ +
     #region FileATModel Properties (specific to FileATModel class)
     # ------------------------------------------------------------------------ +
-    # tbd
+    @property
+    def persist_text_index(self) -> bool:
+        return self._persist_text_index
+    
+    @persist_text_index.setter
+    def persist_text_index(self, value: bool) -> None:
+        self._persist_text_index = bool(value)
+
+    @property
+    def history(self) -> ATHistory:
+        return self._history
+
+    @property
+    def recurrences(self) -> List[ATRecurrence]:
+        return list(self._recurrences.values())
+
+    @property
+    def timer(self) -> ATRunningTimer:
+        return self._timer
+
+    @property
+    def event_manager(self) -> 'ATEventRegistry':
+        return self._event_manager
+    
+    @event_manager.setter
+    def event_manager(self, value: 'ATEventRegistry') -> None:
+        from at_utilities.at_events import ATEventRegistry
+        if value is not None and not isinstance(value, ATEventRegistry):
+            t = type(value).__name__
+            raise TypeError(f"event_manager must be an event manager, " + \
+                            f"type:'ATEventRegistry', not type:'{t}'")
+        self._event_manager = value
     #endregion
 
     # ------------------------------------------------------------------------ +
     #region ATModel Methods (from ATModel abstract base class)
     # ------------------------------------------------------------------------ +
-    def add_activity(self, ae: ActivityEntry) -> ActivityEntry:
+    def add_activity(self, ae: ActivityEntry, 
+                     allow_overlap: bool = True) -> ActivityEntry:
         """ FileATModel.add_activity() - concrete impl for ABC method, 
-            add an ActivityEntry to the activities list"""
-        self.activities.append(ae)
-        self.modified_by = getpass.getuser()
-        self.last_modified_date = atu.current_timestamp()
+            insert an ActivityEntry into the activities list in start time
+            order, using a binary search for the insertion point, then an 
+            O(n) list insert.
+            Overlaps with existing activities are flagged with a warning,
+            or raise ValueError without adding ae if allow_overlap is False.
+            Raises TypeError or ValueError."""
+        self._changed([self._add_activity(ae, allow_overlap)])
         return ae
 
+    def add_activities(self, aes: List[ActivityEntry],
+                       record: bool = True) -> List[ActivityEntry]:
+        """ FileATModel.add_activities() - concrete impl for ABC method, 
+            add a batch of ActivityEntry objects to the activities list.
+            The batch is validated as a whole before any entry is added, and
+            the modification metadata is updated once for the batch.
+            A batch starting at or after the last activity is appended, 
+            otherwise the sorted runs are merged. With record False, as for
+            bulk imports, the batch is published but not recorded as an 
+            undo step. Raises TypeError or ValueError."""
+        aes = FileATModel.valid_activities_list(aes)
+        if len(aes) == 0: return aes
+        ids = set()
+        for ae in aes:
+            if ae.id in self._ids or ae.id in ids:
+                raise ValueError(f"Activity entry id is already in use: '{ae.id}'")
+            ids.add(ae.id)
+        keys = [atu.iso_date_key(ae.start) for ae in aes]
+        in_order = FileATModel.keys_sorted(keys) and \
+            (len(self._start_keys) == 0 or keys[0] >= self._start_keys[-1])
+        self._activities.extend(aes)
+        self._start_keys.extend(keys)
+        if not in_order: self._sort_activities()
+        for ae in aes: self._index_activity(ae)
+        self._set_modified()
+        changes = [ATChange.added(ae) for ae in aes]
+        if record: self._changed(changes)
+        elif not self._history.is_replaying: self._publish(changes)
+        return aes
+
+    def iter_activities(self, start: str = None, stop: str = None,
+                        activity: str | Iterable[str] = None) \
+                        -> Iterator[ActivityEntry]:
+        """ FileATModel.iter_activities() - concrete impl for ABC method,
+            iterate the activities, yielding the ActivityEntry objects 
+            themselves rather than copies. When given, start and stop limit 
+            the entries to those starting in [start, stop), and activity is 
+            an activity name, or an iterable of names, to match.
+            Raises TypeError or ValueError."""
+        lo, hi = self._range_indexes(start, stop)
+        names = FileATModel.activity_names(activity)
+        for i in range(lo, hi):
+            ae = self._activities[i]
+            if names is not None and ae.activity not in names: continue
+            yield ae
+
+    def activities_between(self, start: str = None, 
+                           stop: str = None) -> List[ActivityEntry]:
+        """ FileATModel.activities_between() - concrete impl for ABC method,
+            return the activities starting in [start, stop), in start time
+            order, located by binary search in O(log n) plus the result 
+            size. Raises TypeError or ValueError."""
+        lo, hi = self._range_indexes(start, stop)
+        return self._activities[lo:hi]
+
+    def activity_at(self, ts: str) -> ActivityEntry:
+        """ FileATModel.activity_at() - concrete impl for ABC method,
+            return the activity in progress at timestamp ts, being the 
+            latest activity with start <= ts < stop, None if there is none.
+            Located with the interval index in O((k + 1) log n) expected
+            time for k activities in progress at ts. Raises TypeError or 
+            ValueError."""
+        found = self._get_interval_index().containing(atu.iso_date_key(ts))
+        return found[-1] if len(found) > 0 else None
+
+    def overlapping(self, start: str, stop: str) -> List[ActivityEntry]:
+        """ FileATModel.overlapping() - concrete impl for ABC method,
+            return the activities overlapping [start, stop) in start time
+            order, in O((k + 1) log n) expected time for k results. Raises
+            TypeError or ValueError."""
+        start_key, stop_key = FileATModel.range_keys(start, stop)
+        return self._get_interval_index().overlapping(start_key, stop_key)
+
+    def conflict_report(self) -> List[Tuple[ActivityEntry, ActivityEntry]]:
+        """ FileATModel.conflict_report() - concrete impl for ABC method,
+            return each pair of activities that overlap in time as an
+            (earlier, later) tuple, using a sweep in start time order in
+            O(n log n + k) time for k pairs."""
+        return list(self._get_interval_index().iter_conflicts())
+
+    def search_activities(self, query: str) -> List[ActivityEntry]:
+        """ FileATModel.search_activities() - concrete impl for ABC method,
+            return the activities with words in their activity name or notes
+            matching query, in start time order, using the text index. 
+            Terms are ANDed, OR separates alternatives and a term ending 
+            in * is a prefix. Raises TypeError."""
+        return self._get_text_index().search(query)
+
+    def complete_activity(self, prefix: str, k: int = None) -> List[str]:
+        """ FileATModel.complete_activity() - concrete impl for ABC method,
+            return up to k activity names starting with prefix, ignoring 
+            case, ranked by frequency and recency of use. Takes time in
+            proportion to the prefix length. Raises TypeError."""
+        return self._get_activity_trie().complete(prefix, k)
+
+    def get_activity(self, entry_id: str) -> ActivityEntry:
+        """ FileATModel.get_activity() - concrete impl for ABC method,
+            return the activity with entry_id from the id hash map, 
+            None if there is none."""
+        return self._ids.get(entry_id)
+
+    def update_activity(self, entry_id: str, allow_overlap: bool = True,
+                        **fields) -> ATChange:
+        """ FileATModel.update_activity() - concrete impl for ABC method,
+            change the start, stop, activity and notes fields given as 
+            keyword arguments of the activity with entry_id, in place. The
+            new values are validated as for a new ActivityEntry, and checked
+            for overlaps as in add_activity(). The activity is found in O(1)
+            by id, and moved in the start time order by binary search and an
+            O(n) list delete and insert.
+            Returns the ATChange, None if no value changed.
+            Raises TypeError or ValueError."""
+        ae = self._entry_for_id(entry_id)
+        for name in fields:
+            if name not in ATCH_FIELDS:
+                raise ValueError(f"Cannot update ActivityEntry field: '{name}'")
+        new = ActivityEntry(**{**ATChange.entry_values(ae), **fields}, id=ae.id)
+        change = ATChange.updated(ae, new)
+        if change is None: return None
+        self._check_overlap(new, allow_overlap, ae)
+        old = copy.copy(ae)
+        self._remove_position(ae)
+        self._unindex_activity(ae)
+        for name in ATCH_FIELDS: setattr(ae, name, getattr(new, name))
+        self._insert_activity(ae)
+        self._index_activity(ae, old)
+        self._set_modified()
+        self._changed([change])
+        return change
+
+    def remove_activity(self, entry_id: str) -> ATChange:
+        """ FileATModel.remove_activity() - concrete impl for ABC method,
+            remove the activity with entry_id, found in O(1) by id and its
+            position by binary search, then an O(n) list delete. Returns the
+            ATChange. 
+            Raises ValueError if there is no activity with entry_id."""
+        ae = self._entry_for_id(entry_id)
+        self._remove_position(ae)
+        self._unindex_activity(ae)
+        self._summary.remove(ae)
+        self._refresh_stats(ae)
+        self._set_modified()
+        change = ATChange.removed(ae)
+        self._changed([change])
+        return change
+
+    def undo(self) -> List[ATChange]:
+        """ FileATModel.undo() - concrete impl for ABC method,
+            undo the last recorded operation by applying the inverse of its
+            changes in reverse order. Each change is located in O(1) by id
+            and O(log n) by binary search, then moved in the activities List
+            in O(n) by list insert and delete, plus the index updates. If a
+            change fails, those applied are rolled back and the step is kept
+            to undo. Returns the changes applied, None if there is nothing
+            to undo."""
+        step = self._history.pop_undo()
+        if step is None: return None
+        changes = [change.inverse() for change in reversed(step)]
+        try:
+            self._apply_changes(changes)
+        except Exception:
+            self._history.push_undo(step)
+            raise
+        self._history.push_redo(step)
+        return changes
+
+    def redo(self) -> List[ATChange]:
+        """ FileATModel.redo() - concrete impl for ABC method,
+            redo the last undone operation by applying its changes again.
+            If a change fails, those applied are rolled back and the step is
+            kept to redo. Returns the changes applied, None if there is 
+            nothing to redo."""
+        step = self._history.pop_redo()
+        if step is None: return None
+        try:
+            self._apply_changes(step)
+        except Exception:
+            self._history.push_redo(step)
+            raise
+        self._history.push_undo(step)
+        return list(step)
+
     def put_atmodel(self, activity_store_uri:str = None) -> bool:
         """ Save the current activity model to a .json file """
         # activity_store_uri is the pathname to a file and must be a str.
         # If activity_store_uri is None or "", the default filename is used.
         # Raises TypeError as appropriate.
-        with open(self.validate_activity_store_uri(activity_store_uri), 'w') as file:
-            json.dump(self.to_dict(), file, indent=4)
+        # The summary totals are saved alongside for a fast reload, unless
+        # the file already holds them for the same store content.
+        store_path = self.validate_activity_store_uri(activity_store_uri)
+        store_text = json.dumps(self.to_dict(), indent=4)
+        with open(store_path, 'w') as file:
+            file.write(store_text)
+        fp = FileATModel.summary_fingerprint(store_text)
+        summary_path = FileATModel.summary_uri(store_path)
+        if not self._is_saved(summary_path, fp):
+            self._summary.put_summary(summary_path, fp)
+            self._saved_fingerprints[summary_path] = fp
+        index_path = FileATModel.text_index_uri(store_path)
+        if self.persist_text_index and not self._is_saved(index_path, fp):
+            self._get_text_index().put_index(index_path, self._activities, fp)
+            self._saved_fingerprints[index_path] = fp
         return True
 
     def get_atmodel(self, activity_store_uri:str) -> None:
@@ -192,14 +565,31 @@ class FileATModel(ATModel):
         # activity_store_uri is the pathname to a file and must be a str.
         # If activity_store_uri is None or "", the default filename is used.
         # Raises ValueError or TypeError as appropriate.
-        with open(self.validate_activity_store_uri(activity_store_uri), 'r') as file:
-            data = json.load(file)
+        store_path = self.validate_activity_store_uri(activity_store_uri)
+        with open(store_path, 'r') as file:
+            store_text = file.read()
+            data = json.loads(store_text)
             self.activityname = data['activityname']
-            self.activities = [ActivityEntry(**ae) for ae in data['activities']]
+            self._activities = [ActivityEntry(**ae) for ae in data['activities']]
             self.created_date = data['created_date']
             self.last_modified_date = data['last_modified_date']
             self.modified_by = data['modified_by']
             self.activity_store_uri = data['activity_store_uri'] 
+            self._recurrences = {}
+            for rd in data.get('recurrences', []):
+                r = ATRecurrence(**rd)
+                self._recurrences[r.id] = r
+        self._rebuild_indexes(store_path, 
+                              FileATModel.summary_fingerprint(store_text))
+        # Restore a timer left running, as by a crash, unless the crash
+        # came after its stopped activity was saved
+        timer_uri = FileATModel.timer_uri(store_path)
+        self._timer = ATRunningTimer.get_checkpoint(timer_uri)
+        self._timer_store_path = store_path
+        if self._timer is not None and self._timer.id in self._ids:
+            self.discard_timer()
+        elif self._timer is None:
+            self._timer_store_path = None
 
     def validate_activity_store_uri(self, activity_store_uri:str) -> pathlib.Path:
         """ Validate the provided activity activity_store_uri.
@@ -225,12 +615,456 @@ class FileATModel(ATModel):
     # ------------------------------------------------------------------------ +
     #region FileATModel Methods (specific to FileATModel class)
     # ------------------------------------------------------------------------ +
+    def _rebuild_indexes(self, store_path: pathlib.Path = None,
+                         fp: dict = None) -> None:
+        """ Rebuild the start time sort keys for the activities List, 
+            sorting the activities once if they are not in start time order,
+            as with legacy activity store files. Then rebuild the indexes and
+            summary totals, and clear the undo history. An entry with the 
+            id of an earlier one is replaced by a copy with a new id, leaving
+            the caller's entry unchanged. With the store_path and fingerprint
+            fp of a loaded store, the saved summary is used when its 
+            fingerprint matches fp, as is the saved text index when it is 
+            first used. The other indexes are built on first use."""
+        self._start_keys = [atu.iso_date_key(ae.start) for ae in self._activities]
+        if not FileATModel.keys_sorted(self._start_keys): 
+            self._sort_activities()
+        self._history.clear()
+        self._ids = {}
+        for i, ae in enumerate(self._activities):
+            if ae.id in self._ids:
+                new_id = ActivityEntry.new_id()
+                logger.warning(f"Duplicate activity entry id '{ae.id}' " + \
+                               f"replaced with '{new_id}'")
+                ae = self._activities[i] = copy.copy(ae)
+                ae.id = new_id
+            self._ids[ae.id] = ae
+        self._interval_index = None  # Rebuilt on first use
+        self._saved_fingerprints = {}
+        summary_path = None if store_path is None \
+            else FileATModel.summary_uri(store_path)
+        if summary_path is not None and \
+                self._summary.get_summary(summary_path, fp):
+            self._saved_fingerprints[summary_path] = fp
+        else:
+            self._summary.rebuild(self._activities)
+        self._stats = None  # Rebuilt on the next use of stats
+        self._text_index = None
+        self._text_index_source = None if store_path is None \
+            else (FileATModel.text_index_uri(store_path), fp)
+        self._activity_trie = None
+
+    def _get_interval_index(self) -> ATIntervalIndex:
+        """ Return the interval index, building it on first use."""
+        if self._interval_index is None:
+            self._interval_index = ATIntervalIndex(self._activities)
+        return self._interval_index
+
+    def _get_text_index(self) -> ATTextIndex:
+        """ Return the text index, loading it on first use from the saved
+            file of the loaded store, when that matches the store and the
+            activities are unchanged since, otherwise building it."""
+        if self._text_index is None:
+            index = ATTextIndex()
+            source, self._text_index_source = self._text_index_source, None
+            if source is not None and index.get_index(
+                    source[0], self._activities, source[1], self._start_keys):
+                self._saved_fingerprints[source[0]] = source[1]
+            else:
+                index.rebuild(self._activities)
+            self._text_index = index
+        return self._text_index
+
+    def _get_activity_trie(self) -> ATActivityTrie:
+        """ Return the activity name trie, building it on first use."""
+        if self._activity_trie is None:
+            self._activity_trie = ATActivityTrie(self._activities)
+        return self._activity_trie
+
+    def _check_overlap(self, ae: ActivityEntry, allow_overlap: bool,
+                       exclude: ActivityEntry = None) -> None:
+        """ Log a warning if ae overlaps other activities, other than 
+            exclude, or raise ValueError if allow_overlap is False."""
+        key, stop_key = ATIntervalIndex.entry_keys(ae)
+        index = self._get_interval_index()
+        overlaps = [o for o in index.overlapping(key, stop_key)
+                    if o is not exclude]
+        if len(overlaps) > 0:
+            m = f"{ae!r} overlaps {len(overlaps)} activities: {overlaps!r}"
+            if not allow_overlap: raise ValueError(m)
+            logger.warning(m)
+
+    def _insert_activity(self, ae: ActivityEntry) -> None:
+        """ Insert ae in the activities List after any equal start times."""
+        key = atu.iso_date_key(ae.start)
+        i = bisect.bisect_right(self._start_keys, key)
+        self._start_keys.insert(i, key)
+        self._activities.insert(i, ae)
+
+    def _remove_position(self, ae: ActivityEntry) -> None:
+        """ Remove ae from the activities List, searching only the entries
+            with its start time key. Raises ValueError if ae is not among 
+            them, as when its start was changed outside the model."""
+        key = atu.iso_date_key(ae.start)
+        i = bisect.bisect_left(self._start_keys, key)
+        hi = bisect.bisect_right(self._start_keys, key, i)
+        while i < hi and self._activities[i] is not ae: i += 1
+        if i == hi:
+            raise ValueError(f"Activity entry '{ae.id}' is not at its start " + \
+                             f"'{ae.start}', change it with update_activity()")
+        del self._start_keys[i]
+        del self._activities[i]
+
+    def _index_activity(self, ae: ActivityEntry, 
+                        old: ActivityEntry = None) -> None:
+        """ Add ae to the id map and indexes. With old, the prior values 
+            of an updated ae, the summary totals are moved instead, and the
+            statistics of the old week and activity recomputed."""
+        self._ids[ae.id] = ae
+        if self._interval_index is not None: self._interval_index.add(ae)
+        if old is None:
+            self._summary.add(ae)
+            if self._stats is not None: self._stats.add(ae)
+        else:
+            self._summary.update(old, ae)
+            self._refresh_stats(old)
+            if self._stats is not None and \
+                    ATStats.entry_cell(ae) != ATStats.entry_cell(old):
+                self._stats.add(ae)
+        self._index_text(ae, True)
+
+    def _unindex_activity(self, ae: ActivityEntry) -> None:
+        """ Remove ae from the id map and indexes, other than the summary
+            totals, before its values change or it is removed."""
+        del self._ids[ae.id]
+        if self._interval_index is not None: self._interval_index.remove(ae)
+        self._index_text(ae, False)
+
+    def _index_text(self, ae: ActivityEntry, add: bool) -> None:
+        """ Add or remove ae in the text index and activity name trie, if
+            built. A saved text index no longer matches once ae changes."""
+        self._text_index_source = None
+        if self._text_index is not None:
+            if add: self._text_index.add(ae)
+            else: self._text_index.remove(ae)
+        if self._activity_trie is not None:
+            if add: self._activity_trie.add(ae)
+            else: self._activity_trie.remove(ae)
+
+    def _refresh_stats(self, ae: ActivityEntry) -> None:
+        """ Recompute the statistics of the week and activity of ae from
+            the activities of that week, found by binary search, after ae
+            was removed or changed. A quantile sketch cannot remove values.
+            Nothing is done until the statistics are first used."""
+        if self._stats is None: return
+        week, activity = ATStats.entry_cell(ae)
+        start, stop = atu.iso_week_bounds(week)
+        self._stats.rebuild_cell(week, activity,
+                                 self.iter_activities(start, stop, activity))
+
+    def _entry_for_id(self, entry_id: str) -> ActivityEntry:
+        """ Return the activity with entry_id. Raises TypeError or 
+            ValueError if there is none."""
+        if not isinstance(entry_id, str):
+            t = type(entry_id).__name__
+            raise TypeError(f"entry_id must be type:str, not type:'{t}'")
+        ae = self._ids.get(entry_id)
+        if ae is None:
+            raise ValueError(f"No activity with entry id: '{entry_id}'")
+        return ae
+
+    def add_recurrence(self, r: ATRecurrence) -> ATRecurrence:
+        """ FileATModel.add_recurrence() - concrete impl for ABC method,
+            add a recurring activity template. Its occurrences are not added
+            to the activities, they are expanded by iter_occurrences().
+            Recorded in the undo history and published as a change.
+            Raises TypeError or ValueError."""
+        _ = atu.is_obj_of_type("r", r, ATRecurrence, True)
+        if r.id in self._recurrences:
+            raise ValueError(f"Recurrence id is already in use: '{r.id}'")
+        self._recurrences[r.id] = r
+        self._set_modified()
+        self._changed([ATChange.recurrence_added(r)])
+        return r
+
+    def remove_recurrence(self, recurrence_id: str) -> ATRecurrence:
+        """ FileATModel.remove_recurrence() - concrete impl for ABC method,
+            remove a recurring activity template, leaving any activities
+            materialized from it. Recorded in the undo history and 
+            published as a change. Raises ValueError if there is none."""
+        r = self._recurrences.pop(recurrence_id, None)
+        if r is None:
+            raise ValueError(f"No recurrence with id: '{recurrence_id}'")
+        self._set_modified()
+        self._changed([ATChange.recurrence_removed(r)])
+        return r
+
+    def iter_occurrences(self, start: str, stop: str) -> Iterator[ActivityEntry]:
+        """ FileATModel.iter_occurrences() - concrete impl for ABC method,
+            iterate the occurrences of all templates starting in [start, 
+            stop), merged in start time order. Occurrences are built only as
+            they are read. Both start and stop are required, as templates
+            may repeat without end. Raises TypeError or ValueError."""
+        for name, value in (("start", start), ("stop", stop)):
+            if value is None: raise TypeError(f"{name} is required, not None")
+        FileATModel.range_keys(start, stop)  # validates start and stop
+        streams = [r.occurrences(start, stop) for r in self._recurrences.values()]
+        return heapq.merge(*streams, key=FileATModel.start_key)
+
+    def iter_schedule(self, start: str, stop: str) -> Iterator[ActivityEntry]:
+        """ FileATModel.iter_schedule() - concrete impl for ABC method,
+            iterate the activities and the template occurrences starting 
+            in [start, stop), merged in start time order, activities first
+            for equal start times. Raises TypeError or ValueError."""
+        return heapq.merge(self.iter_activities(start, stop),
+                           self.iter_occurrences(start, stop),
+                           key=FileATModel.start_key)
+
+    def materialize_occurrence(self, occurrence_id: str,
+                               **fields) -> ActivityEntry:
+        """ FileATModel.materialize_occurrence() - concrete impl for ABC 
+            method, add the template occurrence with occurrence_id, as 
+            yielded by iter_occurrences(), to the activities with any start,
+            stop, activity or notes fields changed, and add its start to the
+            template exceptions so it is no longer expanded. Both changes
+            are one undo step and one published change. Returns the new
+            ActivityEntry. Raises TypeError or ValueError."""
+        if not isinstance(occurrence_id, str):
+            t = type(occurrence_id).__name__
+            raise TypeError(f"occurrence_id must be type:str, not type:'{t}'")
+        recurrence_id, _, ts = occurrence_id.partition(ATR_ID_SEPARATOR)
+        r = self._recurrences.get(recurrence_id)
+        if r is None or not r.is_occurrence(ts):
+            raise ValueError(f"No occurrence with id: '{occurrence_id}'")
+        for name in fields:
+            if name not in ATCH_FIELDS:
+                raise ValueError(f"Cannot set ActivityEntry field: '{name}'")
+        occurrence = next(r.occurrences(ts, atu.increase_time(ts, seconds=1)))
+        ae = ActivityEntry(**{**ATChange.entry_values(occurrence), **fields})
+        added = self._add_activity(ae)
+        self._set_excluded(occurrence.id, True)
+        self._changed([added, ATChange.occurrence_excluded(occurrence)])
+        return ae
+
+    def start_timer(self, activity: str = None, notes: str = None,
+                    start: str = None) -> ATRunningTimer:
+        """ FileATModel.start_timer() - concrete impl for ABC method,
+            start a running activity timer at start, by default now. The 
+            timer is checkpointed next to the activity_store_uri, its only 
+            write until it stops. Raises ValueError if a timer is running."""
+        if self._timer is not None:
+            raise ValueError(f"A timer is already running: {self._timer!r}")
+        timer = ATRunningTimer(start=start, activity=activity, notes=notes)
+        store_path = self.validate_activity_store_uri(self.activity_store_uri)
+        timer.put_checkpoint(FileATModel.timer_uri(store_path))
+        self._timer, self._timer_store_path = timer, store_path
+        return timer
+
+    def stop_timer(self, stop: str = None) -> ActivityEntry:
+        """ FileATModel.stop_timer() - concrete impl for ABC method,
+            stop the running timer at stop, by default now, add its 
+            ActivityEntry to the activities, save the activity store the 
+            timer was started for with put_atmodel() and then remove the 
+            checkpoint, so the stopped activity is never lost to a crash.
+            The whole model is saved, so any other unsaved changes are saved
+            with it. If the save raises, the activity is removed again and
+            the timer keeps running. Raises ValueError if no timer is 
+            running, or stop is before the timer start."""
+        if self._timer is None: raise ValueError("No timer is running")
+        modified = (self.modified_by, self.last_modified_date)
+        change = self._add_activity(self._timer.to_entry(stop))
+        try:
+            self.put_atmodel(self._timer_store_path)
+        except Exception:
+            with self._history.replaying():  # Neither recorded nor published
+                self.remove_activity(change.entry_id)
+            self.modified_by, self.last_modified_date = modified
+            raise
+        self._changed([change])
+        self.discard_timer()
+        return self._ids[change.entry_id]
+
+    def discard_timer(self) -> ATRunningTimer:
+        """ FileATModel.discard_timer() - concrete impl for ABC method,
+            stop the running timer without adding an activity, removing
+            its checkpoint. Returns the timer, None if none was running."""
+        timer = self._timer
+        if self._timer_store_path is not None:
+            ATRunningTimer.clear_checkpoint(
+                FileATModel.timer_uri(self._timer_store_path))
+        self._timer, self._timer_store_path = None, None
+        return timer
+
+    def _apply_changes(self, changes: Iterable[ATChange]) -> None:
+        """ Apply ATChange records to the activities, for undo and redo,
+            without recording them in the history, and publish them as one
+            change. If a change raises, the changes applied are rolled back
+            before the exception is raised again, and none are published."""
+        applied = []
+        try:
+            for change in changes:
+                self._apply_change(change)
+                applied.append(change)
+        except Exception:
+            for change in reversed(applied):
+                self._apply_change(change.inverse())
+            raise
+        self._publish(applied)
+
+    def _apply_change(self, change: ATChange) -> None:
+        """ Apply one ATChange record without recording or publishing it."""
+        with self._history.replaying():
+            if change.kind == ATCH_ADDED:
+                self.add_activity(ActivityEntry(**change.after, 
+                                                id=change.entry_id))
+            elif change.kind == ATCH_REMOVED:
+                self.remove_activity(change.entry_id)
+            elif change.kind == ATCH_UPDATED:
+                self.update_activity(change.entry_id, **change.after)
+            elif change.kind == ATCH_RECURRENCE_ADDED:
+                self.add_recurrence(ATRecurrence(**change.after))
+            elif change.kind == ATCH_RECURRENCE_REMOVED:
+                self.remove_recurrence(change.entry_id)
+            else:
+                self._set_excluded(change.entry_id, 
+                                   change.kind == ATCH_OCCURRENCE_EXCLUDED)
+
+    def _add_activity(self, ae: ActivityEntry, 
+                      allow_overlap: bool = True) -> ATChange:
+        """ Insert and index an activity as add_activity() does, without
+            recording or publishing the change. Returns the ATChange."""
+        _ = atu.is_obj_of_type("ae", ae, ActivityEntry, True)
+        if ae.id in self._ids:
+            raise ValueError(f"Activity entry id is already in use: '{ae.id}'")
+        self._check_overlap(ae, allow_overlap)
+        self._insert_activity(ae)
+        self._index_activity(ae)
+        self._set_modified()
+        return ATChange.added(ae)
+
+    def _set_excluded(self, occurrence_id: str, excluded: bool) -> None:
+        """ Add the start of an occurrence to its template exceptions, or
+            remove it when excluded is False."""
+        recurrence_id, _, ts = occurrence_id.partition(ATR_ID_SEPARATOR)
+        r = self._recurrences[recurrence_id]
+        if excluded: r.exdates.append(ts)
+        else: r.exdates.remove(ts)
+        self._set_modified()
+
+    def _changed(self, changes: List[ATChange]) -> None:
+        """ Record the changes of one operation in the undo history and
+            publish them, unless an undo or redo step is being applied, to 
+            be published once as a whole."""
+        if self._history.is_replaying: return
+        self._history.record(changes)
+        self._publish(changes)
+
+    def _publish(self, changes: List[ATChange]) -> None:
+        """ Publish changes as one ATModelEvent to the event manager, if
+            there is one. The event lists the first ATM_EVENT_MAX_CHANGES 
+            changes, with the count of all of them, and is 'truncated' when
+            it lists fewer."""
+        if self._event_manager is None or len(changes) == 0: return
+        from at_utilities.at_events import ATModelEvent
+        ranges = [change.time_range for change in changes]
+        listed = zip(changes[:ATM_EVENT_MAX_CHANGES], ranges)
+        data = {"activityname": self.activityname,
+                "changes": [{**change.to_dict(), "time_range": r}
+                            for change, r in listed],
+                "change_count": len(changes),
+                "truncated": len(changes) > ATM_EVENT_MAX_CHANGES,
+                "time_range": (min(r[0] for r in ranges),
+                               max(r[1] for r in ranges))}
+        self._event_manager.publish(ATModelEvent(ATM_EVENT_CHANGED, data))
+
+    def _set_modified(self) -> None:
+        """ Record the user and time of a modification."""
+        self.modified_by = getpass.getuser()
+        self.last_modified_date = atu.current_timestamp()
+
+    @staticmethod
+    def summary_fingerprint(store_text: str) -> dict:
+        """ Return the values identifying the activity store content
+            store_text, saved with the summary totals and text index. Any
+            edit to the store, even one keeping its size, changes the 
+            sha256 content hash. """
+        data = store_text.encode("utf-8")
+        return {"size": len(data), "sha256": hashlib.sha256(data).hexdigest()}
+
+    def _is_saved(self, side_path: pathlib.Path, fp: dict) -> bool:
+        """ Return True if the summary or text index file at side_path was
+            saved or loaded by this model with fingerprint fp, and exists."""
+        return self._saved_fingerprints.get(side_path) == fp and \
+            side_path.is_file()
+
+    def _sort_activities(self) -> None:
+        """ Stable sort the activities List and its keys in place by the 
+            start time sort keys. Sorted runs are merged in linear time."""
+        keys = self._start_keys
+        order = sorted(range(len(keys)), key=keys.__getitem__)
+        self._activities[:] = [self._activities[i] for i in order]
+        self._start_keys = [keys[i] for i in order]
+
+    def _range_indexes(self, start: str = None, stop: str = None) -> tuple:
+        """ Return the (lo, hi) indexes of the activities starting in 
+            [start, stop) using binary search on the start time keys."""
+        start_key, stop_key = FileATModel.range_keys(start, stop)
+        lo = bisect.bisect_left(self._start_keys, start_key)
+        hi = bisect.bisect_left(self._start_keys, stop_key, lo)
+        return lo, hi
+
     @staticmethod
     def default_creation_date() -> str:
         """ Return the current date and time as a ISO format string """
         return atu.now_iso_date_string()
     #endregion
 
+    @staticmethod
+    def range_keys(start: str = None, stop: str = None) -> tuple:
+        """ Return the (start, stop) sort keys for an optional time range, 
+            an open bound is returned as -inf or inf respectively.
+            Raises TypeError or ValueError."""
+        start_key = float("-inf") if start is None else atu.iso_date_key(start)
+        stop_key = float("inf") if stop is None else atu.iso_date_key(stop)
+        return start_key, stop_key
+
+    @staticmethod
+    def summary_uri(store_path: pathlib.Path) -> pathlib.Path:
+        """ Return the path of the summary file next to an activity store. """
+        return store_path.with_suffix(FATM_SUMMARY_SUFFIX)
+
+    @staticmethod
+    def start_key(ae: ActivityEntry) -> float:
+        """ Return the start time sort key of an activity."""
+        return atu.iso_date_key(ae.start)
+
+    @staticmethod
+    def timer_uri(store_path: pathlib.Path) -> pathlib.Path:
+        """ Return the path of the timer checkpoint next to an activity store."""
+        return store_path.with_suffix(FATM_TIMER_SUFFIX)
+
+    @staticmethod
+    def text_index_uri(store_path: pathlib.Path) -> pathlib.Path:
+        """ Return the path of the text index file next to an activity store."""
+        return store_path.with_suffix(FATM_TEXT_INDEX_SUFFIX)
+
+    @staticmethod
+    def keys_sorted(keys: List[float]) -> bool:
+        """ Return True if the keys List is in non-decreasing order. """
+        return all(keys[i] <= keys[i + 1] for i in range(len(keys) - 1))
+
+    @staticmethod
+    def activity_names(activity: str | Iterable[str] = None) -> frozenset:
+        """ Return an activity filter as a frozenset of names, or None when
+            no filter is given. Raises TypeError for non-str names."""
+        if activity is None: return None
+        names = frozenset([activity] if isinstance(activity, str) else activity)
+        for name in names:
+            if not isinstance(name, str):
+                t = type(name).__name__
+                raise TypeError(f"activity names must be type:str, not type:'{t}'")
+        return names
+
     @staticmethod
     def valid_activities_list(al : List[ActivityEntry]) -> List[ActivityEntry]:
         """
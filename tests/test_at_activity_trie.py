@@ -0,0 +1,67 @@
+#------------------------------------------------------------------------------+
+import logging, pytest
+from model.ae import ActivityEntry
+from model.at_activity_trie import ATActivityTrie
+from model.file_atmodel import FileATModel
+
+def make_entry(start: str, activity: str) -> ActivityEntry:
+    return ActivityEntry(start=start, stop=start, activity=activity)
+
+def make_activities() -> list:
+    """Return activities where 'coding' is frequent, 'code review' recent."""
+    return [make_entry("2025-01-06T09:00:00", "coding"),
+            make_entry("2025-01-07T09:00:00", "coding"),
+            make_entry("2025-01-08T09:00:00", "coding"),
+            make_entry("2025-01-09T09:00:00", "Cooking"),
+            make_entry("2025-06-02T09:00:00", "code review"),
+            make_entry("2025-01-10T09:00:00", "support")]
+
+#region test_activity_trie_complete()
+def test_activity_trie_complete():
+    """Test ATActivityTrie ranking, top-k and incremental add and remove."""
+    logging.debug("Starting test_activity_trie_complete()")
+    aes = make_activities()
+    trie = ATActivityTrie(aes, top_k=3)
+    assert len(trie) == 4 and trie.top_k == 3
+    assert trie.complete("co") == ["code review", "coding", "Cooking"], \
+        "a recent name should outrank older frequent names"
+    assert trie.complete("CO", 2) == ["code review", "coding"]
+    assert trie.complete("coo") == ["Cooking"], "prefix case was not ignored"
+    assert trie.complete("x") == [] and trie.complete("support ") == []
+    assert len(trie.complete("")) == 3
+    with pytest.raises(TypeError):
+        trie.complete(None)
+    with pytest.raises(ValueError):
+        ATActivityTrie(top_k=0)
+    # A name used often and recently moves up, matching a full rebuild
+    more = [make_entry(f"2025-06-0{d}T09:00:00", "Cooking") for d in (3, 4)]
+    for ae in more: trie.add(ae)
+    assert trie.complete("co") == ["Cooking", "code review", "coding"]
+    assert trie.complete("") == ATActivityTrie(aes + more, 3).complete("")
+    # Removing entries re-ranks, and drops names with no entries left
+    for ae in more: trie.remove(ae)
+    assert trie.complete("co") == ["code review", "coding", "Cooking"]
+    trie.remove(aes[4])
+    assert trie.complete("cod") == ["coding"] and len(trie) == 3
+    assert trie.complete("code ") == [], "empty trie nodes were not pruned"
+    assert trie.complete("") == ATActivityTrie(aes[:4] + aes[5:], 3).complete("")
+    # A name longer once lowered, "İ" lowers to "i" and a combining dot
+    dotted = make_entry("2025-06-05T09:00:00", "İstanbul trip")
+    trie.add(dotted); trie.remove(dotted)
+    assert trie.complete("i̇") == [], "lowered name trie nodes were not pruned"
+    logging.debug("Completed test_activity_trie_complete()")
+#endregion test_activity_trie_complete()
+
+#region test_atmodel_complete_activity()
+def test_atmodel_complete_activity():
+    """Test FileATModel complete_activity() follows add_activity()."""
+    logging.debug("Starting test_atmodel_complete_activity()")
+    aes = make_activities()
+    atm = FileATModel("trie_activity", activities=aes[:4])
+    assert atm.complete_activity("co") == ["coding", "Cooking"]
+    atm.add_activity(aes[4])
+    atm.add_activities(aes[5:])
+    assert atm.complete_activity("co") == ["code review", "coding", "Cooking"]
+    assert atm.complete_activity("s", 1) == ["support"]
+    logging.debug("Completed test_atmodel_complete_activity()")
+#endregion test_atmodel_complete_activity()
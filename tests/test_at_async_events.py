@@ -0,0 +1,107 @@
+#------------------------------------------------------------------------------+
+import asyncio, logging, threading, pytest
+from atconstants import *
+from model.atmodelconstants import ATM_EVENT_CHANGED
+from at_utilities.at_events import ATEvent, ATModelEvent, ATViewEvent
+from at_utilities.at_async_events import AsyncATEventManager
+from model.ae import ActivityEntry
+from model.file_atmodel import FileATModel
+
+#region test_async_event_manager()
+def test_async_event_manager():
+    """Test AsyncATEventManager dispatches to coroutine and plain handlers."""
+    logging.debug("Starting test_async_event_manager()")
+    async def scenario():
+        aem = AsyncATEventManager()
+        seen = []
+        async def on_changed(event):
+            await asyncio.sleep(0)
+            seen.append(("async", event.event_name))
+        def on_view(event): seen.append(("sync", event.event_name))
+        async def failing(event): raise RuntimeError("handler failure")
+        aem.subscribe("changed", failing, ATModelEvent)
+        aem.subscribe("changed", on_changed, ATModelEvent)
+        aem.subscribe(None, on_view, ATViewEvent)
+        # Queued before start, and taken by priority
+        assert aem.publish(ATModelEvent("changed", {}))
+        assert aem.publish(ATViewEvent("clicked", {}))
+        await aem.start()
+        assert aem.running
+        # Published from another thread through the event loop
+        t = threading.Thread(target=aem.publish,
+                             args=(ATModelEvent("changed", {"seq": 2}),))
+        t.start(); t.join()
+        await asyncio.sleep(0.05)
+        await aem.stop()
+        assert not aem.running and aem.total_events() == 0
+        return seen
+    seen = asyncio.run(scenario())
+    assert seen == [("sync", "clicked"), ("async", "changed"),
+                    ("async", "changed")], f"unexpected dispatch: {seen}"
+    logging.debug("Completed test_async_event_manager()")
+#endregion test_async_event_manager()
+
+#region test_async_event_managers_share_a_loop()
+def test_async_event_managers_share_a_loop():
+    """Test many AsyncATEventManagers on one event loop, and a full queue."""
+    logging.debug("Starting test_async_event_managers_share_a_loop()")
+    async def scenario():
+        counts = [0] * 50
+        managers = [AsyncATEventManager() for _ in counts]
+        for i, aem in enumerate(managers):
+            def count(event, i=i): counts[i] += 1
+            aem.subscribe("changed", count, ATModelEvent)
+            await aem.start()
+        threads = threading.active_count()
+        for aem in managers:
+            for _ in range(10): aem.publish(ATModelEvent("changed", {}))
+        for aem in managers: await aem.stop()
+        assert threading.active_count() == threads, "a manager started a thread"
+        # A FileATModel publishes its changes to an AsyncATEventManager
+        atm = FileATModel("async_activity")
+        atm.event_manager = managers[0]
+        await managers[0].start()
+        changes = []
+        managers[0].subscribe(ATM_EVENT_CHANGED, changes.append, ATModelEvent)
+        ae = atm.add_activity(ActivityEntry(start="2025-03-22T09:00:00",
+                                            stop="2025-03-22T10:00:00"))
+        atm.remove_activity(ae.id)
+        await managers[0].stop()
+        assert [e.event_data["changes"][0]["kind"] for e in changes] == \
+            ["added", "removed"], "model changes not published"
+        full = AsyncATEventManager(queue_maxsize=1)
+        assert full.publish(ATEvent("a", {}))
+        assert not full.publish(ATEvent("b", {})), "full queue accepted"
+        # A full queue rejects events published from other threads, once
+        # started, and publishing after stop() queues for the next start()
+        await full.start()
+        results = []
+        t = threading.Thread(target=lambda: results.extend(
+            full.publish(ATEvent(n, {})) for n in ("c", "d")))
+        t.start(); t.join()
+        assert results == [False, False], "cross-thread publish to a full queue"
+        await full.stop()
+        assert full.publish(ATEvent("e", {})) and full.total_events() == 1
+        with pytest.raises(ValueError):
+            AsyncATEventManager(queue_maxsize=-1)
+        return counts
+    counts = asyncio.run(scenario())
+    assert counts == [10] * 50, f"events not all dispatched: {counts}"
+    # Published from other threads before start, and after the event loop
+    # of the last run closed, the events wait for the next start()
+    aem = AsyncATEventManager()
+    seen = []
+    aem.subscribe(None, lambda e: seen.append(e.event_name))
+    async def run_once(): 
+        await aem.start(); await asyncio.sleep(0.01); await aem.stop()
+    threads = [threading.Thread(target=aem.publish, args=(ATEvent(f"t{i}", {}),))
+               for i in range(8)]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    asyncio.run(run_once())
+    assert sorted(seen) == [f"t{i}" for i in range(8)], f"events lost: {seen}"
+    assert aem.publish(ATEvent("later", {})), "publish after stop() failed"
+    asyncio.run(run_once())
+    assert seen[-1] == "later", "event published after stop() not dispatched"
+    logging.debug("Completed test_async_event_managers_share_a_loop()")
+#endregion test_async_event_managers_share_a_loop()
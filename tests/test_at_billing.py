@@ -0,0 +1,83 @@
+#------------------------------------------------------------------------------+
+import csv, logging, pathlib, pytest
+from pytest import approx
+from model.ae import ActivityEntry
+from model.at_billing import round_minutes, iter_line_items, export_billing_csv
+from model.file_atmodel import FileATModel
+
+ATB_TEMPDATA_DIR = "tests/tempdata"
+
+def make_model(name: str = "alice") -> FileATModel:
+    """Return a model with activities over two months."""
+    def ae(start: str, stop: str, activity: str) -> ActivityEntry:
+        return ActivityEntry(start=start, stop=stop, activity=activity)
+    return FileATModel(name, activities=[
+        ae("2025-03-03T09:00:00", "2025-03-03T09:07:00", "acme-dev"),    # 7m
+        ae("2025-03-04T09:00:00", "2025-03-04T09:07:00", "acme-dev"),    # 7m
+        ae("2025-03-05T09:00:00", "2025-03-05T10:00:00", "acme-support"),
+        ae("2025-03-06T09:00:00", "2025-03-06T09:20:00", "globex"),      # 20m
+        ae("2025-04-01T09:00:00", "2025-04-01T09:01:00", "globex")])     # 1m
+
+#region test_round_minutes()
+def test_round_minutes():
+    """Test round_minutes() increments and rounding modes."""
+    logging.debug("Starting test_round_minutes()")
+    assert round_minutes(7) == 12 and round_minutes(6) == 6
+    assert round_minutes(7, 15) == 15 and round_minutes(7, 15, "down") == 0
+    assert round_minutes(7.5, 15, "nearest") == 15
+    assert round_minutes(7.4, 15, "nearest") == 0
+    assert round_minutes(0.1 * 3 * 60, 6) == 18, "float noise rounded up"
+    with pytest.raises(ValueError):
+        round_minutes(7, 0)
+    with pytest.raises(ValueError):
+        round_minutes(7, 6, "sideways")
+    logging.debug("Completed test_round_minutes()")
+#endregion test_round_minutes()
+
+#region test_iter_line_items()
+def test_iter_line_items():
+    """Test line items per period, activity or client, and rounding rules."""
+    logging.debug("Starting test_iter_line_items()")
+    atm = make_model()
+    items = list(iter_line_items(atm, rates=100.0))
+    assert [(i.period, i.activity, i.entries) for i in items] == [
+        ("2025-03", "acme-dev", 2), ("2025-03", "acme-support", 1),
+        ("2025-03", "globex", 1), ("2025-04", "globex", 1)]
+    assert items[0].billed_hours == approx(0.4), "per entry rounding failed"
+    assert items[0].hours == approx(14 / 60) and items[0].amount == 40.0
+    items = list(iter_line_items(atm, apply_to="item", increment=15))
+    assert items[0].billed_hours == 0.25, "per item rounding failed"
+    assert items[0].amount is None
+    clients = lambda activity: activity.split("-")[0]
+    items = list(iter_line_items(atm, start="2025-03-01", stop="2025-04-01",
+                                 group_by="client", clients=clients,
+                                 rates={"acme": 150.0}))
+    assert [(i.client, i.activity, i.entries, i.billed_hours, i.amount)
+            for i in items] == [("acme", None, 3, approx(1.4), 210.0),
+                                ("globex", None, 1, approx(0.4), None)]
+    items = list(iter_line_items(atm, period="week", increment=15))
+    assert [i.period for i in items] == ["2025-W10"] * 3 + ["2025-W14"]
+    with pytest.raises(ValueError):
+        list(iter_line_items(atm, period="year"))
+    with pytest.raises(TypeError):
+        list(iter_line_items(atm, clients="acme"))
+    logging.debug("Completed test_iter_line_items()")
+#endregion test_iter_line_items()
+
+#region test_export_billing_csv()
+def test_export_billing_csv():
+    """Test export_billing_csv() streams the line items of several users."""
+    logging.debug("Starting test_export_billing_csv()")
+    full_path = pathlib.Path(ATB_TEMPDATA_DIR) / "billing.csv"
+    full_path.parent.mkdir(parents=True, exist_ok=True)
+    count = export_billing_csv([make_model("alice"), make_model("bob")],
+                               full_path, start="2025-03-01",
+                               stop="2025-04-01", rates=90.0)
+    assert count == 6
+    with open(full_path, newline="") as file:
+        rows = list(csv.DictReader(file))
+    assert [row["user"] for row in rows] == ["alice"] * 3 + ["bob"] * 3
+    assert rows[1]["billed_hours"] == "1.0" and rows[1]["amount"] == "90.0"
+    full_path.unlink()
+    logging.debug("Completed test_export_billing_csv()")
+#endregion test_export_billing_csv()
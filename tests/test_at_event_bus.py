@@ -0,0 +1,149 @@
+#------------------------------------------------------------------------------+
+import logging, os, pathlib, socket, stat, threading, time, pytest
+from atconstants import *
+from at_utilities import at_event_bus
+from at_utilities.at_events import ATEvent, ATModelEvent, ATViewEvent
+from at_utilities.at_event_bus import ATBusEventManager, ATEventBroker, \
+    ATFrameReader, default_socket_path, encode_frame, start_broker_process
+
+ATEB_TEMPDATA_DIR = "tests/tempdata"
+
+#region test_frame_reader()
+def test_frame_reader():
+    """Test length prefixed frames split across and within reads."""
+    logging.debug("Starting test_frame_reader()")
+    frames = encode_frame({"op": "pub", "n": 1}) + encode_frame({"op": "sub"})
+    reader = ATFrameReader()
+    assert reader.feed(frames[:3]) == [], "partial header decoded"
+    bodies = reader.feed(frames[3:10]) + reader.feed(frames[10:])
+    assert bodies == [b'{"op":"pub","n":1}', b'{"op":"sub"}']
+    with pytest.raises(ValueError):
+        ATFrameReader().feed(b"\xff\xff\xff\xff")
+    logging.debug("Completed test_frame_reader()")
+#endregion test_frame_reader()
+
+#region test_event_bus()
+def test_event_bus():
+    """Test ATBusEventManagers exchange events by topic through a broker."""
+    logging.debug("Starting test_event_bus()")
+    path = pathlib.Path(ATEB_TEMPDATA_DIR) / "event_bus.sock"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    broker = ATEventBroker(path)
+    broker.start()
+    gui, daemon, importer = (ATBusEventManager(path) for _ in range(3))
+    got = {"gui": [], "daemon": [], "importer": []}
+    done = threading.Event(); latencies = []
+    def on_model(event):
+        got["daemon"].append(event)
+        if "sent" in event.event_data:
+            latencies.append(time.perf_counter() - event.event_data["sent"])
+        if len(got["daemon"]) == 201: done.set()
+    daemon.subscribe("activities_changed", on_model, ATModelEvent)
+    importer.subscribe(None, lambda e: got["importer"].append(e), ATViewEvent)
+    saved = threading.Event()
+    importer.subscribe("saved", lambda e: saved.set())  # of any event type
+    gui.subscribe(None, lambda e: got["gui"].append(e))
+    for em in (gui, daemon, importer):
+        em.start(); em.connect()
+    deadline = time.monotonic() + 5.0
+    while broker.clients < 3 and time.monotonic() < deadline: time.sleep(0.01)
+    time.sleep(0.05)  # let the subscriptions reach the broker
+    gui.publish(ATModelEvent("activities_changed", {"activityname": "a", "n": 1}))
+    gui.publish(ATModelEvent("saved", {}))
+    for _ in range(200):
+        gui.publish(ATModelEvent("activities_changed", {"sent": time.perf_counter()}))
+        time.sleep(0.0005)
+    assert done.wait(5.0), f"daemon got {len(got['daemon'])} of 201 events"
+    assert saved.wait(5.0), "event_name subscription did not cross the bus"
+    importer.publish(ATViewEvent("clicked", {"n": 2}))
+    deadline = time.monotonic() + 5.0
+    while len(got["gui"]) < 203 and time.monotonic() < deadline: time.sleep(0.01)
+    first = got["daemon"][0]
+    assert isinstance(first, ATModelEvent) and \
+        first.event_data == {"activityname": "a", "n": 1}
+    assert all(e.event_name == "activities_changed" for e in got["daemon"]), \
+        "daemon got an event of a topic it did not subscribe to"
+    assert [e.event_name for e in got["importer"]] == ["clicked"], \
+        "importer got its own or unsubscribed events"
+    assert len(got["gui"]) == 203, "gui missed local or remote events"
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2] * 1e6
+    logging.debug(f"event bus fan-out latency p50={p50:.0f}us " + \
+                  f"max={latencies[-1] * 1e6:.0f}us")
+    assert p50 < 50000, f"event bus latency too high: {p50:.0f}us"
+    for em in (gui, daemon, importer): em.stop(timeout=5.0)
+    broker.stop()
+    assert not path.exists(), "broker socket left behind"
+    logging.debug("Completed test_event_bus()")
+#endregion test_event_bus()
+
+#region test_event_broker_process()
+def test_event_broker_process():
+    """Test a broker in its own process connects two managers."""
+    logging.debug("Starting test_event_broker_process()")
+    path = pathlib.Path(ATEB_TEMPDATA_DIR) / "event_broker.sock"
+    process = start_broker_process(path)
+    try:
+        sender, receiver = ATBusEventManager(path), ATBusEventManager(path)
+        got = threading.Event()
+        receiver.subscribe("ping", lambda e: got.set(), ATEvent)
+        for em in (sender, receiver):
+            em.start(); em.connect()
+        time.sleep(0.05)
+        sender.publish(ATEvent("ping", {}))
+        assert got.wait(5.0), "event did not cross processes"
+        for em in (sender, receiver): em.stop(timeout=5.0)
+    finally:
+        process.terminate(); process.join(5.0)
+        path.unlink(missing_ok=True)
+    logging.debug("Completed test_event_broker_process()")
+#endregion test_event_broker_process()
+
+#region test_event_broker_socket()
+def test_event_broker_socket(monkeypatch):
+    """Test the broker socket is private to the user, other files at its
+    path are kept, and a client too far behind is disconnected."""
+    logging.debug("Starting test_event_broker_socket()")
+    tempdata = pathlib.Path(ATEB_TEMPDATA_DIR).resolve()
+    tempdata.mkdir(parents=True, exist_ok=True)
+    monkeypatch.setenv("XDG_RUNTIME_DIR", str(tempdata))
+    assert default_socket_path() == tempdata / ATEM_BUS_SOCKET_NAME
+    monkeypatch.delenv("XDG_RUNTIME_DIR")
+    path = default_socket_path()
+    assert stat.S_IMODE(path.parent.stat().st_mode) == 0o700, \
+        "socket directory open to other users"
+    # A file that is not a socket is never removed
+    path = tempdata / "event_broker_file.sock"
+    path.unlink(missing_ok=True)
+    path.write_text("not a socket")
+    with pytest.raises(FileExistsError):
+        ATEventBroker(path).start()
+    assert path.read_text() == "not a socket", "foreign file replaced"
+    path.unlink()
+    broker = ATEventBroker(path)
+    broker.start()
+    assert stat.S_IMODE(path.stat().st_mode) == 0o600, "socket not 0600"
+    with pytest.raises(FileExistsError):
+        ATEventBroker(path).start()
+    # A client that never reads is disconnected once too far behind
+    monkeypatch.setattr(at_event_bus, "ATEB_MAX_CLIENT_BUFFER", 4096)
+    slow = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    slow.connect(str(path))
+    slow.sendall(encode_frame({"op": "sub", "type": None, "name": None}))
+    publisher = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    publisher.connect(str(path))
+    deadline = time.monotonic() + 5.0
+    while broker.clients < 2 and time.monotonic() < deadline: time.sleep(0.01)
+    time.sleep(0.05)  # let the subscription reach the broker
+    frame = encode_frame({"op": "pub", "type": "ATEvent", "name": "bulk",
+                          "data": "x" * 1024})
+    deadline = time.monotonic() + 5.0
+    while broker.clients > 1 and time.monotonic() < deadline:
+        publisher.sendall(frame * 64)
+        time.sleep(0.001)
+    assert broker.clients == 1, "slow client not disconnected"
+    for sock in (slow, publisher): sock.close()
+    broker.stop()
+    assert not path.exists(), "broker socket left behind"
+    logging.debug("Completed test_event_broker_socket()")
+#endregion test_event_broker_socket()
@@ -1,4 +1,4 @@
-import pytest, threading
+import logging, pytest, threading, time
 from atconstants import *
 from at_utilities import at_events as atev
 from at_logging.at_logging import atlogging_setup
@@ -43,3 +43,403 @@ def test_at_event_manager():
     # with pytest.raises(TypeError) : atu.iso_date_string(None)
 #endregion
 
+
+#region test_event_manager_blocking_dispatch()
+def test_event_manager_blocking_dispatch():
+    """Test ATEventManager wakes on publish and stops without polling."""
+    logging.debug("Starting test_event_manager_blocking_dispatch()")
+    myEM = atev.ATEventManager()
+    r = atev.dispatch_latency(myEM, count=200)
+    logging.debug(f"dispatch latency (us): {r}")
+    assert r["count"] == 200 and myEM.total_events() == 0, \
+        "events were not all dispatched"
+    # The former loop could leave an event waiting for its 2 second poll
+    assert r["max"] < 500000, f"dispatch latency too high: {r}"
+    myEM.stop(timeout=5.0)
+    assert myEM.stopped() and not myEM.event_thread.is_alive(), \
+        "event thread did not exit when stopped"
+    logging.debug("Completed test_event_manager_blocking_dispatch()")
+#endregion test_event_manager_blocking_dispatch()
+
+#region test_event_worker_pools()
+def test_event_worker_pools():
+    """Test per event type worker pools keep order per key, run in parallel
+    and do not stall other event types."""
+    logging.debug("Starting test_event_worker_pools()")
+    myEM = atev.ATEventManager()
+    pool = myEM.set_workers(atev.ATModelEvent.__name__, 4)
+    assert pool.workers == 4 and pool.event_type == "ATModelEvent"
+    with pytest.raises(ValueError):
+        myEM.set_workers(atev.ATModelEvent.__name__, 2)
+    with pytest.raises(ValueError):
+        myEM.set_workers(atev.ATViewEvent.__name__, 0)
+    seen = {}; running = set(); overlaps = []; lock = threading.Lock()
+    parallel = threading.Barrier(4, timeout=2.0)  # one event of each store
+    release = threading.Event(); view_done = threading.Event()
+    def process_an_event(event):
+        if isinstance(event, atev.ATViewEvent):
+            view_done.set(); return
+        store, seq = event.event_data["activityname"], event.event_data["seq"]
+        with lock:
+            if store in running: overlaps.append((store, seq))
+            running.add(store)
+        try:
+            if seq == 0: parallel.wait()  # all four stores at once
+            assert release.wait(2.0)  # a slow handler, such as a model save
+            if (store, seq) == ("b", 1): raise RuntimeError("handler failure")
+            with lock: seen.setdefault(store, []).append(seq)
+        finally:
+            with lock: running.discard(store)
+    myEM.process_an_event = process_an_event
+    myEM.start()
+    for seq in range(5):
+        for store in ("a", "b", "c", "d"):
+            myEM.publish(atev.ATModelEvent("changed",
+                                    {"activityname": store, "seq": seq}))
+    myEM.publish(atev.ATViewEvent("clicked", {}))
+    assert view_done.wait(2.0), "slow model events stalled a view event"
+    assert not release.is_set() and not parallel.broken
+    release.set()
+    myEM.stop(timeout=5.0)
+    assert not parallel.broken, "workers did not run in parallel"
+    assert overlaps == [], f"events of a key processed at once: {overlaps}"
+    assert seen == {s: [0, 2, 3, 4] if s == "b" else [0, 1, 2, 3, 4]
+                    for s in "abcd"}, \
+        f"events of a key out of order, or lost after a failure: {seen}"
+    assert pool._active == {}, "keys left active"
+    # A worker publishing to its own full 'block' queue is not blocked
+    myEM = atev.ATEventManager()
+    myEM.add_event_queue(atev.ATModelEvent.__name__, 1, ATEM_POLICY_BLOCK)
+    myEM.set_workers(atev.ATModelEvent.__name__, 1)
+    results = []; done = threading.Event()
+    def republish(event):
+        if event.event_name == "first":
+            results.extend(myEM.publish(atev.ATModelEvent("again", {}))
+                           for _ in range(2))
+            done.set()
+    myEM.process_an_event = republish
+    myEM.start()
+    myEM.publish(atev.ATModelEvent("first", {}))
+    assert done.wait(2.0), "worker blocked publishing to its full queue"
+    assert results == [True, False], f"full queue did not reject: {results}"
+    myEM.stop(timeout=5.0)
+    logging.debug("Completed test_event_worker_pools()")
+#endregion test_event_worker_pools()
+
+#region test_event_worker_pool_keys()
+def test_event_worker_pool_keys():
+    """Test a slow key function keeps the order of a key, and a failing or
+    unhashable key does not stop the workers."""
+    logging.debug("Starting test_event_worker_pool_keys()")
+    seen = []; lock = threading.Lock()
+    def slow_key(event):
+        # The worker taking event 2 is held up after taking it
+        if event.event_data["seq"] == 2: time.sleep(0.1)
+        return "store"
+    def record(event):
+        time.sleep(0.01)
+        with lock: seen.append(event.event_data["seq"])
+    pool = atev.ATEventWorkerPool("ATModelEvent", atev.ATEventQueue(), record,
+                                  workers=3, key=slow_key)
+    pool.start()
+    for seq in (1, 2, 3):
+        pool.event_queue.put(atev.ATModelEvent("changed", {"seq": seq}))
+    pool.stop(timeout=5.0)
+    assert seen == [1, 2, 3], f"events of a key out of order: {seen}"
+    # The default key of a list activityname is unhashable, a key function
+    # may raise, and the event_name is used instead
+    seen.clear()
+    def failing_key(event):
+        if event.event_data["seq"] == 2: raise RuntimeError("key failure")
+        return atev.ATEventWorkerPool.event_key(event)
+    pool = atev.ATEventWorkerPool("ATModelEvent", atev.ATEventQueue(), record,
+                                  workers=1, key=failing_key)
+    pool.start()
+    pool.event_queue.put(atev.ATModelEvent("changed", 
+                                           {"seq": 1, "activityname": ["a"]}))
+    for seq in (2, 3):
+        pool.event_queue.put(atev.ATModelEvent("changed", {"seq": seq}))
+    pool.stop(timeout=5.0)
+    assert seen == [1, 2, 3], f"a failing key stopped the worker: {seen}"
+    assert not any(t.is_alive() for t in pool._threads), "worker not stopped"
+    logging.debug("Completed test_event_worker_pool_keys()")
+#endregion test_event_worker_pool_keys()
+
+#region test_event_subscriptions()
+def test_event_subscriptions():
+    """Test subscribe(), unsubscribe() and isolated handler exceptions."""
+    logging.debug("Starting test_event_subscriptions()")
+    myEM = atev.ATEventManager()
+    calls = []
+    def on_changed(event): calls.append(("changed", event.event_name))
+    def on_model(event): calls.append(("model", event.event_name))
+    def on_all(event): calls.append(("all", event.event_name))
+    def failing(event): raise RuntimeError("handler failure")
+    myEM.subscribe("changed", failing, atev.ATModelEvent)
+    myEM.subscribe("changed", on_changed, atev.ATModelEvent)
+    myEM.subscribe(None, on_model, "ATModelEvent")
+    myEM.subscribe(None, on_all)
+    with pytest.raises(TypeError):
+        myEM.subscribe("changed", "not callable")
+    with pytest.raises(TypeError):
+        myEM.subscribe("changed", on_all, 42)
+    n = myEM.process_an_event(atev.ATModelEvent("changed", {}))
+    assert n == 4, f"expected 4 handlers, called {n}"
+    assert calls == [("changed", "changed"), ("model", "changed"),
+                     ("all", "changed")], "a failing handler stopped dispatch"
+    calls.clear()
+    myEM.process_an_event(atev.ATViewEvent("changed", {}))
+    assert calls == [("all", "changed")], "dispatched to the wrong type"
+    assert myEM.unsubscribe("changed", failing, atev.ATModelEvent)
+    assert not myEM.unsubscribe("changed", failing, atev.ATModelEvent)
+    assert myEM.process_an_event(atev.ATModelEvent("changed", {})) == 3
+    # Handlers are looked up in a cache, one dict lookup for any number of
+    # unrelated subscriptions, replaced when the subscriptions change
+    event = atev.ATViewEvent("clicked", {})
+    myEM.unsubscribe(None, on_all)
+    def on_clicked(event): pass
+    myEM.subscribe("clicked", on_clicked, atev.ATViewEvent)
+    handlers = myEM.handlers(event)
+    assert handlers == (on_clicked,) and myEM.handlers(event) is handlers, \
+        "handlers not cached"
+    for i in range(5000):
+        myEM.subscribe(f"name{i}", on_changed, atev.ATViewEvent)
+    assert myEM.handlers(event) == (on_clicked,)
+    assert myEM.handlers(event) is myEM.handlers(event)
+    assert list(myEM._dispatch) == [("ATViewEvent", "clicked")], \
+        "handlers computed for topics not dispatched"
+    myEM.subscribe(None, on_model, atev.ATViewEvent)
+    assert myEM.handlers(event) == (on_clicked, on_model), "cache not replaced"
+    # A subscription by event_name only gets that event_name of any type
+    myEM.subscribe("clicked", on_all)
+    assert myEM.handlers(event) == (on_clicked, on_model, on_all), \
+        "event_name subscription of all event types not found"
+    assert on_all in myEM.handlers(atev.ATModelEvent("clicked", {}))
+    assert on_all not in myEM.handlers(atev.ATViewEvent("other", {}))
+    logging.debug("Completed test_event_subscriptions()")
+#endregion test_event_subscriptions()
+
+#region test_event_coalescing()
+def test_event_coalescing():
+    """Test coalesced topics deliver one batch or merged event per window."""
+    logging.debug("Starting test_event_coalescing()")
+    myEM = atev.ATEventManager()
+    batches = []; latest = []; other = []
+    got_batch = threading.Event(); got_latest = threading.Event()
+    myEM.coalesce("changed", atev.ATModelEvent, window=0.05)
+    myEM.coalesce("saved", "ATModelEvent", merge=atev.ATEventCoalescer.latest)
+    with pytest.raises(ValueError):
+        myEM.coalesce("changed", atev.ATModelEvent)
+    with pytest.raises(ValueError):
+        myEM.coalesce("other", atev.ATModelEvent, window=-1)
+    def on_changed(event):
+        batches.append(event.event_data[ATEM_BATCH_FIELD]); got_batch.set()
+    def on_saved(event):
+        latest.append(event.event_data["seq"]); got_latest.set()
+    myEM.subscribe("changed", on_changed, atev.ATModelEvent)
+    myEM.subscribe("saved", on_saved, atev.ATModelEvent)
+    myEM.subscribe("other", lambda e: other.append(e), atev.ATModelEvent)
+    for seq in range(10):
+        myEM.publish(atev.ATModelEvent("changed", {"seq": seq}))
+        myEM.publish(atev.ATModelEvent("saved", {"seq": seq}))
+    myEM.publish(atev.ATModelEvent("other", {}))
+    myEM.start()
+    assert got_batch.wait(2.0) and got_latest.wait(2.0), "events not delivered"
+    myEM.stop(timeout=5.0)
+    assert len(batches) == 1 and \
+        [e.event_data["seq"] for e in batches[0]] == list(range(10)), \
+        f"expected one batch of 10 events: {batches}"
+    assert latest == [9], f"expected only the latest event: {latest}"
+    assert len(other) == 1, "a topic not coalesced was held back"
+    # Events held back when stopped are processed, not lost
+    myEM = atev.ATEventManager()
+    held = []
+    myEM.subscribe("changed", lambda e: held.append(e), atev.ATModelEvent)
+    myEM.coalesce("changed", atev.ATModelEvent, window=60.0)
+    myEM.start()
+    myEM.publish(atev.ATModelEvent("changed", {"seq": 0}))
+    assert myEM.total_events() == 0, "coalesced event queued before window"
+    myEM.stop(timeout=5.0)
+    assert len(held) == 1, "coalesced event lost when stopped"
+    # A batch is queued once full, and latest() holds only the last event
+    myEM = atev.ATEventManager()
+    batched = myEM.coalesce("changed", atev.ATModelEvent, window=60.0,
+                            max_batch=3)
+    kept = myEM.coalesce("saved", atev.ATModelEvent, window=60.0,
+                         merge=atev.ATEventCoalescer.latest)
+    with pytest.raises(ValueError):
+        myEM.coalesce("other", atev.ATModelEvent, max_batch=0)
+    for seq in range(7):
+        myEM.publish(atev.ATModelEvent("changed", {"seq": seq}))
+        myEM.publish(atev.ATModelEvent("saved", {"seq": seq}))
+    assert myEM.total_events() == 2 and batched.pending == 1, \
+        "full batches not queued"
+    assert kept.pending == 1, "latest() held more than the last event"
+    assert kept.take().event_data == {"seq": 6}
+    rate = atev.dispatch_throughput(atev.ATEventManager(), count=1000)
+    assert rate > 0
+    logging.debug("Completed test_event_coalescing()")
+#endregion test_event_coalescing()
+
+#region test_event_queue_priority_and_bounds()
+def test_event_queue_priority_and_bounds():
+    """Test ATEventQueue priority lanes and full queue policies."""
+    logging.debug("Starting test_event_queue_priority_and_bounds()")
+    import queue
+    eq = atev.ATEventQueue(queue_name="ATModelEvent")
+    assert eq.queue_name == "ATModelEvent", "queue_name not returned"
+    eq.put(atev.ATModelEvent("save", {}, ATEM_PRIORITY_LOW))
+    eq.put(atev.ATModelEvent("changed", {}))
+    eq.put(atev.ATViewEvent("clicked", {}))
+    assert eq.head_priority() == ATEM_PRIORITY_HIGH
+    assert [eq.get().event_name for _ in range(3)] == \
+        ["clicked", "changed", "save"], "events not taken by priority"
+    assert eq.empty() and eq.head_priority() is None
+    with pytest.raises(ValueError):
+        atev.ATEvent("bad", {}, priority=7)
+    with pytest.raises(ValueError):
+        atev.ATEventQueue(policy="spill")
+    # drop_oldest drops the oldest event of the lowest priority
+    eq = atev.ATEventQueue(3, ATEM_POLICY_DROP_OLDEST)
+    for name, p in (("a", 1), ("b", 2), ("c", 2), ("d", 0)):
+        eq.put(atev.ATEvent(name, {}, p))
+    assert eq.qsize() == 3 and eq.dropped == 1
+    assert [eq.get().event_name for _ in range(3)] == ["d", "a", "c"]
+    # but never an event of higher priority than the new one
+    dropped = []
+    eq = atev.ATEventQueue(1, ATEM_POLICY_DROP_OLDEST)
+    eq.on_drop = dropped.append
+    eq.put(atev.ATViewEvent("clicked", {}))
+    eq.put(atev.ATEvent("bg", {}, ATEM_PRIORITY_LOW))
+    assert eq.qsize() == 1 and eq.dropped == 1
+    assert [e.event_name for e in dropped] == ["bg"], "new event not dropped"
+    assert eq.get().event_name == "clicked", "higher priority event dropped"
+    # reject refuses the new event
+    eq = atev.ATEventQueue(1, ATEM_POLICY_REJECT)
+    eq.put(atev.ATEvent("a", {}))
+    with pytest.raises(queue.Full):
+        eq.put(atev.ATEvent("b", {}))
+    assert eq.rejected == 1 and eq.qsize() == 1
+    # block waits for space, or raises queue.Full when it may not wait
+    eq = atev.ATEventQueue(1)
+    eq.put(atev.ATEvent("a", {}))
+    with pytest.raises(queue.Full):
+        eq.put(atev.ATEvent("b", {}), timeout=0.01)
+    # ATEventManager publishes with the queue policies and priorities
+    myEM = atev.ATEventManager(queue_maxsize=2, queue_policy=ATEM_POLICY_REJECT)
+    assert myEM.publish(atev.ATModelEvent("m1", {}))
+    assert myEM.publish(atev.ATModelEvent("m2", {}))
+    assert not myEM.publish(atev.ATModelEvent("m3", {})), "full queue accepted"
+    assert myEM.publish(atev.ATEvent("background", {}, ATEM_PRIORITY_LOW))
+    assert myEM.publish(atev.ATViewEvent("clicked", {}))
+    order = []; done = threading.Event()
+    def record(event):
+        order.append(event.event_name)
+        if len(order) == 4: done.set()
+    myEM.subscribe(None, record)
+    myEM.start()
+    assert done.wait(2.0), "events not processed"
+    myEM.stop(timeout=5.0)
+    assert order == ["clicked", "m1", "m2", "background"], \
+        f"events not processed in priority order: {order}"
+    logging.debug("Completed test_event_queue_priority_and_bounds()")
+#endregion test_event_queue_priority_and_bounds()
+
+#region test_event_metrics()
+def test_event_metrics():
+    """Test ATEventManager metrics counts, timings and snapshots."""
+    logging.debug("Starting test_event_metrics()")
+    from at_utilities.at_event_metrics import ATLatencyHistogram
+    h = ATLatencyHistogram()
+    assert h.quantile(0.5) is None and h.mean is None
+    for seconds in (0.000001, 0.00001, 0.0001, 0.001): h.record(seconds)
+    assert h.count == 4 and h.max == pytest.approx(1000.0)
+    assert 10.0 <= h.quantile(0.5) <= 16.0, "median not in its bucket"
+    myEM = atev.ATEventManager(queue_maxsize=1, queue_policy=ATEM_POLICY_REJECT)
+    assert myEM.metrics_snapshot() is None, "metrics enabled by default"
+    snapshots = []; done = threading.Event()
+    metrics = myEM.enable_metrics(snapshot_interval=0.05,
+                                  on_snapshot=snapshots.append)
+    with pytest.raises(ValueError):
+        myEM.enable_metrics(snapshot_interval=0)
+    def failing(event): raise RuntimeError("handler failure")
+    myEM.subscribe("changed", failing, atev.ATModelEvent)
+    myEM.subscribe("changed", lambda e: done.set(), atev.ATModelEvent)
+    assert myEM.publish(atev.ATModelEvent("changed", {}))
+    assert not myEM.publish(atev.ATModelEvent("changed", {}))
+    myEM.start()
+    assert done.wait(2.0), "event not dispatched"
+    time.sleep(0.15)
+    myEM.stop(timeout=5.0)
+    snap = myEM.metrics_snapshot()
+    assert snap["published"] == {"ATModelEvent": 1}
+    assert snap["dispatched"] == {"ATModelEvent": 1}
+    assert snap["queues"]["ATModelEvent"] == \
+        {"depth": 0, "max_depth": 1, "dropped": 0, "rejected": 1}
+    assert list(snap["failed"].values()) == [1], "failed handler not counted"
+    assert snap["dispatch_latency_us"]["ATModelEvent"]["count"] == 1
+    assert len(snap["handler_time_us"]) == 2
+    assert len(snapshots) >= 1, "no periodic snapshot taken"
+    myEM.disable_metrics()
+    assert myEM.metrics is None and myEM.metrics_snapshot() is None
+    logging.debug("Completed test_event_metrics()")
+#endregion test_event_metrics()
+
+#region test_event_journal()
+def test_event_journal():
+    """Test ATEventJournal and the replay of pending events after a crash."""
+    logging.debug("Starting test_event_journal()")
+    import pathlib
+    from at_utilities.at_event_journal import ATEventJournal
+    path = pathlib.Path("tests/tempdata/events.journal.jsonl")
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.unlink(missing_ok=True)
+    journal = ATEventJournal(path, compact_every=2)
+    assert journal.open() == [], "new journal has records"
+    seqs = [journal.append("ATModelEvent", "changed", 1, {"n": n}) for n in range(4)]
+    assert seqs == [0, 1, 2, 3]
+    assert journal.append("ATEvent", "bad", 1, {"obj": object()}) is None
+    journal.ack(0); journal.ack(2)  # compacts to the 2 pending events
+    assert len(path.read_text().splitlines()) == 2, "journal not compacted"
+    journal.close()
+    with open(path, "a") as file: file.write('{"seq": 4, "ty')  # torn write
+    journal = ATEventJournal(path)
+    assert [r["data"]["n"] for r in journal.open()] == [1, 3]
+    journal.ack(1); journal.ack(3)
+    assert path.stat().st_size == 0, "journal not emptied when all acked"
+    journal.close()
+    with pytest.raises(ValueError):
+        ATEventJournal(path, fsync_batch=0)
+    # Events published but not processed before a crash are replayed
+    myEM = atev.ATEventManager()
+    assert myEM.enable_journal(path) == 0
+    myEM.publish(atev.ATModelEvent("changed", {"activityname": "a", "n": 1}))
+    myEM.publish(atev.ATViewEvent("clicked", {"n": 2}))
+    myEM.journal.close()  # crash: the manager never started
+    seen = []; done = threading.Event()
+    def record(event):
+        seen.append((type(event).__name__, event.event_name, event.event_data))
+        if len(seen) == 3: done.set()
+    myEM = atev.ATEventManager()
+    myEM.subscribe(None, record)
+    assert myEM.enable_journal(path) == 2, "pending events not replayed"
+    myEM.publish(atev.ATEvent("new", {"n": 3}))
+    journal = myEM.journal
+    myEM.start()
+    assert done.wait(2.0), "replayed events not processed"
+    myEM.stop(timeout=5.0)
+    assert sorted(seen, key=lambda e: e[2]["n"]) == [
+        ("ATModelEvent", "changed", {"activityname": "a", "n": 1}),
+        ("ATViewEvent", "clicked", {"n": 2}), ("ATEvent", "new", {"n": 3})]
+    assert journal.pending == 0 and path.stat().st_size == 0, \
+        "processed events left in the journal"
+    # Publishing after stop() no longer journals, and a closed journal
+    # ignores appends, acks and syncs
+    assert myEM.journal is None, "journal kept after stop()"
+    myEM.publish(atev.ATEvent("late", {"n": 4}))
+    assert journal.append("ATEvent", "late", 1, {"n": 4}) is None
+    journal.ack(0); journal.sync()
+    assert path.stat().st_size == 0, "closed journal written"
+    path.unlink()
+    logging.debug("Completed test_event_journal()")
+#endregion test_event_journal()
@@ -0,0 +1,75 @@
+#------------------------------------------------------------------------------+
+import csv, pathlib, logging, pytest
+from model.ae import ActivityEntry
+from model.file_atmodel import FileATModel
+from model import at_export as atx
+
+ATX_TEMPDATA_DIR = "tests/tempdata"
+
+def make_atmodel() -> FileATModel:
+    """Return a FileATModel with four activities for export tests."""
+    atm = FileATModel("export_activity")
+    atm.add_activities([
+        ActivityEntry(start="2025-03-22T14:00:00", stop="2025-03-22T14:30:00",
+                      activity="coding", notes="Notes, with a comma"),
+        ActivityEntry(start="2025-03-22T15:00:00", stop="2025-03-22T16:00:00",
+                      activity="meeting"),
+        ActivityEntry(start="2025-03-23T09:00:00", stop="2025-03-23T10:30:00",
+                      activity="coding"),
+        ActivityEntry(start="2025-03-24T09:00:00", stop="2025-03-24T09:15:00",
+                      activity="email")])
+    return atm
+
+#region test_export_csv()
+def test_export_csv():
+    """Test the export_csv() and export_file() functions."""
+    logging.debug("Starting test_export_csv()")
+    atm = make_atmodel()
+    full_path = pathlib.Path(ATX_TEMPDATA_DIR) / "test_export.csv"
+    full_path.parent.mkdir(parents=True, exist_ok=True)
+    assert atx.export_csv(atm, full_path) == 4, "export_csv() row count incorrect"
+    with open(full_path, newline="") as file:
+        rows = list(csv.DictReader(file))
+    assert [r["activity"] for r in rows] == ["coding", "meeting", "coding", "email"]
+    assert rows[0]["notes"] == "Notes, with a comma"
+    assert float(rows[2]["duration"]) == 1.5
+    # Time range and activity filters
+    assert atx.export_file(atm, str(full_path), start="2025-03-22T14:30:00",
+                           stop="2025-03-24T00:00:00") == 2
+    assert atx.export_csv(atm, full_path, activity="coding") == 2
+    with pytest.raises(TypeError):
+        atx.export_csv(atm, None)
+    with pytest.raises(TypeError):
+        atx.export_csv("not a model", full_path)
+    with pytest.raises(ValueError):
+        atx.export_file(atm, pathlib.Path(ATX_TEMPDATA_DIR) / "test_export.txt")
+    full_path.unlink()
+    logging.debug("Completed test_export_csv()")
+#endregion test_export_csv()
+
+#region test_export_columnar()
+def test_export_columnar():
+    """Test the export_columnar() function, when pyarrow is installed."""
+    pa = pytest.importorskip("pyarrow")
+    import pyarrow.ipc, pyarrow.parquet
+    logging.debug("Starting test_export_columnar()")
+    atm = make_atmodel()
+    folder_path = pathlib.Path(ATX_TEMPDATA_DIR)
+    folder_path.mkdir(parents=True, exist_ok=True)
+    parquet_path = folder_path / "test_export.parquet"
+    assert atx.export_columnar(atm, parquet_path, batch_size=3) == 4
+    table = pyarrow.parquet.read_table(parquet_path)
+    assert table.num_rows == 4
+    assert table.column("duration").to_pylist() == [0.5, 1.0, 1.5, 0.25]
+    arrow_path = folder_path / "test_export.arrow"
+    assert atx.export_file(atm, arrow_path, activity=["coding", "email"]) == 3
+    with pa.OSFile(str(arrow_path), "rb") as source:
+        table = pyarrow.ipc.open_file(source).read_all()
+    assert table.column("activity").to_pylist() == ["coding", "coding", "email"]
+    with pytest.raises(ValueError):
+        atx.export_columnar(atm, arrow_path, file_format="xlsx")
+    with pytest.raises(ValueError):
+        atx.export_columnar(atm, arrow_path, batch_size=0)
+    parquet_path.unlink(); arrow_path.unlink()
+    logging.debug("Completed test_export_columnar()")
+#endregion test_export_columnar()
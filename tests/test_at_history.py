@@ -0,0 +1,104 @@
+#------------------------------------------------------------------------------+
+import logging, pytest
+from model.ae import ActivityEntry
+from model.at_history import ATHistory
+from model.file_atmodel import FileATModel
+
+def make_entry(hour: int, activity: str) -> ActivityEntry:
+    return ActivityEntry(start=f"2025-03-22T{hour:02d}:00:00",
+                         stop=f"2025-03-22T{hour:02d}:30:00", activity=activity)
+
+def model_state(atm: FileATModel) -> list:
+    """Return the (id, start, activity) of each activity, in order."""
+    return [(ae.id, ae.start, ae.activity) for ae in atm.activities]
+
+#region test_history_steps()
+def test_history_steps():
+    """Test ATHistory records steps, clears redo and drops old steps."""
+    logging.debug("Starting test_history_steps()")
+    history = ATHistory(max_steps=2)
+    assert not history.can_undo and history.pop_undo() is None
+    atm = FileATModel("history_activity", activities=[make_entry(8, "a")])
+    history.record([]); history.record([None])
+    assert not history.can_undo, "empty steps should not be recorded"
+    with history.replaying():
+        history.record([atm.update_activity(atm.activities[0].id, activity="b")])
+    assert not history.can_undo, "steps recorded while replaying"
+    for x in ("c", "d", "e"):
+        history.record([atm.update_activity(atm.activities[0].id, activity=x)])
+    assert history.pop_undo()[0].after["activity"] == "e"
+    assert history.pop_undo()[0].after["activity"] == "d"
+    assert history.pop_undo() is None, "max_steps did not drop the oldest step"
+    with pytest.raises(ValueError):
+        ATHistory(max_steps=0)
+    logging.debug("Completed test_history_steps()")
+#endregion test_history_steps()
+
+#region test_atmodel_undo_redo()
+def test_atmodel_undo_redo():
+    """Test FileATModel undo() and redo() of add, update and remove."""
+    logging.debug("Starting test_atmodel_undo_redo()")
+    atm = FileATModel("undo_activity")
+    assert atm.undo() is None and atm.redo() is None
+    states = [model_state(atm)]
+    atm.add_activity(make_entry(9, "coding")); states.append(model_state(atm))
+    atm.add_activities([make_entry(10, "email"), make_entry(8, "support")])
+    states.append(model_state(atm))
+    entry_id = atm.activities[1].id
+    atm.update_activity(entry_id, start="2025-03-22T11:00:00",
+                        stop="2025-03-22T12:00:00", activity="review")
+    states.append(model_state(atm))
+    atm.remove_activity(atm.activities[0].id); states.append(model_state(atm))
+    for state in reversed(states[:-1]):
+        assert atm.undo() is not None
+        assert model_state(atm) == state, "undo() did not restore the state"
+    assert atm.undo() is None
+    assert atm.summary.total == 0 and atm.search_activities("coding") == []
+    for state in states[1:]:
+        assert atm.redo() is not None
+        assert model_state(atm) == state, "redo() did not restore the state"
+    assert atm.redo() is None
+    assert atm.summary.activities == {"email": 0.5, "review": 1.0}
+    assert atm.get_activity(entry_id).activity == "review"
+    # A new change after an undo clears the redo steps
+    atm.undo()
+    atm.add_activity(make_entry(14, "meeting"))
+    assert not atm.history.can_redo and atm.redo() is None
+    # Replacing the activities List clears the history
+    atm.activities = [make_entry(15, "coding")]
+    assert not atm.history.can_undo
+    logging.debug("Completed test_atmodel_undo_redo()")
+#endregion test_atmodel_undo_redo()
+
+#region test_atmodel_undo_failure()
+def test_atmodel_undo_failure(monkeypatch):
+    """Test a failed undo() or redo() rolls back and keeps its step."""
+    logging.debug("Starting test_atmodel_undo_failure()")
+    atm = FileATModel("undo_failure_activity")
+    atm.add_activities([make_entry(9, "coding"), make_entry(10, "email")])
+    before = model_state(atm)
+    remove_activity = atm.remove_activity
+    def failing_remove(entry_id):
+        if len(atm.activities) == 1: raise RuntimeError("remove failed")
+        return remove_activity(entry_id)
+    monkeypatch.setattr(atm, "remove_activity", failing_remove)
+    with pytest.raises(RuntimeError):
+        atm.undo()
+    assert model_state(atm) == before, "failed undo() not rolled back"
+    assert atm.history.can_undo and not atm.history.can_redo, \
+        "failed undo() lost its step"
+    monkeypatch.undo()
+    assert atm.undo() is not None and atm.activities == []
+    add_activity = atm.add_activity
+    def failing_add(ae, allow_overlap=True):
+        if len(atm.activities) == 1: raise RuntimeError("add failed")
+        return add_activity(ae, allow_overlap)
+    monkeypatch.setattr(atm, "add_activity", failing_add)
+    with pytest.raises(RuntimeError):
+        atm.redo()
+    assert atm.activities == [] and atm.history.can_redo, \
+        "failed redo() not rolled back, or lost its step"
+    monkeypatch.undo()
+    assert atm.redo() is not None and model_state(atm) == before
+    logging.debug("Completed test_atmodel_undo_failure()")
+#endregion test_atmodel_undo_failure()
@@ -0,0 +1,122 @@
+#------------------------------------------------------------------------------+
+import getpass, pathlib, logging, pytest
+import at_utilities.at_utils as atu
+from model.ae import ActivityEntry
+from model.file_atmodel import FileATModel
+from model import at_import as ati
+
+ATI_TESTDATA_DIR = "tests/testdata"
+ATI_TESTDATA_CSV = "test_activities.csv"
+ATI_TESTDATA_ICS = "test_activities.ics"
+
+#region test_add_activities()
+def test_add_activities():
+    """Test the FileATModel.add_activities() bulk method."""
+    logging.debug("Starting test_add_activities()")
+    atm = FileATModel("bulk_activity", modified_by="someone_else",
+                      last_modified_date="2025-03-22T14:42:49.301397")
+    aes = [ActivityEntry(start="2025-03-22T14:42:49", activity=f"ae{i}")
+           for i in range(5)]
+    assert atm.add_activities(aes) is aes, \
+        "add_activities() did not return the added batch"
+    assert len(atm.activities) == 5, \
+        f"add_activities() added {len(atm.activities)} entries, expected 5"
+    assert atm.modified_by == getpass.getuser(), \
+        "add_activities() did not update modified_by"
+    assert atm.last_modified_date != "2025-03-22T14:42:49.301397", \
+        "add_activities() did not update last_modified_date"
+    # An empty batch changes nothing
+    lmd = atm.last_modified_date
+    assert atm.add_activities([]) == []
+    assert atm.last_modified_date == lmd, \
+        "add_activities([]) should not update last_modified_date"
+    # The whole batch is rejected if any entry is invalid
+    with pytest.raises(ValueError):
+        atm.add_activities([ActivityEntry(), "not an ActivityEntry"])
+    with pytest.raises(TypeError):
+        atm.add_activities("not a list")
+    assert len(atm.activities) == 5, "invalid batch was partially added"
+    # A batch added with record False is not an undo step
+    atm.history.clear()
+    atm.add_activities([ActivityEntry(start="2025-03-23T14:42:49")],
+                       record=False)
+    assert len(atm.activities) == 6 and not atm.history.can_undo
+    assert atm.undo() is None
+    logging.debug("Completed test_add_activities()")
+#endregion test_add_activities()
+
+#region test_import_csv()
+def test_import_csv():
+    """Test importing a CSV file with import_csv() and import_file()."""
+    logging.debug("Starting test_import_csv()")
+    full_path = pathlib.Path(ATI_TESTDATA_DIR) / ATI_TESTDATA_CSV
+    # The last row has an invalid start timestamp
+    atm = FileATModel("csv_activity")
+    with pytest.raises(ValueError):
+        ati.import_csv(atm, full_path)
+    atm = FileATModel("csv_activity")
+    assert ati.import_csv(atm, full_path, batch_size=2, skip_invalid=True) == 3, \
+        "import_csv() did not import the 3 valid rows"
+    assert not atm.history.can_undo, "imported batches recorded as undo steps"
+    ae1, ae2, ae3 = atm.activities
+    assert ae1.notes == "Notes for ae1 activity, with a comma"
+    assert ae1.duration == 0.5, f"ae1 duration incorrect: {ae1.duration}"
+    assert ae2.duration == 1.5, \
+        f"stop computed from duration column is incorrect: {ae2.stop}"
+    assert ae3.activity == "ae3 activity"
+    atm = FileATModel("csv_activity")
+    assert ati.import_file(atm, str(full_path), skip_invalid=True) == 3
+    with pytest.raises(ValueError):
+        ati.import_csv(atm, full_path, batch_size=0)
+    logging.debug("Completed test_import_csv()")
+#endregion test_import_csv()
+
+#region test_import_ics()
+def test_import_ics():
+    """Test importing an iCalendar file with import_ics() and import_file()."""
+    logging.debug("Starting test_import_ics()")
+    full_path = pathlib.Path(ATI_TESTDATA_DIR) / ATI_TESTDATA_ICS
+    atm = FileATModel("ics_activity")
+    with pytest.raises(ValueError):
+        ati.import_ics(atm, full_path)
+    # The batches before an invalid record are already imported
+    atm = FileATModel("ics_activity")
+    with pytest.raises(ValueError) as e:
+        ati.import_ics(atm, full_path, batch_size=1)
+    assert len(atm.activities) == 2 and \
+        "2 activities of earlier batches were imported into 'ics_activity'" \
+        in e.value.__notes__, "earlier batches not noted as imported"
+    atm = FileATModel("ics_activity")
+    assert ati.import_file(atm, full_path, skip_invalid=True) == 2, \
+        "import_file() did not import the 2 valid VEVENTs"
+    ae1, ae2 = atm.activities
+    assert ae1.start == "2025-03-22T21:57:44"
+    assert ae1.stop == "2025-03-22T22:27:44"
+    assert ae1.activity == "ae1 activity"
+    assert ae1.notes == "Notes for ae1 activity, folded across two lines", \
+        f"DESCRIPTION was not unfolded and unescaped: '{ae1.notes}'"
+    assert ae1.duration == 0.5, "a VALARM DURATION replaced the VEVENT's"
+    assert ae2.duration == 1.5, f"DURATION not applied: {ae2.duration}"
+    assert ae2.start == atu.ical_date_to_iso("20250323T032844Z"), \
+        f"DTSTART TZID not converted to local time: {ae2.start}"
+    with pytest.raises(ValueError):
+        atu.ical_date_to_iso("20250323T090000", "Nowhere/Unknown")
+    assert ae2.notes == "unset"
+    assert ati.duration_seconds("P1DT1S") == 86401.0
+    assert ati.duration_seconds("0.25") == 900.0
+    logging.debug("Completed test_import_ics()")
+#endregion test_import_ics()
+
+#region test_import_invalid_input()
+def test_import_invalid_input():
+    """Test the importers with invalid input values."""
+    atm = FileATModel("bad_activity")
+    with pytest.raises(TypeError):
+        ati.import_csv(atm, None)
+    with pytest.raises(FileNotFoundError):
+        ati.import_csv(atm, "tests/testdata/no_such_file.csv")
+    with pytest.raises(ValueError):
+        ati.import_file(atm, pathlib.Path(ATI_TESTDATA_DIR) / "test_activity.json")
+    with pytest.raises(TypeError):
+        ati.import_records("not a model", [])
+#endregion test_import_invalid_input()
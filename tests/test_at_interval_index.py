@@ -0,0 +1,92 @@
+#------------------------------------------------------------------------------+
+import itertools, logging, random, pytest
+import at_utilities.at_utils as atu
+from model.ae import ActivityEntry
+from model.at_interval_index import ATIntervalIndex
+from model.file_atmodel import FileATModel
+
+def random_activities(count: int, seed: int = 42) -> list:
+    """Return count random ActivityEntry objects sorted by start time."""
+    rnd = random.Random(seed)
+    aes = []
+    for i in range(count):
+        start = atu.increase_time("2025-03-22T08:00:00", minutes=rnd.randrange(0, 600))
+        stop = atu.increase_time(start, minutes=rnd.randrange(0, 90))
+        aes.append(ActivityEntry(start=start, stop=stop, activity=f"ae{i}"))
+    aes.sort(key=lambda ae: atu.iso_date_key(ae.start))
+    return aes
+
+def brute_overlapping(aes: list, start: float, stop: float) -> list:
+    """Return the brute force O(n) overlap result for comparison."""
+    return [ae for ae in aes if atu.iso_date_key(ae.start) < stop and
+            atu.iso_date_key(ae.stop) > start]
+
+#region test_interval_index_overlapping()
+def test_interval_index_overlapping():
+    """Test ATIntervalIndex overlap queries against a brute force scan."""
+    logging.debug("Starting test_interval_index_overlapping()")
+    aes = random_activities(300)
+    index = ATIntervalIndex(aes)
+    assert len(index) == 300, f"index length incorrect: {len(index)}"
+    base = atu.iso_date_key("2025-03-22T08:00:00")
+    for q in range(0, 700, 7):
+        start = base + q * 60.0; stop = start + 45 * 60.0
+        got = index.overlapping(start, stop)
+        assert got == brute_overlapping(aes, start, stop), \
+            f"overlapping({start}, {stop}) incorrect"
+        got = index.containing(start)
+        assert got == [ae for ae in brute_overlapping(aes, start, start + 1e-6)
+                       if atu.iso_date_key(ae.start) <= start], \
+            f"containing({start}) incorrect"
+    # Remove half the entries, then add them back one at a time
+    for ae in aes[::2]: assert index.remove(ae)
+    assert not index.remove(aes[0]), "remove() of a missing entry returned True"
+    assert len(index) == 150
+    got = index.overlapping(float("-inf"), float("inf"))
+    assert got == aes[1::2], "overlapping() incorrect after remove()"
+    for ae in aes[::2]: index.add(ae)
+    got = index.overlapping(base + 120 * 60.0, base + 180 * 60.0)
+    assert set(map(id, got)) == \
+        set(map(id, brute_overlapping(aes, base + 120 * 60.0, base + 180 * 60.0)))
+    with pytest.raises(ValueError):
+        index.add(aes[1])
+    with pytest.raises(ValueError):
+        ATIntervalIndex(list(reversed(aes)))
+    logging.debug("Completed test_interval_index_overlapping()")
+#endregion test_interval_index_overlapping()
+
+#region test_interval_index_conflicts()
+def test_interval_index_conflicts():
+    """Test ATIntervalIndex.iter_conflicts() against all pairs."""
+    aes = random_activities(200, seed=7)
+    index = ATIntervalIndex(aes)
+    got = {frozenset((id(a), id(b))) for a, b in index.iter_conflicts()}
+    expected = set()
+    for a, b in itertools.combinations(aes, 2):
+        if brute_overlapping([b], atu.iso_date_key(a.start),
+                             atu.iso_date_key(a.stop)):
+            expected.add(frozenset((id(a), id(b))))
+    assert got == expected, "iter_conflicts() pairs do not match all pairs scan"
+#endregion test_interval_index_conflicts()
+
+#region test_atmodel_overlaps()
+def test_atmodel_overlaps():
+    """Test FileATModel overlap flagging, overlapping() and conflict_report()."""
+    atm = FileATModel("overlap_activity")
+    ae1 = ActivityEntry(start="2025-03-22T09:00:00", stop="2025-03-22T10:00:00")
+    ae2 = ActivityEntry(start="2025-03-22T10:00:00", stop="2025-03-22T11:00:00")
+    ae3 = ActivityEntry(start="2025-03-22T09:30:00", stop="2025-03-22T10:30:00")
+    atm.add_activity(ae1, allow_overlap=False)
+    atm.add_activity(ae2, allow_overlap=False)  # touching, not overlapping
+    with pytest.raises(ValueError):
+        atm.add_activity(ae3, allow_overlap=False)
+    assert len(atm.activities) == 2, "rejected overlapping activity was added"
+    assert atm.conflict_report() == []
+    assert atm.add_activity(ae3) is ae3, "overlap should only be flagged"
+    assert atm.overlapping("2025-03-22T09:45:00", "2025-03-22T10:15:00") == \
+        [ae1, ae3, ae2]
+    assert atm.activity_at("2025-03-22T09:45:00") is ae3
+    report = atm.conflict_report()
+    assert len(report) == 2 and (ae1, ae3) in report and (ae3, ae2) in report, \
+        f"conflict_report() incorrect: {report}"
+#endregion test_atmodel_overlaps()
@@ -0,0 +1,50 @@
+#------------------------------------------------------------------------------+
+import logging, pytest
+from model.ae import ActivityEntry
+from model.at_merge import merge_activities, iter_windows
+from model.file_atmodel import FileATModel
+
+def make_model(name: str, hours: list) -> FileATModel:
+    """Return a model for a user with activities at the given hours."""
+    return FileATModel(name, activities=[
+        ActivityEntry(start=f"2025-03-22T{h:02d}:00:00", activity=f"{name}{h}")
+        for h in hours])
+
+#region test_merge_activities()
+def test_merge_activities():
+    """Test merge_activities() merges models lazily in start time order."""
+    logging.debug("Starting test_merge_activities()")
+    alice = make_model("a", [8, 11, 14])
+    bob = make_model("b", [9, 11, 12])
+    carol = make_model("c", [])
+    merged = merge_activities([alice, bob, carol])
+    assert not isinstance(merged, list), "merge is not lazy"
+    got = [(atm.activityname, ae.activity) for atm, ae in merged]
+    assert got == [("a", "a8"), ("b", "b9"), ("a", "a11"), ("b", "b11"),
+                   ("b", "b12"), ("a", "a14")], f"merge out of order: {got}"
+    got = [ae.activity for _, ae in merge_activities(
+        [alice, bob], start="2025-03-22T10:00:00", stop="2025-03-22T14:00:00",
+        limit=3)]
+    assert got == ["a11", "b11", "b12"], f"window limits not applied: {got}"
+    assert list(merge_activities([alice, bob], limit=0)) == []
+    assert list(merge_activities([])) == []
+    with pytest.raises(TypeError):
+        merge_activities([alice, "bob"])
+    with pytest.raises(ValueError):
+        merge_activities([alice], limit=-1)
+    logging.debug("Completed test_merge_activities()")
+#endregion test_merge_activities()
+
+#region test_iter_windows()
+def test_iter_windows():
+    """Test iter_windows() groups a merged stream by time windows."""
+    logging.debug("Starting test_iter_windows()")
+    merged = merge_activities([make_model("a", [8, 9, 13]),
+                               make_model("b", [8, 10, 17])])
+    windows = [[ae.activity for _, ae in w] for w in iter_windows(merged, 2)]
+    assert windows == [["a8", "b8", "a9"], ["b10"], ["a13"], ["b17"]], \
+        f"windows incorrect: {windows}"
+    with pytest.raises(ValueError):
+        next(iter_windows([], 0))
+    logging.debug("Completed test_iter_windows()")
+#endregion test_iter_windows()
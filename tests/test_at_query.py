@@ -0,0 +1,69 @@
+#------------------------------------------------------------------------------+
+import logging, pytest
+from pytest import approx
+from model.ae import ActivityEntry
+from model.at_query import ATQuery
+from model.file_atmodel import FileATModel
+
+def make_model() -> FileATModel:
+    """Return a model with activities over two ISO weeks."""
+    return FileATModel("query_activity", activities=[
+        ActivityEntry(start="2025-03-20T09:00:00", stop="2025-03-20T10:00:00",
+                      activity="coding", notes="parser"),
+        ActivityEntry(start="2025-03-22T09:00:00", stop="2025-03-22T10:30:00",
+                      activity="coding", notes="tests"),
+        ActivityEntry(start="2025-03-23T13:00:00", stop="2025-03-23T15:00:00",
+                      activity="support", notes="tickets"),
+        ActivityEntry(start="2025-03-24T09:00:00", stop="2025-03-24T09:30:00",
+                      activity="coding", notes="parser")])
+
+#region test_query_filters()
+def test_query_filters():
+    """Test ATQuery between() and where() filters and entries()."""
+    logging.debug("Starting test_query_filters()")
+    atm = make_model()
+    aes = atm.activities
+    q = atm.query()
+    assert isinstance(q, ATQuery) and q.entries() == aes
+    week = q.between("2025-03-21", "2025-03-24")
+    assert week.entries() == aes[1:3], "between() range is not [start, stop)"
+    assert week.between("2025-03-23").entries() == aes[2:3], \
+        "a second between() did not narrow the range"
+    assert q.entries() == aes, "building a query changed the original"
+    assert q.where(activity="coding").entries() == [aes[0], aes[1], aes[3]]
+    assert q.where(activity=["coding", "support"]) \
+            .where(activity="support").entries() == [aes[2]]
+    assert q.where(notes="parser", activity="coding").entries() == [aes[0], aes[3]]
+    assert q.where(duration=lambda d: d > 1.0).entries() == [aes[1], aes[2]]
+    assert q.where(lambda ae: ae.notes.startswith("t")).count() == 2
+    with pytest.raises(ValueError):
+        q.where(project="x")
+    with pytest.raises(TypeError):
+        q.where("not callable")
+    with pytest.raises(TypeError):
+        q.between(20250321)
+    logging.debug("Completed test_query_filters()")
+#endregion test_query_filters()
+
+#region test_query_group_by()
+def test_query_group_by():
+    """Test ATQuery aggregates, ungrouped and grouped by one or more keys."""
+    logging.debug("Starting test_query_group_by()")
+    q = make_model().query()
+    assert q.count() == 4 and q.sum() == approx(5.0)
+    assert q.min() == 0.5 and q.max() == 2.0 and q.mean() == approx(1.25)
+    assert q.between("2026-01-01").mean() is None
+    assert q.group_by("week", "activity").sum("duration") == approx({
+        ("2025-W12", "coding"): 2.5, ("2025-W12", "support"): 2.0,
+        ("2025-W13", "coding"): 0.5})
+    assert q.group_by("activity").count() == {"coding": 3, "support": 1}
+    assert q.where(activity="coding").group_by("day").max("stop") == {
+        "2025-03-20": "2025-03-20T10:00:00", "2025-03-22": "2025-03-22T10:30:00",
+        "2025-03-24": "2025-03-24T09:30:00"}
+    assert q.group_by("month").mean() == approx({"2025-03": 1.25})
+    with pytest.raises(ValueError):
+        q.group_by("quarter")
+    with pytest.raises(ValueError):
+        q.sum("hours")
+    logging.debug("Completed test_query_group_by()")
+#endregion test_query_group_by()
@@ -0,0 +1,130 @@
+#------------------------------------------------------------------------------+
+import itertools, logging, pathlib, pytest
+import at_utilities.at_utils as atu
+from model.ae import ActivityEntry
+from model.at_recurrence import ATRecurrence
+from model.file_atmodel import FileATModel
+
+ATR_TEMPDATA_DIR = "tests/tempdata"
+
+#region test_recurrence_starts()
+def test_recurrence_starts():
+    """Test atu.recurrence_starts() daily, weekly and monthly rules."""
+    logging.debug("Starting test_recurrence_starts()")
+    starts = atu.recurrence_starts("2025-01-06T10:00:00", "weekly", 2, [0, 2],
+                                   "2025-01-07T00:00:00", "2025-02-01T00:00:00")
+    assert list(starts) == ["2025-01-08T10:00:00", "2025-01-20T10:00:00",
+                            "2025-01-22T10:00:00"], "weekly rule failed"
+    starts = atu.recurrence_starts("2025-01-31T09:00:00", "monthly",
+                                   stop="2025-06-01T00:00:00")
+    assert list(starts) == ["2025-01-31T09:00:00", "2025-03-31T09:00:00",
+                            "2025-05-31T09:00:00"], "short months not skipped"
+    starts = atu.recurrence_starts("2025-01-01T08:00:00", "daily", 3,
+                                   start="2030-01-01T00:00:00",
+                                   until="2030-01-08T08:00:00")
+    assert list(starts) == ["2030-01-02T08:00:00", "2030-01-05T08:00:00",
+                            "2030-01-08T08:00:00"], "daily rule or until failed"
+    endless = atu.recurrence_starts("2025-01-01T08:00:00", "daily")
+    assert len(list(itertools.islice(endless, 1000))) == 1000
+    with pytest.raises(ValueError):
+        next(atu.recurrence_starts("2025-01-01T08:00:00", "hourly"))
+    with pytest.raises(ValueError):
+        next(atu.recurrence_starts("2025-01-01T08:00:00", "weekly", weekdays=[7]))
+    logging.debug("Completed test_recurrence_starts()")
+#endregion test_recurrence_starts()
+
+#region test_atmodel_recurrences()
+def test_atmodel_recurrences():
+    """Test FileATModel expands templates lazily and materializes edits."""
+    logging.debug("Starting test_atmodel_recurrences()")
+    atm = FileATModel("recurring_activity")
+    standup = atm.add_recurrence(ATRecurrence(start="2025-01-06T09:00:00",
+        stop="2025-01-06T09:15:00", activity="standup", freq="weekly",
+        weekdays=[0, 1, 2, 3, 4]))
+    atm.add_recurrence(ATRecurrence(start="2025-01-15T14:00:00",
+        stop="2025-01-15T15:00:00", activity="review", freq="monthly"))
+    assert len(atm.activities) == 0, "occurrences were materialized"
+    with pytest.raises(ValueError):
+        atm.add_recurrence(standup)
+    with pytest.raises(ValueError):
+        ATRecurrence(start="2025-01-06T09:00:00", freq="yearly")
+    # Expanding a window decades away builds only the occurrences it holds
+    far = list(atm.iter_occurrences("2045-01-02T00:00:00", "2045-01-04T00:00:00"))
+    assert [ae.start for ae in far] == ["2045-01-02T09:00:00", "2045-01-03T09:00:00"]
+    assert far[0].stop == "2045-01-02T09:15:00"
+    atm.add_activity(ActivityEntry(start="2025-03-14T09:00:00",
+                                   stop="2025-03-14T10:00:00", activity="coding"))
+    week = list(atm.iter_schedule("2025-03-13T00:00:00", "2025-03-18T00:00:00"))
+    assert [ae.activity for ae in week] == \
+        ["standup", "coding", "standup", "review", "standup"], \
+        "activities should come before occurrences with equal start times"
+    with pytest.raises(TypeError):
+        atm.iter_occurrences(None, "2025-03-18T00:00:00")
+    # Editing an occurrence makes it a real activity, excluded from the template
+    occurrence = week[2]
+    assert occurrence.id == f"{standup.id}@2025-03-14T09:00:00"
+    ae = atm.materialize_occurrence(occurrence.id, stop="2025-03-14T09:45:00",
+                                    notes="long standup")
+    assert atm.get_activity(ae.id) is ae and ae.activity == "standup"
+    week = list(atm.iter_schedule("2025-03-14T00:00:00", "2025-03-15T00:00:00"))
+    assert [(a.activity, a.stop) for a in week] == [
+        ("coding", "2025-03-14T10:00:00"), ("standup", "2025-03-14T09:45:00")]
+    with pytest.raises(ValueError):
+        atm.materialize_occurrence(occurrence.id)
+    with pytest.raises(ValueError):
+        atm.materialize_occurrence(f"{standup.id}@2025-03-15T09:00:00")
+    # Templates are saved and loaded with the activity store
+    full_path = pathlib.Path(ATR_TEMPDATA_DIR) / "recurring_activity.json"
+    full_path.parent.mkdir(parents=True, exist_ok=True)
+    atm.put_atmodel(full_path)
+    loaded = FileATModel(); loaded.get_atmodel(full_path)
+    assert [r.to_dict() for r in loaded.recurrences] == \
+        [r.to_dict() for r in atm.recurrences]
+    assert atm.remove_recurrence(standup.id) is standup
+    assert [r.activity for r in atm.recurrences] == ["review"]
+    with pytest.raises(ValueError):
+        atm.remove_recurrence(standup.id)
+    full_path.unlink(); FileATModel.summary_uri(full_path).unlink()
+    logging.debug("Completed test_atmodel_recurrences()")
+#endregion test_atmodel_recurrences()
+
+#region test_atmodel_recurrence_undo()
+def test_atmodel_recurrence_undo():
+    """Test template changes and materialized occurrences are undoable
+    steps, each published as one change."""
+    logging.debug("Starting test_atmodel_recurrence_undo()")
+    with pytest.raises(ValueError):
+        ATRecurrence(start="2025-01-06T09:00:00", id="bad@id")
+    from at_utilities.at_events import ATEventManager, ATModelEvent
+    em = ATEventManager()  # not started, so events stay queued
+    atm = FileATModel("recurring_undo")
+    atm.event_manager = em
+    standup = atm.add_recurrence(ATRecurrence(start="2025-01-06T09:00:00",
+        stop="2025-01-06T09:15:00", activity="standup", freq="daily"))
+    window = ("2025-01-07T00:00:00", "2025-01-08T00:00:00")
+    occurrence = next(atm.iter_occurrences(*window))
+    ae = atm.materialize_occurrence(occurrence.id, notes="moved")
+    eq = em.get_event_queue(ATModelEvent.__name__, create=False)
+    published = [[c["kind"] for c in eq.get().event_data["changes"]]
+                 for _ in range(eq.qsize())]
+    assert published == [["recurrence_added"], ["added", "occurrence_excluded"]], \
+        f"changes not published as one event per operation: {published}"
+    assert list(atm.iter_occurrences(*window)) == []
+    # Undoing the materialize removes the activity and restores the occurrence
+    atm.undo()
+    assert atm.get_activity(ae.id) is None, "materialized activity not undone"
+    assert [o.id for o in atm.iter_occurrences(*window)] == [occurrence.id], \
+        "occurrence exception not undone"
+    atm.redo()
+    assert atm.get_activity(ae.id) is not None and \
+        list(atm.iter_occurrences(*window)) == [], "materialize not redone"
+    atm.undo(); atm.undo()
+    assert atm.recurrences == [], "add_recurrence not undone"
+    atm.redo()
+    assert [r.id for r in atm.recurrences] == [standup.id]
+    atm.remove_recurrence(standup.id)
+    atm.undo()
+    assert [r.to_dict() for r in atm.recurrences] == [standup.to_dict()], \
+        "remove_recurrence not undone"
+    logging.debug("Completed test_atmodel_recurrence_undo()")
+#endregion test_atmodel_recurrence_undo()
@@ -0,0 +1,93 @@
+#------------------------------------------------------------------------------+
+import logging, random, statistics, pytest
+from pytest import approx
+from model.ae import ActivityEntry
+from model.at_stats import ATQuantileSketch, ATDurationStats, ATStats
+from model.file_atmodel import FileATModel
+
+def make_entry(day: str, minutes: int, activity: str) -> ActivityEntry:
+    return ActivityEntry(start=f"{day}T09:00:00",
+                         stop=f"{day}T{9 + minutes // 60:02d}:{minutes % 60:02d}:00",
+                         activity=activity)
+
+#region test_quantile_sketch()
+def test_quantile_sketch():
+    """Test ATQuantileSketch is exact when small, bounded and accurate when
+    large, and mergeable."""
+    logging.debug("Starting test_quantile_sketch()")
+    sketch = ATQuantileSketch(seed=1)
+    assert sketch.quantile(0.5) is None
+    for v in (5.0, 1.0, 3.0, 2.0, 4.0): sketch.add(v)
+    assert sketch.quantile(0.5) == 3.0 and sketch.quantile(0.0) == 1.0
+    assert sketch.quantile(1.0) == 5.0
+    rng = random.Random(7)
+    values = [rng.random() for _ in range(50000)]
+    parts = [ATQuantileSketch(seed=i) for i in range(4)]
+    for i, v in enumerate(values): parts[i % 4].add(v)
+    merged = parts[0]
+    for part in parts[1:]: merged.merge(part)
+    assert merged.count == 50000
+    assert len(merged) < 2000, f"sketch kept too many items: {len(merged)}"
+    for q in (0.5, 0.95):
+        assert merged.quantile(q) == approx(q, abs=0.02), \
+            f"quantile {q} outside the rank error: {merged.quantile(q)}"
+    copy = ATQuantileSketch.from_dict(merged.to_dict())
+    assert copy.quantile(0.95) == merged.quantile(0.95)
+    with pytest.raises(ValueError):
+        merged.quantile(1.5)
+    logging.debug("Completed test_quantile_sketch()")
+#endregion test_quantile_sketch()
+
+#region test_duration_stats()
+def test_duration_stats():
+    """Test ATDurationStats moments and merging match direct computation."""
+    logging.debug("Starting test_duration_stats()")
+    values = [0.5, 1.25, 2.0, 0.75, 3.5, 1.0]
+    a, b = ATDurationStats(values[:2]), ATDurationStats(values[2:])
+    a.merge(b); a.merge(ATDurationStats())
+    assert a.count == 6 and a.mean == approx(statistics.mean(values))
+    assert a.variance == approx(statistics.pvariance(values))
+    assert a.stdev == approx(statistics.pstdev(values))
+    assert a.min == 0.5 and a.max == 3.5 and a.quantile(0.5) == 1.0
+    assert ATDurationStats().mean is None
+    assert ATDurationStats.from_dict(a.to_dict()).variance == approx(a.variance)
+    logging.debug("Completed test_duration_stats()")
+#endregion test_duration_stats()
+
+#region test_atmodel_stats()
+def test_atmodel_stats():
+    """Test FileATModel keeps ATStats per week and activity up to date."""
+    logging.debug("Starting test_atmodel_stats()")
+    atm = FileATModel("stats_activity", activities=[
+        make_entry("2025-03-17", 30, "coding"), make_entry("2025-03-18", 90, "coding"),
+        make_entry("2025-03-24", 60, "coding"), make_entry("2025-03-24", 15, "email")])
+    assert set(atm.stats.weeks) == {"2025-W12", "2025-W13"}
+    coding = atm.stats.activity_stats("coding")
+    assert coding.count == 3 and coding.mean == approx(1.0)
+    assert coding.quantile(0.5) == 1.0
+    assert atm.stats.activity_stats("coding", ["2025-W12"]).max == 1.5
+    # Edits recompute the affected week and activity
+    atm.update_activity(atm.activities[1].id, activity="review")
+    assert atm.stats.activity_stats("coding", ["2025-W12"]).count == 1
+    assert atm.stats.activity_stats("review").mean == approx(1.5)
+    atm.remove_activity(atm.activities[0].id)
+    assert "coding" not in atm.stats.weeks["2025-W12"]
+    atm.add_activity(make_entry("2025-03-25", 120, "coding"))
+    assert atm.stats.activity_stats("coding").quantile(1.0) == 2.0
+    # Statistics of separate stores merge for a roll-up
+    other = ATStats([make_entry("2025-03-24", 30, "coding")])
+    rollup = ATStats.from_dict(atm.stats.to_dict())
+    rollup.merge(other)
+    assert rollup.activity_stats("coding", ["2025-W13"]).count == 3
+    # The statistics are built on first use, after the edits made before
+    atm = FileATModel("stats_activity", activities=[
+        make_entry("2025-03-17", 30, "coding")])
+    assert atm._stats is None, "statistics built before use"
+    atm.update_activity(atm.activities[0].id, activity="review")
+    atm.add_activity(make_entry("2025-03-18", 90, "coding"))
+    assert atm.stats.activity_stats("review").count == 1 and \
+        atm.stats.activity_stats("coding").mean == approx(1.5)
+    atm.activities = []
+    assert atm._stats is None and atm.stats.weeks == {}
+    logging.debug("Completed test_atmodel_stats()")
+#endregion test_atmodel_stats()
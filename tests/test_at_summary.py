@@ -0,0 +1,91 @@
+#------------------------------------------------------------------------------+
+import copy, json, logging, pathlib, pytest
+from pytest import approx
+from model.ae import ActivityEntry
+from model.at_summary import ATSummary
+from model.file_atmodel import FileATModel
+
+ATS_TEMPDATA_DIR = "tests/tempdata"
+
+def make_activities() -> list:
+    """Return activities spanning two ISO weeks and a midnight."""
+    return [
+        ActivityEntry(start="2025-03-22T09:00:00", stop="2025-03-22T10:30:00",
+                      activity="coding"),
+        ActivityEntry(start="2025-03-23T23:00:00", stop="2025-03-24T01:00:00",
+                      activity="support"),
+        ActivityEntry(start="2025-03-24T09:00:00", stop="2025-03-24T09:30:00",
+                      activity="coding")]
+
+#region test_summary_totals()
+def test_summary_totals():
+    """Test ATSummary week, day and activity totals and incremental updates."""
+    logging.debug("Starting test_summary_totals()")
+    aes = make_activities()
+    summary = ATSummary(aes)
+    assert summary.activities == {"coding": 2.0, "support": 2.0}
+    assert summary.total == 4.0
+    assert summary.weekly_summary("2025-W12") == {"coding": 1.5, "support": 1.0}, \
+        "midnight crossing was not split between ISO weeks"
+    assert summary.weekly_summary("2025-W13") == {"coding": 0.5, "support": 1.0}
+    assert summary.weekly_summary("2025-W01") == {}
+    assert summary.days["2025-03-24"] == {"support": 1.0, "coding": 0.5}
+    # Edit an entry in place, passing a copy with the old values
+    old = copy.copy(aes[0])
+    aes[0].stop = "2025-03-22T09:45:00"; aes[0].activity = "email"
+    summary.update(old, aes[0])
+    assert summary.activities == approx({"coding": 0.5, "email": 0.75, "support": 2.0})
+    assert summary.days["2025-03-22"] == approx({"email": 0.75})
+    # Removing everything leaves no empty totals behind
+    for ae in aes: summary.remove(ae)
+    assert summary.weeks == {} and summary.days == {} and summary.activities == {}
+    logging.debug("Completed test_summary_totals()")
+#endregion test_summary_totals()
+
+#region test_atmodel_summary()
+def test_atmodel_summary():
+    """Test FileATModel keeps its summary and saves it next to the store."""
+    logging.debug("Starting test_atmodel_summary()")
+    atm = FileATModel("summary_activity", activities=make_activities()[:1])
+    assert atm.summary.activities == {"coding": 1.5}
+    atm.add_activity(make_activities()[1])
+    atm.add_activities(make_activities()[2:])
+    assert atm.summary.activities == {"coding": 2.0, "support": 2.0}
+    full_path = pathlib.Path(ATS_TEMPDATA_DIR) / "summary_activity.json"
+    full_path.parent.mkdir(parents=True, exist_ok=True)
+    summary_path = FileATModel.summary_uri(full_path)
+    assert atm.put_atmodel(full_path)
+    assert summary_path.is_file(), f"summary file not saved: {summary_path}"
+    # A matching summary file is loaded rather than recomputed
+    data = json.loads(summary_path.read_text())
+    data["activities"]["coding"] = 99.0
+    summary_path.write_text(json.dumps(data))
+    loaded = FileATModel(); loaded.get_atmodel(full_path)
+    assert loaded.summary.activities["coding"] == 99.0, \
+        "matching summary file was not used"
+    # Saving an unchanged model does not rewrite its summary file
+    mtime = summary_path.stat().st_mtime_ns
+    assert loaded.put_atmodel(full_path)
+    assert summary_path.stat().st_mtime_ns == mtime, "unchanged summary rewritten"
+    # A stale summary file is ignored and the totals recomputed
+    data["fingerprint"]["sha256"] = "0" * 64
+    summary_path.write_text(json.dumps(data))
+    loaded = FileATModel(); loaded.get_atmodel(full_path)
+    assert loaded.summary.activities == {"coding": 2.0, "support": 2.0}
+    # An edit to the store keeping its size and modification date is seen
+    summary_path.write_text(json.dumps({**data, "fingerprint": 
+                                        FileATModel.summary_fingerprint(
+                                            full_path.read_text())}))
+    full_path.write_text(full_path.read_text().replace("support", "meeting"))
+    loaded = FileATModel(); loaded.get_atmodel(full_path)
+    assert loaded.summary.activities == {"coding": 2.0, "meeting": 2.0}, \
+        "summary of an edited store was used"
+    assert loaded.put_atmodel(full_path)
+    assert json.loads(summary_path.read_text())["activities"] == \
+        {"coding": 2.0, "meeting": 2.0}, "recomputed summary not saved"
+    summary_path.write_text("not json")
+    loaded = FileATModel(); loaded.get_atmodel(full_path)
+    assert loaded.summary.total == 4.0
+    full_path.unlink(); summary_path.unlink()
+    logging.debug("Completed test_atmodel_summary()")
+#endregion test_atmodel_summary()
@@ -0,0 +1,96 @@
+#------------------------------------------------------------------------------+
+import json, logging, pathlib, pytest
+from model.ae import ActivityEntry
+from model.at_text_index import ATTextIndex
+from model.file_atmodel import FileATModel
+
+ATT_TEMPDATA_DIR = "tests/tempdata"
+
+def make_activities() -> list:
+    """Return activities with notes to search, out of start order."""
+    return [
+        ActivityEntry(start="2025-03-24T09:00:00", stop="2025-03-24T10:00:00",
+                      activity="coding", notes="Database migration, part 2"),
+        ActivityEntry(start="2025-03-22T09:00:00", stop="2025-03-22T10:00:00",
+                      activity="coding", notes="database migration part 1"),
+        ActivityEntry(start="2025-03-23T09:00:00", stop="2025-03-23T10:00:00",
+                      activity="support", notes="upgrade the DB server")]
+
+#region test_text_index_search()
+def test_text_index_search():
+    """Test ATTextIndex AND, OR and prefix queries and incremental updates."""
+    logging.debug("Starting test_text_index_search()")
+    aes = make_activities()
+    index = ATTextIndex(aes)
+    assert len(index) == 3
+    assert index.search("migration") == [aes[1], aes[0]], \
+        "results are not in start time order"
+    assert index.search("Migration PART 2") == [aes[0]], "AND query failed"
+    assert index.search("migration AND support") == []
+    assert index.search("part OR upgrade") == [aes[1], aes[2], aes[0]], \
+        "OR query failed"
+    assert index.search("data*") == [aes[1], aes[0]], "prefix query failed"
+    assert index.search("d* s*") == [aes[2]]
+    assert index.search("") == [] and index.search("nothing") == []
+    with pytest.raises(TypeError):
+        index.search(None)
+    # Removal uses the indexed words, even after the notes are edited
+    aes[2].notes = "edited"
+    assert index.remove(aes[2]) and not index.remove(aes[2])
+    assert index.search("upgrade OR edited") == []
+    assert index.search("s*") == [], "removed token left in the vocabulary"
+    index.add(aes[2])
+    assert index.search("edited") == [aes[2]]
+    with pytest.raises(ValueError):
+        index.add(aes[2])
+    logging.debug("Completed test_text_index_search()")
+#endregion test_text_index_search()
+
+#region test_atmodel_search_activities()
+def test_atmodel_search_activities():
+    """Test FileATModel search_activities() and the persisted text index."""
+    logging.debug("Starting test_atmodel_search_activities()")
+    aes = make_activities()
+    atm = FileATModel("text_activity", activities=aes[:1])
+    atm.add_activity(aes[1])
+    atm.add_activities(aes[2:])
+    assert atm.search_activities("migration") == [aes[1], aes[0]]
+    assert atm.search_activities("support OR part") == [aes[1], aes[2], aes[0]]
+    full_path = pathlib.Path(ATT_TEMPDATA_DIR) / "text_activity.json"
+    full_path.parent.mkdir(parents=True, exist_ok=True)
+    index_path = FileATModel.text_index_uri(full_path)
+    index_path.unlink(missing_ok=True)
+    assert atm.put_atmodel(full_path)
+    assert not index_path.is_file(), "text index saved without persist_text_index"
+    atm.persist_text_index = True
+    assert atm.put_atmodel(full_path)
+    assert index_path.is_file(), f"text index file not saved: {index_path}"
+    # A matching index file is loaded rather than rebuilt
+    data = json.loads(index_path.read_text())
+    data["postings"]["loaded"] = [0]
+    index_path.write_text(json.dumps(data))
+    loaded = FileATModel(); loaded.get_atmodel(full_path)
+    assert [ae.notes for ae in loaded.search_activities("loaded")] == \
+        ["database migration part 1"], "matching text index file was not used"
+    # The indexes are built on first use, with the edits made before it
+    loaded = FileATModel(); loaded.get_atmodel(full_path)
+    assert loaded._text_index is None and loaded._activity_trie is None and \
+        loaded._interval_index is None, "indexes built on load"
+    loaded.add_activity(ActivityEntry(start="2025-03-25T09:00:00",
+        stop="2025-03-25T10:00:00", activity="review", notes="migration"))
+    assert loaded.search_activities("loaded") == [], \
+        "text index file used after the activities changed"
+    assert len(loaded.search_activities("migration")) == 3
+    assert loaded.complete_activity("rev") == ["review"]
+    assert len(loaded.overlapping("2025-03-25T09:30:00",
+                                  "2025-03-25T09:45:00")) == 1
+    # A stale index file is ignored and the index rebuilt
+    data["fingerprint"]["sha256"] = "0" * 64
+    index_path.write_text(json.dumps(data))
+    loaded = FileATModel(); loaded.get_atmodel(full_path)
+    assert loaded.search_activities("loaded") == []
+    assert len(loaded.search_activities("migration")) == 2
+    full_path.unlink(); index_path.unlink()
+    FileATModel.summary_uri(full_path).unlink()
+    logging.debug("Completed test_atmodel_search_activities()")
+#endregion test_atmodel_search_activities()
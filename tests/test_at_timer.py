@@ -0,0 +1,113 @@
+#------------------------------------------------------------------------------+
+import logging, pathlib, pytest
+from model.at_timer import ATRunningTimer
+from model.file_atmodel import FileATModel
+
+ATT_TEMPDATA_DIR = "tests/tempdata"
+
+#region test_running_timer()
+def test_running_timer():
+    """Test ATRunningTimer elapsed time, entries and checkpoints."""
+    logging.debug("Starting test_running_timer()")
+    timer = ATRunningTimer(start="2025-02-03T09:00:00", activity="coding")
+    assert timer.elapsed("2025-02-03T10:30:00") == pytest.approx(1.5)
+    assert timer.elapsed() > 0, "elapsed to now should be positive"
+    ae = timer.to_entry("2025-02-03T11:00:00")
+    assert (ae.start, ae.stop, ae.activity, ae.id) == \
+        ("2025-02-03T09:00:00", "2025-02-03T11:00:00", "coding", timer.id)
+    with pytest.raises(ValueError):
+        timer.to_entry("2025-02-03T08:00:00")
+    path = pathlib.Path(ATT_TEMPDATA_DIR) / "timer_checkpoint.timer.json"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    assert ATRunningTimer.get_checkpoint(path) is None
+    timer.put_checkpoint(path)
+    assert ATRunningTimer.get_checkpoint(path) == timer, "checkpoint not restored"
+    path.write_text("{not json")
+    assert ATRunningTimer.get_checkpoint(path) is None, "bad checkpoint loaded"
+    ATRunningTimer.clear_checkpoint(path)
+    assert not path.exists(), "checkpoint not removed"
+    logging.debug("Completed test_running_timer()")
+#endregion test_running_timer()
+
+#region test_atmodel_timer()
+def test_atmodel_timer():
+    """Test FileATModel start_timer() and stop_timer(), surviving a reload."""
+    logging.debug("Starting test_atmodel_timer()")
+    full_path = pathlib.Path(ATT_TEMPDATA_DIR) / "timer_activity.json"
+    full_path.parent.mkdir(parents=True, exist_ok=True)
+    atm = FileATModel("timer_activity")
+    atm.activity_store_uri = str(full_path)
+    timer = atm.start_timer("writing", start="2025-02-03T09:00:00")
+    assert atm.timer is timer and len(atm.activities) == 0
+    assert FileATModel.timer_uri(full_path).is_file(), "no checkpoint written"
+    with pytest.raises(ValueError):
+        atm.start_timer("reading")
+    atm.put_atmodel(full_path)
+    # A model loaded after a crash finds the running timer
+    loaded = FileATModel(); loaded.get_atmodel(full_path)
+    assert loaded.timer == timer, "running timer not restored"
+    ae = loaded.stop_timer("2025-02-03T10:15:00")
+    assert loaded.get_activity(timer.id) is ae and ae.duration == 1.25
+    assert loaded.timer is None, "timer still running"
+    assert not FileATModel.timer_uri(full_path).exists(), "checkpoint left"
+    with pytest.raises(ValueError):
+        loaded.stop_timer()
+    atm.discard_timer()
+    assert atm.timer is None and len(atm.activities) == 0
+    # The stopped activity is saved before its checkpoint is removed
+    saved = FileATModel(); saved.get_atmodel(full_path)
+    assert saved.get_activity(timer.id) is not None, "stopped activity not saved"
+    full_path.unlink(); FileATModel.summary_uri(full_path).unlink()
+    logging.debug("Completed test_atmodel_timer()")
+#endregion test_atmodel_timer()
+
+#region test_atmodel_timer_crash_after_stop()
+def test_atmodel_timer_crash_after_stop(monkeypatch):
+    """Test a crash after stop_timer() saves the store, before the timer
+    checkpoint is removed, loses and duplicates nothing."""
+    logging.debug("Starting test_atmodel_timer_crash_after_stop()")
+    full_path = pathlib.Path(ATT_TEMPDATA_DIR) / "timer_crash_activity.json"
+    full_path.parent.mkdir(parents=True, exist_ok=True)
+    atm = FileATModel("timer_crash_activity")
+    atm.activity_store_uri = str(full_path)
+    timer = atm.start_timer("writing", start="2025-02-03T09:00:00")
+    def crash(checkpoint_uri): raise OSError("crashed")
+    monkeypatch.setattr(ATRunningTimer, "clear_checkpoint", staticmethod(crash))
+    with pytest.raises(OSError):
+        atm.stop_timer("2025-02-03T10:00:00")
+    monkeypatch.undo()
+    assert FileATModel.timer_uri(full_path).is_file(), "checkpoint removed"
+    loaded = FileATModel(); loaded.get_atmodel(full_path)
+    assert loaded.timer is None, "stopped timer restored as running"
+    assert [ae.id for ae in loaded.activities] == [timer.id], \
+        "stopped activity lost or duplicated"
+    assert not FileATModel.timer_uri(full_path).exists(), "stale checkpoint left"
+    full_path.unlink(); FileATModel.summary_uri(full_path).unlink()
+    logging.debug("Completed test_atmodel_timer_crash_after_stop()")
+#endregion test_atmodel_timer_crash_after_stop()
+
+#region test_atmodel_timer_save_failure()
+def test_atmodel_timer_save_failure(monkeypatch):
+    """Test stop_timer() leaves the timer running and adds nothing when the
+    activity store cannot be saved, so it can be retried."""
+    logging.debug("Starting test_atmodel_timer_save_failure()")
+    full_path = pathlib.Path(ATT_TEMPDATA_DIR) / "timer_save_activity.json"
+    full_path.parent.mkdir(parents=True, exist_ok=True)
+    atm = FileATModel("timer_save_activity")
+    atm.activity_store_uri = str(full_path)
+    timer = atm.start_timer("writing", start="2025-02-03T09:00:00")
+    modified = atm.last_modified_date
+    def fail(self, activity_store_uri = None): raise OSError("disk full")
+    monkeypatch.setattr(FileATModel, "put_atmodel", fail)
+    with pytest.raises(OSError):
+        atm.stop_timer("2025-02-03T10:00:00")
+    monkeypatch.undo()
+    assert atm.timer is timer and len(atm.activities) == 0, \
+        "failed save left the activity added or the timer stopped"
+    assert not atm.history.can_undo and atm.last_modified_date == modified
+    ae = atm.stop_timer("2025-02-03T10:00:00")
+    assert atm.activities == [ae] and atm.timer is None, "retry failed"
+    assert not FileATModel.timer_uri(full_path).exists(), "checkpoint left"
+    full_path.unlink(); FileATModel.summary_uri(full_path).unlink()
+    logging.debug("Completed test_atmodel_timer_save_failure()")
+#endregion test_atmodel_timer_save_failure()
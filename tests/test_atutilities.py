@@ -182,6 +182,18 @@ def test_iso_date_approx():
         atu.iso_date_approx(dt1, "invalid-date-string")
 #endregion test_iso_date_approx()
 
+#region test_iso_date_key()
+def test_iso_date_key():
+    """Test the iso_date_key function."""
+    k1 = atu.iso_date_key("2025-03-22T14:42:49")
+    k2 = atu.iso_date_key("2025-03-22T14:42:49.500000")
+    assert isinstance(k1, float), "iso_date_key() did not return a float"
+    assert k2 - k1 == 0.5, f"iso_date_key() difference incorrect: {k2 - k1}"
+    assert atu.iso_date_key("1970-01-02T00:00:00") == 86400.0
+    with pytest.raises(TypeError) : atu.iso_date_key(None)
+    with pytest.raises(ValueError) : atu.iso_date_key("not a timestamp")
+#endregion test_iso_date_key()
+
 #region test_to_int()
 def test_to_int():
     assert atu.to_int(1.0) == 1, "to_int(1.0) does not return 1"
@@ -546,6 +558,38 @@ def test_current_timestamp():
         f"current_timestamp() is not approximately equal to the current time"
 #endregion test_current_timestamp()
 
+#region test_split_duration_by_day()
+def test_split_duration_by_day():
+    """Test the split_duration_by_day and iso_week_of_day functions."""
+    assert atu.split_duration_by_day("2025-03-22T09:00:00", "2025-03-22T10:30:00") \
+        == [("2025-03-22", 1.5)], "split_duration_by_day() failed within a day"
+    assert atu.split_duration_by_day("2025-03-22T23:00:00", "2025-03-24T01:00:00") \
+        == [("2025-03-22", 1.0), ("2025-03-23", 24.0), ("2025-03-24", 1.0)], \
+        "split_duration_by_day() failed across midnight"
+    assert atu.split_duration_by_day("2025-03-22T10:00:00", "2025-03-22T09:00:00") \
+        == [("2025-03-22", -1.0)], "split_duration_by_day() failed for negative"
+    assert atu.iso_week_of_day("2025-03-22") == "2025-W12"
+    assert atu.iso_week_of_day("2024-12-30T10:00:00") == "2025-W01"
+    with pytest.raises(TypeError) : atu.iso_week_of_day(None)
+    assert atu.iso_week_bounds("2025-W01") == \
+        ("2024-12-30T00:00:00", "2025-01-06T00:00:00"), "iso_week_bounds() failed"
+    with pytest.raises(ValueError) : atu.iso_week_bounds("2025-12")
+    with pytest.raises(ValueError) : atu.split_duration_by_day("bad", "2025-03-22T10:00:00")
+#endregion test_split_duration_by_day()
+
+#region test_ical_date_to_iso()
+def test_ical_date_to_iso():
+    """Test the ical_date_to_iso function."""
+    assert atu.ical_date_to_iso("20250322T215744") == "2025-03-22T21:57:44", \
+        "ical_date_to_iso() failed for local DATE-TIME value"
+    assert atu.ical_date_to_iso("20250322") == "2025-03-22T00:00:00", \
+        "ical_date_to_iso() failed for DATE value"
+    assert atu.validate_iso_date_string(atu.ical_date_to_iso("20250322T215744Z")), \
+        "ical_date_to_iso() failed for UTC DATE-TIME value"
+    with pytest.raises(TypeError) : atu.ical_date_to_iso(None)
+    with pytest.raises(ValueError) : atu.ical_date_to_iso("2025-03-22")
+#endregion test_ical_date_to_iso()
+
 #endregion Timestamp Helper Functions
 #------------------------------------------------------------------------------+
 
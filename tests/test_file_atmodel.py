@@ -1,5 +1,5 @@
 #------------------------------------------------------------------------------+
-import getpass, pathlib, logging, pytest
+import getpass, json, pathlib, logging, pytest
 from typing import List
 import at_utilities.at_utils as atu
 from model.ae import ActivityEntry
@@ -188,9 +188,10 @@ def test_atmodel_add_activity():
     #     f"get_atmodel __str__() representation is incorrect: {new_atm.__str__()}"
     # assert new_atm.__repr__() == atm.__repr__(), \
     #     f"get_atmodel __repr__() representation is incorrect: {new_atm.__str__()}"
-    # Clean up the temporary file
+    # Clean up the temporary files
     try:
         full_path.unlink()
+        FileATModel.summary_uri(full_path).unlink()
     except Exception as e:
         logging.error(f"Failed to delete file {full_path}: {e}")
         raise
@@ -370,3 +371,250 @@ def test_validate_activities_list():
 #endregion test_validate_activities_list()
 
 #------------------------------------------------------------------------------+
+
+#region test_iter_activities()
+def test_iter_activities():
+    """Test the iter_activities method for FileATModel class"""
+    logging.debug("Starting test_iter_activities()")
+    activities = [
+        ActivityEntry(start="2025-03-22T14:42:49.298776", \
+                      stop="2025-03-22T15:12:49.298776", activity="ae1 activity"),
+        ActivityEntry(start="2025-03-22T15:13:49.298776", \
+                      stop="2025-03-22T15:43:49.298776", activity="ae2 activity"),
+        ActivityEntry(start="2025-03-22T15:44:49.298776", \
+                      stop="2025-03-22T16:14:49.298776", activity="ae1 activity")
+    ]
+    atm = FileATModel("iter_activity", activities=activities)
+    assert list(atm.iter_activities()) == activities, \
+        "iter_activities() with no filters did not return all activities"
+    assert list(atm.iter_activities())[0] is activities[0], \
+        "iter_activities() should yield the entries, not copies"
+    got = list(atm.iter_activities(start="2025-03-22T15:13:49.298776"))
+    assert got == activities[1:], f"start filter incorrect: {got}"
+    got = list(atm.iter_activities(stop="2025-03-22T15:44:49.298776"))
+    assert got == activities[:2], f"stop filter is not exclusive: {got}"
+    got = list(atm.iter_activities(activity="ae1 activity"))
+    assert got == [activities[0], activities[2]], f"activity filter incorrect: {got}"
+    got = list(atm.iter_activities("2025-03-22T15:00:00", None,
+                                   ["ae1 activity", "ae2 activity"]))
+    assert got == activities[1:], f"combined filters incorrect: {got}"
+    with pytest.raises(TypeError):
+        list(atm.iter_activities(activity=[1, 2]))
+    with pytest.raises(ValueError):
+        list(atm.iter_activities(start="not a timestamp"))
+    logging.debug("Completed test_iter_activities()")
+#endregion test_iter_activities()
+
+#region test_sorted_activities()
+def test_sorted_activities():
+    """Test FileATModel keeps activities sorted by start time with 
+    add_activity(), add_activities() and when loading a legacy file."""
+    logging.debug("Starting test_sorted_activities()")
+    def ae(start, activity):
+        return ActivityEntry(start=start, activity=activity)
+    atm = FileATModel("sorted_activity")
+    atm.add_activity(ae("2025-03-22T15:00:00", "b"))
+    atm.add_activity(ae("2025-03-22T14:00:00", "a"))
+    atm.add_activity(ae("2025-03-22T16:00:00", "d"))
+    atm.add_activity(ae("2025-03-22T15:00:00", "c"))  # equal start, after b
+    assert [a.activity for a in atm.activities] == ["a", "b", "c", "d"], \
+        f"add_activity() did not keep start order: {atm.activities}"
+    # A batch after the last activity is appended, otherwise merged
+    atm.add_activities([ae("2025-03-22T17:00:00", "e"),
+                        ae("2025-03-22T18:00:00", "f")])
+    atm.add_activities([ae("2025-03-22T17:30:00", "e2"),
+                        ae("2025-03-22T13:00:00", "0")])
+    assert [a.activity for a in atm.activities] == \
+        ["0", "a", "b", "c", "d", "e", "e2", "f"], \
+        f"add_activities() did not keep start order: {atm.activities}"
+    with pytest.raises(TypeError):
+        atm.add_activity("not an ActivityEntry")
+
+    # A legacy activity store with unsorted activities is sorted on load
+    unsorted = FileATModel("legacy_activity",
+        activities=[ae("2025-03-22T16:00:00", "3"), ae("2025-03-22T14:00:00", "1"),
+                    ae("2025-03-22T15:00:00", "2")])
+    assert [a.activity for a in unsorted.activities] == ["1", "2", "3"]
+    full_path = pathlib.Path(FATM_TEMPDATA_DIR) / "legacy_activity.json"
+    full_path.parent.mkdir(parents=True, exist_ok=True)
+    data = unsorted.to_dict()
+    data["activities"].reverse()
+    full_path.write_text(json.dumps(data))
+    loaded = FileATModel()
+    loaded.get_atmodel(full_path)
+    assert [a.activity for a in loaded.activities] == ["1", "2", "3"], \
+        f"get_atmodel() did not sort legacy activities: {loaded.activities}"
+    full_path.unlink()
+    # The caller's List and entries are left as given
+    given = [ae("2025-03-22T16:00:00", "3"), ae("2025-03-22T14:00:00", "1")]
+    given.append(ActivityEntry(start="2025-03-22T15:00:00", activity="2",
+                               id=given[0].id))
+    ids = [a.id for a in given]
+    atm.activities = given
+    assert [a.activity for a in given] == ["3", "1", "2"], "caller's List sorted"
+    assert [a.id for a in given] == ids, "caller's entry ids rewritten"
+    assert [a.activity for a in atm.activities] == ["1", "2", "3"]
+    assert len({a.id for a in atm.activities}) == 3, "duplicate id kept"
+    logging.debug("Completed test_sorted_activities()")
+#endregion test_sorted_activities()
+
+#region test_activities_between_and_activity_at()
+def test_activities_between_and_activity_at():
+    """Test the activities_between and activity_at methods for FileATModel"""
+    logging.debug("Starting test_activities_between_and_activity_at()")
+    atm = FileATModel("lookup_activity")
+    atm.add_activities([
+        ActivityEntry(start=f"2025-03-22T{h:02d}:00:00",
+                      stop=f"2025-03-22T{h:02d}:30:00", activity=f"h{h}")
+        for h in range(8, 18)])
+    got = atm.activities_between("2025-03-22T10:00:00", "2025-03-22T12:00:00")
+    assert [a.activity for a in got] == ["h10", "h11"], \
+        f"activities_between() incorrect: {got}"
+    assert len(atm.activities_between()) == 10
+    assert atm.activities_between("2025-03-23T00:00:00") == []
+    assert atm.activity_at("2025-03-22T09:15:00").activity == "h9"
+    assert atm.activity_at("2025-03-22T09:00:00").activity == "h9"
+    assert atm.activity_at("2025-03-22T09:30:00") is None, \
+        "activity_at() stop time should be exclusive"
+    assert atm.activity_at("2025-03-22T07:59:59") is None
+    with pytest.raises(TypeError):
+        atm.activity_at(None)
+    logging.debug("Completed test_activities_between_and_activity_at()")
+#endregion test_activities_between_and_activity_at()
+
+#region test_update_and_remove_activity()
+def test_update_and_remove_activity():
+    """Test the update_activity and remove_activity methods by entry id"""
+    logging.debug("Starting test_update_and_remove_activity()")
+    aes = [ActivityEntry(start=f"2025-03-22T{h:02d}:00:00",
+                         stop=f"2025-03-22T{h:02d}:30:00", activity=f"h{h}",
+                         notes="standup")
+           for h in range(8, 12)]
+    atm = FileATModel("update_activity", activities=list(aes))
+    assert len({ae.id for ae in aes}) == 4, "entry ids are not unique"
+    assert atm.get_activity(aes[1].id) is aes[1]
+    assert atm.get_activity("no such id") is None
+    # Moving an entry keeps start order and every index up to date
+    change = atm.update_activity(aes[0].id, start="2025-03-22T12:00:00",
+                                 stop="2025-03-22T13:00:00", notes="review")
+    assert change.kind == "updated" and change.entry_id == aes[0].id
+    assert change.before == {"start": "2025-03-22T08:00:00",
+        "stop": "2025-03-22T08:30:00", "notes": "standup"}, \
+        f"change record is not minimal: {change.before}"
+    assert change.time_range == ("2025-03-22T08:00:00", "2025-03-22T13:00:00")
+    assert [ae.activity for ae in atm.activities] == ["h9", "h10", "h11", "h8"]
+    assert atm.activities[-1] is aes[0], "entry was not updated in place"
+    assert atm.activity_at("2025-03-22T08:15:00") is None
+    assert atm.activity_at("2025-03-22T12:45:00") is aes[0]
+    assert atm.search_activities("review") == [aes[0]]
+    assert atm.summary.activities["h8"] == 1.0
+    assert atm.update_activity(aes[0].id, notes="review") is None
+    with pytest.raises(ValueError):
+        atm.update_activity(aes[1].id, allow_overlap=False,
+                            start="2025-03-22T10:15:00", stop="2025-03-22T10:45:00")
+    with pytest.raises(ValueError):
+        atm.update_activity(aes[1].id, duration=2.0)
+    assert aes[1].start == "2025-03-22T09:00:00", "rejected update changed entry"
+    # Removing an entry removes it from every index
+    change = atm.remove_activity(aes[2].id)
+    assert change.kind == "removed" and change.after is None
+    assert change.before["activity"] == "h10"
+    assert aes[2] not in atm.activities and atm.get_activity(aes[2].id) is None
+    assert atm.overlapping("2025-03-22T10:00:00", "2025-03-22T10:30:00") == []
+    assert "h10" not in atm.summary.activities
+    assert atm.complete_activity("h1") == ["h11"]
+    with pytest.raises(ValueError):
+        atm.remove_activity(aes[2].id)
+    with pytest.raises(ValueError):
+        atm.add_activity(ActivityEntry(start="2025-03-23T08:00:00", id=aes[1].id))
+    # An entry whose start was changed outside the model is not found
+    aes[0].start = "2025-03-22T23:00:00"
+    with pytest.raises(ValueError):
+        atm.remove_activity(aes[0].id)
+    aes[1].start = "2025-03-22T11:00:00"
+    with pytest.raises(ValueError):
+        atm.update_activity(aes[1].id, notes="moved")
+    assert len(atm.activities) == 3 and atm.get_activity(aes[0].id) is aes[0]
+    aes[0].start = "2025-03-22T12:00:00"; aes[1].start = "2025-03-22T09:00:00"
+    # Entry ids are saved and loaded with the activity store
+    full_path = pathlib.Path(FATM_TEMPDATA_DIR) / "update_activity.json"
+    full_path.parent.mkdir(parents=True, exist_ok=True)
+    atm.put_atmodel(full_path)
+    loaded = FileATModel(); loaded.get_atmodel(full_path)
+    assert [ae.id for ae in loaded.activities] == [ae.id for ae in atm.activities]
+    full_path.unlink(); FileATModel.summary_uri(full_path).unlink()
+    logging.debug("Completed test_update_and_remove_activity()")
+#endregion test_update_and_remove_activity()
+
+#region test_atmodel_change_events()
+def test_atmodel_change_events():
+    """Test FileATModel publishes ATModelEvent deltas for its changes"""
+    logging.debug("Starting test_atmodel_change_events()")
+    from at_utilities.at_events import ATEventManager, ATModelEvent
+    em = ATEventManager()  # not started, so events stay queued
+    atm = FileATModel("event_activity")
+    with pytest.raises(TypeError):
+        atm.event_manager = "not an event manager"
+    atm.event_manager = em
+    ae = atm.add_activity(ActivityEntry(start="2025-03-22T09:00:00",
+                                        stop="2025-03-22T10:00:00"))
+    atm.add_activities([ActivityEntry(start="2025-03-22T13:00:00",
+                                      stop="2025-03-22T13:30:00"),
+                        ActivityEntry(start="2025-03-22T11:00:00",
+                                      stop="2025-03-22T11:30:00")])
+    atm.update_activity(ae.id, stop="2025-03-22T09:30:00")
+    atm.remove_activity(ae.id)
+    atm.undo()
+    eq = em.get_event_queue(ATModelEvent.__name__, create=False)
+    assert eq is not None and eq.qsize() == 5, "events were not published"
+    events = [eq.get() for _ in range(5)]
+    assert all(isinstance(e, ATModelEvent) for e in events)
+    data = [e.event_data for e in events]
+    assert [[c["kind"] for c in d["changes"]] for d in data] == \
+        [["added"], ["added", "added"], ["updated"], ["removed"], ["added"]]
+    assert data[1]["time_range"] == ("2025-03-22T11:00:00", "2025-03-22T13:30:00")
+    assert data[2]["changes"][0]["entry_id"] == ae.id
+    assert data[2]["changes"][0]["after"] == \
+        {"start": "2025-03-22T09:00:00", "stop": "2025-03-22T09:30:00"}
+    assert data[2]["time_range"] == ("2025-03-22T09:00:00", "2025-03-22T10:00:00")
+    atm.event_manager = None
+    atm.redo()
+    assert eq.qsize() == 0
+    # An undo or redo step is published as one event of all its changes
+    atm.event_manager = em
+    atm.add_activities([ActivityEntry(start="2025-03-22T15:00:00",
+                                      stop="2025-03-22T15:30:00"),
+                        ActivityEntry(start="2025-03-22T16:00:00",
+                                      stop="2025-03-22T16:30:00")])
+    atm.undo(); atm.redo()
+    kinds = [[c["kind"] for c in eq.get().event_data["changes"]]
+             for _ in range(eq.qsize())]
+    assert kinds == [["added", "added"], ["removed", "removed"],
+                     ["added", "added"]], f"steps not published whole: {kinds}"
+    # A large batch lists only the first ATM_EVENT_MAX_CHANGES changes
+    from model.atmodelconstants import ATM_EVENT_MAX_CHANGES
+    n = ATM_EVENT_MAX_CHANGES + 5
+    aes = [ActivityEntry(start=f"2025-04-01T{i // 60:02d}:{i % 60:02d}:00",
+                         stop=f"2025-04-01T{i // 60:02d}:{i % 60:02d}:30")
+           for i in range(n)]
+    atm.add_activities(aes, record=False)
+    data = eq.get().event_data
+    assert data["change_count"] == n and data["truncated"], \
+        "large event not flagged as truncated"
+    assert len(data["changes"]) == ATM_EVENT_MAX_CHANGES
+    assert data["time_range"] == (aes[0].start, aes[-1].stop), \
+        "time_range does not cover the changes not listed"
+    atm.add_activity(ActivityEntry(start="2025-04-02T09:00:00",
+                                   stop="2025-04-02T09:30:00"))
+    data = eq.get().event_data
+    assert data["change_count"] == 1 and not data["truncated"]
+    # Importing the model does not import the event manager, which sets up 
+    # logging
+    import subprocess, sys
+    code = "import sys, model.file_atmodel; " + \
+           "print('at_utilities.at_events' in sys.modules)"
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True,
+                         text=True, check=True).stdout
+    assert out.strip() == "False", "model import set up the event manager"
+    logging.debug("Completed test_atmodel_change_events()")
+#endregion test_atmodel_change_events()